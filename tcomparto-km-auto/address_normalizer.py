@@ -0,0 +1,75 @@
+import json
+import os
+import re
+from functools import lru_cache
+
+DEFAULT_ADDRESS_CONFIG_PATH = "./files/input/address_config.json"
+
+# Used when the config file is missing, same content as the shipped file
+DEFAULT_POSTCODE_TOWNS = {"29730": "Rincón", "29738": "Benagalbón", "29720": "La Cala"}
+DEFAULT_STREET_ALIASES = [
+    ("Carretera Cortijo El Acebuchal", "Carretera Cortijo El Acebuchal, Rincón, 29730"),
+    ("Calle Cortijo Los Morenos Altos", "Cortijo los Morenos Altos, 12, Rincón, 29738"),
+]
+
+PARENTHESES_RE = re.compile(r"\s*\(.*?\)\s*")
+
+
+def load_address_config(path=DEFAULT_ADDRESS_CONFIG_PATH):
+    """
+    Read the postcode -> town table and the street aliases from the JSON config file.
+    Returns: (postcode_towns dict, list of (substring, replacement address))
+    """
+    if not os.path.exists(path):
+        print(f"Address config '{path}' not found, using built-in defaults")
+        return dict(DEFAULT_POSTCODE_TOWNS), list(DEFAULT_STREET_ALIASES)
+
+    with open(path, "r", encoding="UTF-8") as file:
+        config = json.load(file)
+    postcode_towns = config.get("postcode_towns", {})
+    street_aliases = [(alias["match"], alias["address"]) for alias in config.get("street_aliases", [])]
+    return postcode_towns, street_aliases
+
+
+class AddressNormalizer:
+    """
+    Turns a T-Comparto address ('Calle Falsa, 3 (Urb. X), CP: 29730') into the
+    'street, town, postcode' form sent to Google Maps and printed in the report.
+    Results are memoized, so each distinct address is processed once per run.
+    """
+    def __init__(self, postcode_towns, street_aliases, cache_size=4096):
+        self.postcode_towns = postcode_towns
+        self.street_aliases = street_aliases
+        self.normalize = lru_cache(maxsize=cache_size)(self._normalize)
+
+    def _normalize(self, address):
+        if "(" in address:
+            address = PARENTHESES_RE.sub("", address)
+
+        # Streets Google cannot match by name are replaced by an address it knows
+        for match, alias in self.street_aliases:
+            if match in address:
+                return alias
+
+        street = address.split(",", 1)[0]
+        parts = address.split("CP: ")
+        postcode = parts[1].strip() if len(parts) > 1 else ""
+        town = self.postcode_towns.get(postcode, "")
+
+        return f"{street}, {town}, {postcode}"
+
+
+_default_normalizer = None
+
+
+def get_default_normalizer():
+    """Normalizer built from the config file, loaded on first use."""
+    global _default_normalizer
+    if _default_normalizer is None:
+        _default_normalizer = AddressNormalizer(*load_address_config())
+    return _default_normalizer
+
+
+def normalize(address):
+    """Normalize an address with the default config (memoized)."""
+    return get_default_normalizer().normalize(address)
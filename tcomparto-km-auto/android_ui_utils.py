@@ -1,18 +1,39 @@
-import time
+import io
+import xml.etree.ElementTree as ET
+from collections import namedtuple
 from datetime import date
-import uiautomator2 as u2
 
+EVENT_TIME_ID = "com.asisto.tcomparto:id/tv_event_time"
+EVENT_LOCATION_ID = "com.asisto.tcomparto:id/tv_event_location"
+EVENT_USER_ID = "com.asisto.tcomparto:id/tv_event_user"
 
-def connect_device():
-    """Connect to an Android device using uiautomator2."""
-    return u2.connect()
+EventRow = namedtuple("EventRow", ["time", "address", "name"])
+
+# Month names the date picker reads out in its content descriptions ('junio de 2025', '01 junio 2025')
+MONTH_NAMES = (
+    ("enero", "january"), ("febrero", "february"), ("marzo", "march"), ("abril", "april"),
+    ("mayo", "may"), ("junio", "june"), ("julio", "july"), ("agosto", "august"),
+    ("septiembre", "september"), ("octubre", "october"), ("noviembre", "november"), ("diciembre", "december"),
+)
+
+
+def connect_device(serial=None):
+    """
+    Connect to an Android device using uiautomator2.
+    serial: USB serial (see `adb devices`) or Wi-Fi ADB address ('192.168.1.20:5555');
+            None connects to the only device attached
+    """
+    # Imported here so re-rendering a report from saved data works without the device tooling
+    import uiautomator2 as u2
+    return u2.connect(serial)
 
 
 def restart_app(d, app_package="com.asisto.tcomparto", start_wait=10):
-    """Stop and start the app to ensure a clean state."""
+    """Stop and start the app to ensure a clean state, waiting until its tabs are shown."""
     d.app_stop(app_package)
     d.app_start(app_package)
-    time.sleep(start_wait)
+    if not d(text="Planilla").wait(timeout=start_wait):
+        print(f"App did not show the 'Planilla' tab within {start_wait}s")
 
 
 def open_planilla_tab(d):
@@ -20,35 +41,136 @@ def open_planilla_tab(d):
     d(text="Planilla").click()
 
 
-def navigate_to_month(d, target_year, target_month):
-    """Navigate back through calendar months to the target month/year."""
-    today = date.today()
-    today_formatted = today.strftime("%d/%m/%Y")
-    d(text=today_formatted).click()
-    time.sleep(1)
+def jump_to_year(d, target_year, timeout=3):
+    """
+    Switch the open date picker to another year through its year list.
+    The picker keeps the current month, so only the months within the year are left to page through.
+    Returns: True if the year was selected
+    """
+    header = d(resourceId="android:id/date_picker_header_year")
+    if not header.exists:
+        return False
+    header.click()
+
+    year_item = d(resourceId="android:id/text1", text=str(target_year))
+    try:
+        if not year_item.wait(timeout=timeout):
+            d(scrollable=True).scroll.to(resourceId="android:id/text1", text=str(target_year))
+        year_item.click(timeout=timeout)
+    except Exception as e:
+        print(f"Could not select year {target_year} in the date picker: {e}")
+        # Go back to the day view so paging by month still works
+        d(resourceId="android:id/date_picker_header_date").click_exists(timeout=timeout)
+        return False
+
+    return d(resourceId="android:id/prev").wait(timeout=timeout)
+
+
+def month_label_pattern(target_year, target_month):
+    """descriptionMatches pattern of the picker's month page and day cells of a month."""
+    names = "|".join(MONTH_NAMES[target_month - 1])
+    return rf"(?is).*\b({names})\b.*\b{target_year}\b.*"
+
+
+def wait_for_month(d, target_year, target_month, timeout=5):
+    """Wait until the open date picker shows the target month. Returns: True if it does"""
+    return d(descriptionMatches=month_label_pattern(target_year, target_month)).wait(timeout=timeout)
+
+
+def navigate_to_month(d, target_year, target_month, timeout=5, shown_date=None):
+    """
+    Open the date picker and move it to the target month/year.
+    shown_date: Date the picker currently points at; defaults to today, as after an app start.
+                If the picker is still open from a previous month it is reused as it is.
+    Raises: RuntimeError when the picker does not end on the target month (e.g. a page click was
+            dropped), so the wrong month is never scraped
+    """
+    shown_date = shown_date or date.today()
+    if not d(text="ACEPTAR").exists:
+        d(text=shown_date.strftime("%d/%m/%Y")).click(timeout=timeout)
+    d(resourceId="android:id/prev").wait(timeout=timeout)
+
+    device_month = shown_date.month
+    device_year = shown_date.year
+    # The year list costs a couple of taps, only worth it when it saves more month pages
+    direct_pages = abs((device_year - target_year) * 12 + (device_month - target_month))
+    pages_after_jump = abs(device_month - target_month)
+    if direct_pages > pages_after_jump + 2 and jump_to_year(d, target_year):
+        device_year = target_year
 
-    device_month = today.month
-    device_year = today.year
     months_back = (device_year - target_year) * 12 + (device_month - target_month)
+    months_forward = -months_back
+
+    # The clicks are sent without pauses; the month shown at the end is checked instead
+    for _ in range(months_back):
+        d(resourceId="android:id/prev").click(timeout=timeout)
+    for _ in range(months_forward):
+        d(resourceId="android:id/next").click(timeout=timeout)
+
+    if months_back == 0:
+        print("Already at the target month.")
+    if not wait_for_month(d, target_year, target_month, timeout=timeout):
+        raise RuntimeError(f"The date picker did not reach {target_month:02}/{target_year}")
 
-    if months_back > 0:
-        for _ in range(months_back):
-            d(resourceId="android:id/prev").click()
-            time.sleep(0.5)
-    else:
-        print("Already at or past the target month.")
 
+def select_day_and_accept(d, day, date_str, timeout=5, events_wait=2):
+    """
+    Click on a day and accept the selection, then wait for the app to show the new date
+    and for the day's events to appear (days without events wait at most events_wait seconds).
+    date_str: The day as the app shows it once selected (e.g. '05/06/2025'); until it is shown
+              the rows on screen may still be the previous day's
+    Raises: RuntimeError when the app does not show date_str
+    """
+    d(text=str(day)).click(timeout=timeout)
+    d(text="ACEPTAR").click(timeout=timeout)
+    d(text="ACEPTAR").wait_gone(timeout=timeout)
+    if not d(text=date_str).wait(timeout=timeout):
+        raise RuntimeError(f"The app did not switch to {date_str}")
+    d(resourceId=EVENT_TIME_ID).wait(timeout=events_wait)
 
-def select_day_and_accept(d, day):
-    """Click on a day and accept the selection."""
-    d(text=str(day)).click()
-    d(text="ACEPTAR").click()
-    time.sleep(2)
+
+def reopen_date_picker(d, date_str, timeout=5):
+    """Click the selected date to open the picker again for the next day."""
+    d(text=date_str).click(timeout=timeout)
+    return d(text="ACEPTAR").wait(timeout=timeout)
 
 
 def get_event_data(d):
     """Retrieve times, addresses, and names of events from the UI."""
-    times = d(resourceId="com.asisto.tcomparto:id/tv_event_time")
-    addresses = d(resourceId="com.asisto.tcomparto:id/tv_event_location")
-    names = d(resourceId="com.asisto.tcomparto:id/tv_event_user")
+    times = d(resourceId=EVENT_TIME_ID)
+    addresses = d(resourceId=EVENT_LOCATION_ID)
+    names = d(resourceId=EVENT_USER_ID)
     return times, addresses, names
+
+
+def parse_event_rows(hierarchy_xml):
+    """
+    Parse the event rows out of a uiautomator hierarchy dump in one streaming pass.
+    A row ends when one of its fields shows up again, so rows follow the on-screen order.
+    Returns: List of EventRow(time, address, name)
+    """
+    fields = {EVENT_TIME_ID: "time", EVENT_LOCATION_ID: "address", EVENT_USER_ID: "name"}
+    rows = []
+    current = {}
+
+    def close_row():
+        if "time" in current and "address" in current:
+            rows.append(EventRow(current["time"], current["address"], current.get("name", "")))
+        current.clear()
+
+    source = io.BytesIO(hierarchy_xml.encode("UTF-8"))
+    for _, node in ET.iterparse(source, events=("start",)):
+        field = fields.get(node.get("resource-id"))
+        if field is None:
+            continue
+        if field in current:
+            close_row()
+        current[field] = node.get("text", "")
+    close_row()
+
+    return rows
+
+
+def get_event_rows(d):
+    """Retrieve every event row on screen with a single hierarchy dump instead of one RPC per field."""
+    return parse_event_rows(d.dump_hierarchy())
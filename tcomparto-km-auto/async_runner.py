@@ -0,0 +1,292 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from process_events import (
+    MonthRun, KM_PDF_FOLDER, KM_TXT_FOLDER, obtain_month, obtain_year, month_range, prepare_data_folders,
+    scrape_day, save_run_summary
+)
+from report_session import ReportSession
+from run_metrics import start_run
+
+# Seconds each task may take before it is abandoned
+NAVIGATION_TIMEOUT = 120  # connect, restart the app and walk the date picker to the month
+DAY_TIMEOUT = 60          # select, read and close one day on the phone
+LOOKUP_TIMEOUT = 300      # resolve the distances of one day's trips
+RENDER_TIMEOUT = 120      # write the TXT and PDF reports of a month
+
+
+class TaskTimeout(Exception):
+    pass
+
+
+async def run_blocking(executor, timeout, description, function, *args):
+    """
+    Run a blocking call (uiautomator2 RPC, WebDriver, PyMuPDF) on an executor thread.
+    A call still running when the task is cancelled or times out finishes on its thread,
+    but nobody waits for it and the executor's queued calls are dropped on shutdown.
+    Raises: TaskTimeout after `timeout` seconds
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(executor, function, *args), timeout)
+    except asyncio.TimeoutError:
+        raise TaskTimeout(f"{description} timed out after {timeout}s") from None
+
+
+class AsyncReportRunner:
+    """
+    Runs the months of a report as asyncio tasks over three single-thread executors, one per
+    resource: the phone, the distance backend and the PDF renderer. Each executor keeps its
+    blocking library on one thread, while the tasks overlap what does not depend on each other:
+    routes are resolved while the next days are scraped (the browser starts on the first route
+    missing from the cache, so runs served by the cache never start one), and a month is
+    rendered while the next one is scraped.
+    """
+    def __init__(self, session, status_callback=None, resume=False, extraction_mode="dump",
+                 full_matrix=False, pdf_output="split", exports=(), offline=False, day_queue_size=3, refresh=False,
+                 label=None):
+        self.session = session
+        self.status_callback = status_callback
+        self.resume = resume
+        self.extraction_mode = extraction_mode
+        self.full_matrix = full_matrix
+        self.pdf_output = pdf_output
+        self.exports = exports
+        self.offline = offline
+        self.day_queue_size = day_queue_size
+        self.refresh = refresh
+        self.label = label
+        self.device_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="device")
+        self.lookup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lookup")
+        self.render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+
+    def report(self, message, status_type="info"):
+        if self.status_callback:
+            self.status_callback(message, status_type)
+
+    async def run(self, months, metrics):
+        """
+        months: List of (year, month) tuples, walked in order (see month_range)
+        Returns: The TripTable of each month, in order
+        """
+        renders = []
+        try:
+            for index, (target_year, target_month) in enumerate(months):
+                self.report(f"Processing {target_month:02}/{target_year} ({index + 1}/{len(months)})...")
+                month_run = MonthRun(f"{target_month:02}", target_year, self.session, resume=self.resume,
+                                     offline=self.offline, metrics=metrics, refresh=self.refresh,
+                                     label=self.label)
+                await self.collect_month(month_run)
+                trip_table = month_run.build_trip_table()
+                renders.append(asyncio.create_task(self.render_month(month_run, trip_table)))
+            return [await render for render in renders]
+        finally:
+            # Months already scraped still get their reports when a later one fails
+            for render in renders:
+                if render.done():
+                    continue
+                try:
+                    await asyncio.shield(render)
+                except Exception as e:
+                    print(f"Report of a finished month failed: {e}")
+
+    async def collect_month(self, month_run):
+        """Scrape the month's remaining days while a consumer resolves the days already read."""
+        day_queue = asyncio.Queue(maxsize=self.day_queue_size)
+        scraper = asyncio.create_task(self.scrape_month(month_run, day_queue))
+        try:
+            await run_blocking(self.lookup_executor, LOOKUP_TIMEOUT * (len(month_run.finished_days) + 1),
+                               "Replaying the checkpoint", month_run.replay_finished_days)
+            while True:
+                item = await day_queue.get()
+                if item is None:
+                    break
+                day, events = item
+                await run_blocking(self.lookup_executor, LOOKUP_TIMEOUT, f"Distances of day {day}",
+                                   month_run.add_day, day, events)
+            # Surface a scraping failure instead of reporting a partial month
+            await scraper
+        finally:
+            scraper.cancel()
+            await asyncio.gather(scraper, return_exceptions=True)
+            await asyncio.shield(run_blocking(self.lookup_executor, LOOKUP_TIMEOUT, "Saving the distance matrix",
+                                              month_run.save_matrix, self.full_matrix))
+
+    async def scrape_month(self, month_run, day_queue):
+        cancelled = False
+        try:
+            if not month_run.remaining_days:
+                return
+            d = await run_blocking(self.device_executor, NAVIGATION_TIMEOUT, "Opening the month on the phone",
+                                   self.navigate, month_run)
+
+            for day in month_run.remaining_days:
+                self.report(f"Processing day {day}...")
+                try:
+                    events = await run_blocking(self.device_executor, DAY_TIMEOUT, f"Day {day}", scrape_day,
+                                                d, day, month_run.target_month, month_run.target_year,
+                                                self.extraction_mode)
+                except TaskTimeout as e:
+                    # The phone is in an unknown state: stop here, finished days stay in the journal
+                    month_run.metrics.count("device.timeouts")
+                    raise TaskTimeout(f"{e}; run again with resume to continue from day {day}") from None
+                except RuntimeError as e:
+                    # Unplugged phone or a day the app did not switch to: never journaled as empty
+                    raise RuntimeError(f"{e}; run again with resume to continue from day {day}") from e
+                await day_queue.put((day, events))
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            if cancelled:
+                # The queued days are dropped (they are not in the journal yet) so the end marker
+                # never blocks on a full queue
+                while not day_queue.empty():
+                    day_queue.get_nowait()
+                day_queue.put_nowait(None)
+            else:
+                # Finished or failed on the phone: the days already read are still resolved and
+                # journaled before collect_month re-raises the failure
+                await day_queue.put(None)
+
+    def navigate(self, month_run):
+        with month_run.metrics.stage("device.navigate_month"):
+            return self.session.go_to_month(month_run.target_year, month_run.target_month)
+
+    async def render_month(self, month_run, trip_table):
+        await run_blocking(self.render_executor, RENDER_TIMEOUT, f"Report of {month_run.month_str}",
+                           month_run.write_reports, trip_table, self.pdf_output, self.exports, self.status_callback)
+        return trip_table
+
+    def shutdown(self):
+        """Drop the queued calls and wait for the running ones (a device RPC cannot be interrupted)."""
+        for executor in (self.device_executor, self.lookup_executor, self.render_executor):
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def run_months(months, session, metrics, status_callback=None, **month_options):
+    """
+    Run months on a session opened by the caller (see process_devices), which also closes it.
+    month_options: Passed on to AsyncReportRunner
+    Returns: The TripTable of each month, in order
+    """
+    runner = AsyncReportRunner(session, status_callback, **month_options)
+    try:
+        return asyncio.run(runner.run(months, metrics))
+    finally:
+        runner.shutdown()
+
+
+async def run_months_async(months, status_callback=None, distance_backend="gmaps", distance_options=None,
+                           cache_ttl_days=None, cache_max_entries=None, trace=False, label=None, **month_options):
+    """
+    Run months with one session, one summary and overlapping stages (see AsyncReportRunner).
+    Cancelling the task stops the run after the calls in progress; the checkpoint journal keeps
+    every finished day, so the run can be resumed.
+    month_options: resume, refresh, extraction_mode, full_matrix, pdf_output, exports, offline, day_queue_size
+    Returns: The TripTable of each month, in order
+    """
+    metrics = start_run()
+    prepare_data_folders(KM_PDF_FOLDER, KM_TXT_FOLDER,
+                         keep_existing=month_options.get("resume", False) or month_options.get("refresh", False))
+    session = ReportSession(distance_backend, distance_options, cache_ttl_days, cache_max_entries, status_callback)
+    runner = AsyncReportRunner(session, status_callback, label=label, **month_options)
+    try:
+        trip_tables = await runner.run(months, metrics)
+    finally:
+        # Shielded: a cancelled run still closes the phone app, the browsers and the cache
+        await asyncio.shield(asyncio.to_thread(close_runner, runner, session))
+
+    first_year, first_month = months[0]
+    save_run_summary(metrics, first_month, first_year, trace, status_callback, label)
+    if status_callback:
+        status_callback(f"{len(months)} month(s) completed successfully!", "success")
+    return trip_tables
+
+
+def close_runner(runner, session):
+    runner.shutdown()
+    session.close()
+
+
+class BackgroundRun:
+    """
+    A run_months_async run on its own event loop thread, so a GUI can start it and cancel it
+    from its main loop. on_done is called from the run's thread once it is over.
+    """
+    def __init__(self, months, status_callback=None, on_done=None, **run_options):
+        self.months = months
+        self.status_callback = status_callback
+        self.on_done = on_done
+        self.run_options = run_options
+        self.loop = None
+        self.task = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        """Ask the run to stop; safe to call from any thread, before or after it started."""
+        with self.lock:
+            self.cancelled = True
+            if self.task is not None:
+                self.loop.call_soon_threadsafe(self.task.cancel)
+
+    def _run(self):
+        try:
+            asyncio.run(self._main())
+        except asyncio.CancelledError:
+            print("Run cancelled")
+            if self.status_callback:
+                self.status_callback("Run cancelled, finished days are kept for resume.", "error")
+        except Exception as e:
+            import traceback
+            print("Exception in background run:")
+            traceback.print_exc()
+            if self.status_callback:
+                self.status_callback(f"Program failed: {e}", "error")
+        finally:
+            with self.lock:
+                # The loop is closed now, a late cancel has nothing left to stop
+                self.task = None
+            if self.on_done:
+                self.on_done()
+
+    async def _main(self):
+        with self.lock:
+            if self.cancelled:
+                raise asyncio.CancelledError()
+            self.loop = asyncio.get_running_loop()
+            self.task = asyncio.current_task()
+        return await run_months_async(self.months, self.status_callback, **self.run_options)
+
+
+def start_background_run(month_str, year_str, end_month_str=None, end_year_str=None, status_callback=None,
+                         on_done=None, resume=False, refresh=False, distance_options=None):
+    """
+    Validate the GUI's month range and start it as a BackgroundRun.
+    The *_str arguments come from the GUI dropdowns (e.g., '01', '2025'); no end month processes one month.
+    distance_options: Extra keyword arguments for the distance backend (e.g. {'browser_service': ...})
+    Returns: The started BackgroundRun, or None when the input is invalid (reported to status_callback)
+    """
+    try:
+        start_year = obtain_year(year_str, status_callback)
+        start_month = int(obtain_month(month_str, status_callback))
+        if end_month_str:
+            months = month_range(start_year, start_month, obtain_year(end_year_str, status_callback),
+                                 int(obtain_month(end_month_str, status_callback)))
+        else:
+            months = [(start_year, start_month)]
+    except Exception as e:
+        if status_callback:
+            status_callback(f"Program failed: {e}", "error")
+        if on_done:
+            on_done()
+        return None
+    return BackgroundRun(months, status_callback, on_done, resume=resume, refresh=refresh,
+                         distance_options=distance_options).start()
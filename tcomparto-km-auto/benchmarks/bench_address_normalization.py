@@ -0,0 +1,58 @@
+# bench_address_normalization.py
+# Micro-benchmark of address normalization over a realistic month of addresses.
+# Run from the tcomparto-km-auto folder: python benchmarks/bench_address_normalization.py
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from address_normalizer import AddressNormalizer, load_address_config
+
+
+def make_month_addresses(trips=150, distinct=35, seed=7):
+    """Addresses as the device returns them; a month reuses a few dozen client addresses."""
+    rng = random.Random(seed)
+    streets = ["Calle Falsa", "Avenida del Mar", "Calle Real", "Camino de Málaga", "Calle Nueva",
+               "Carretera Cortijo El Acebuchal", "Calle Cortijo Los Morenos Altos", "Paseo Marítimo"]
+    postcodes = ["29730", "29738", "29720", "29740"]
+    clients = [
+        f"{rng.choice(streets)}, {rng.randint(1, 90)}{' (Urb. El Pinar)' if rng.random() < 0.3 else ''}, "
+        f"CP: {rng.choice(postcodes)}"
+        for _ in range(distinct)
+    ]
+    # Each trip normalizes its origin and destination for the lookup and again for the report
+    return [rng.choice(clients) for _ in range(trips * 4)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark address normalization.")
+    parser.add_argument("--trips", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    addresses = make_month_addresses(args.trips)
+    config = load_address_config()
+
+    def run(use_cache):
+        best = float("inf")
+        for _ in range(args.repeat):
+            normalizer = AddressNormalizer(*config)
+            normalize = normalizer.normalize if use_cache else normalizer._normalize
+            start = time.perf_counter()
+            for address in addresses:
+                normalize(address)
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    uncached = run(False)
+    cached = run(True)
+    print(f"{len(addresses)} normalizations, {len(set(addresses))} distinct addresses")
+    print(f"without memoization: {uncached * 1e3:8.3f} ms")
+    print(f"with memoization:    {cached * 1e3:8.3f} ms ({uncached / cached:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
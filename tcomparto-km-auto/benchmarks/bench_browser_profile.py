@@ -0,0 +1,180 @@
+# bench_browser_profile.py
+# Compares the standard and the lean Firefox of start_headless_browser on recorded directions pages:
+# time until the trip cards can be read (page-ready) and browser memory per lookup.
+# The pages are the directions fixtures dressed like the live Maps page: map tiles, imagery, a web font
+# and an analytics script, served by a local server with a per-request latency. Real pages saved from
+# the browser (File > Save Page As, with their _files folder) can be dropped in benchmarks/fixtures/saved/.
+# Run from the tcomparto-km-auto folder: python benchmarks/bench_browser_profile.py [--lookups 20]
+import argparse
+import functools
+import glob
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from filter_proxy import FilteringProxy
+from gmaps_utils import start_headless_browser, close_browser, extract_routes
+
+from fakes import FIXTURES_FOLDER, FakeWebDriver, load_fixture
+
+SAVED_PAGES_PATTERN = os.path.join(FIXTURES_FOLDER, "saved", "*.html")
+# Served from another host name than the page, so the lean proxy can block it like google-analytics.com
+TRACKER_HOST = "127.0.0.1"
+PAGE_HOST = "localhost"
+
+
+def dressed_directions_page(index, server_port, tiles):
+    """A directions fixture with `tiles` map tiles, imagery, a web font and an analytics script."""
+    origin = f"Calle Falsa, {index + 1}, Rincón, 29730"
+    destination = f"Avenida del Mar, {index + 2}, Benagalbón, 29738"
+    route_card = load_fixture("maps_route.html")
+    routes = FakeWebDriver.routes(origin, destination)
+    page = load_fixture("maps_directions.html").substitute(
+        origin=origin, destination=destination,
+        routes="".join(route_card.substitute(index=i, **route) for i, route in enumerate(routes)))
+    assets = (
+        "<style>@font-face { font-family: 'Maps'; src: url('/assets/font.woff2'); }"
+        " body { font-family: 'Maps', sans-serif; }</style>"
+        + "".join(f'<img src="/assets/tile_{index}_{i}.png" width="256" height="256">' for i in range(tiles))
+        + f'<img src="/assets/photo_{index}.jpg">'
+        + f'<script src="http://{TRACKER_HOST}:{server_port}/assets/analytics.js"></script>'
+    )
+    return page.replace("</body>", f"<div id='scene'>{assets}</div></body>")
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """Serves the recorded pages and fills /assets/ with random bytes after `asset_latency`."""
+    asset_latency = 0.02
+    asset_sizes = {'.png': 40_000, '.jpg': 150_000, '.woff2': 120_000, '.js': 200_000}
+
+    def do_GET(self):
+        if self.path.startswith("/assets/"):
+            time.sleep(self.asset_latency)
+            size = self.asset_sizes.get(os.path.splitext(self.path)[1], 10_000)
+            body = random.randbytes(size) if not self.path.endswith(".js") else b"/*" + b"x" * size + b"*/"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def browser_memory_mb(driver):
+    """Resident memory of the browser and its content processes, None when it cannot be read."""
+    pid = driver.capabilities.get("moz:processID")
+    if pid is None:
+        return None
+    try:
+        import psutil
+        process = psutil.Process(pid)
+        return sum(p.memory_info().rss for p in [process, *process.children(recursive=True)]) / 2 ** 20
+    except ImportError:
+        pass
+    if not os.path.isdir("/proc"):
+        return None
+    # Without psutil: walk /proc (Linux) for the browser and its children
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat", "r") as file:
+                    parents[int(entry)] = int(file.read().rsplit(")", 1)[1].split()[1])
+            except OSError:
+                continue
+    family, changed = {pid}, True
+    while changed:
+        children = {child for child, parent in parents.items() if parent in family} - family
+        family |= children
+        changed = bool(children)
+    rss_pages = 0
+    for member in family:
+        try:
+            with open(f"/proc/{member}/statm", "r") as file:
+                rss_pages += int(file.read().split()[1])
+        except OSError:
+            continue
+    return rss_pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def run_profile(mode, urls, proxy_port):
+    """
+    Load every page in a fresh browser of the given mode.
+    Returns: (mean page-ready seconds, browser MB at the end, MB added per lookup, routes of the last page)
+    """
+    driver = start_headless_browser(
+        mode=mode, proxy_port=proxy_port,
+        # The fixtures are served from localhost, which Firefox never proxies by default
+        preferences={"network.proxy.allow_hijacking_localhost": True, "network.proxy.no_proxies_on": ""}
+    )
+    try:
+        start_memory = browser_memory_mb(driver)
+        ready_seconds = []
+        routes = None
+        for url in urls:
+            start = time.perf_counter()
+            driver.get(url)
+            routes = extract_routes(driver)
+            while not routes and time.perf_counter() - start < 10:
+                time.sleep(0.02)
+                routes = extract_routes(driver)
+            ready_seconds.append(time.perf_counter() - start)
+        end_memory = browser_memory_mb(driver)
+    finally:
+        close_browser(driver)
+
+    memory_per_lookup = None
+    if start_memory is not None and end_memory is not None:
+        memory_per_lookup = (end_memory - start_memory) / len(urls)
+    return sum(ready_seconds) / len(ready_seconds), end_memory, memory_per_lookup, routes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the standard and lean browser profiles.")
+    parser.add_argument("--lookups", type=int, default=20, help="Directions pages loaded per profile")
+    parser.add_argument("--tiles", type=int, default=40, help="Map tiles on each page")
+    parser.add_argument("--asset-latency", type=float, default=0.02, help="Seconds before each asset is served")
+    args = parser.parse_args()
+
+    FixtureHandler.asset_latency = args.asset_latency
+    with tempfile.TemporaryDirectory() as page_folder:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(FixtureHandler, directory=page_folder))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+        for index in range(args.lookups):
+            with open(os.path.join(page_folder, f"directions_{index}.html"), "w", encoding="UTF-8") as file:
+                file.write(dressed_directions_page(index, port, args.tiles))
+        urls = [f"http://{PAGE_HOST}:{port}/directions_{index}.html" for index in range(args.lookups)]
+        urls += [f"file://{quote(os.path.abspath(path))}" for path in sorted(glob.glob(SAVED_PAGES_PATTERN))]
+
+        proxy = FilteringProxy(blocked_hosts=[TRACKER_HOST]).start()
+        try:
+            print(f"{'profile':<10} {'page-ready ms':>14} {'browser MB':>11} {'MB/lookup':>10}  routes on last page")
+            for mode in ("standard", "lean"):
+                with redirect_stdout(StringIO()):
+                    ready, memory, per_lookup, routes = run_profile(mode, urls, proxy.port)
+                print(f"{mode:<10} {ready * 1000:>14.1f} "
+                      f"{memory if memory is not None else float('nan'):>11.1f} "
+                      f"{per_lookup if per_lookup is not None else float('nan'):>10.2f}  "
+                      f"{[route.distance for route in routes] if isinstance(routes, list) else routes}")
+            print(f"Requests blocked by the lean proxy: {proxy.blocked_count}")
+        finally:
+            proxy.stop()
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# bench_distance_extraction.py
+# Compares the full-page distance scan (extract_all_distances_js) with the scoped trip-card
+# extractor (extract_routes) on saved Google Maps pages, in a real headless Firefox.
+# The directions fixture is padded with filler nodes to approach the size of the live Maps DOM;
+# real pages saved from the browser (File > Save Page As) can be dropped in benchmarks/fixtures/saved/.
+# Run from the tcomparto-km-auto folder: python benchmarks/bench_distance_extraction.py [--polls 40]
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from gmaps_utils import start_headless_browser, close_browser, extract_all_distances_js, extract_routes, to_meters
+
+from fakes import FIXTURES_FOLDER, FakeWebDriver, load_fixture
+
+SAVED_PAGES_PATTERN = os.path.join(FIXTURES_FOLDER, "saved", "*.html")
+
+
+def render_directions_page(filler_nodes, loading=False):
+    """
+    The directions fixture with 3 routes and `filler_nodes` extra elements around the pane.
+    loading: Leave the trip cards out, like the page while Google is still computing the routes
+    """
+    routes = FakeWebDriver.routes("Calle Falsa, 1, Rincón, 29730", "Avenida del Mar, 2, Benagalbón, 29738")
+    route_card = load_fixture("maps_route.html")
+    page = load_fixture("maps_directions.html").substitute(
+        origin="Calle Falsa, 1, Rincón, 29730", destination="Avenida del Mar, 2, Benagalbón, 29738",
+        routes="" if loading else "".join(route_card.substitute(index=i, **route) for i, route in enumerate(routes)))
+    filler = "".join(
+        f'<div class="filler"><span>Place {i}</span><span>{i % 50} m</span></div>' for i in range(filler_nodes)
+    )
+    return page.replace("</body>", f"<div id='scene-details'>{filler}</div></body>")
+
+
+def time_extractor(driver, extractor, polls):
+    start = time.perf_counter()
+    for _ in range(polls):
+        result = extractor(driver)
+    return (time.perf_counter() - start) / polls, result
+
+
+def longest(result):
+    if not result or result == "not_found":
+        return result
+    distances = [getattr(item, "distance", item) for item in result]
+    return max(distances, key=to_meters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the in-page distance extraction scripts.")
+    parser.add_argument("--filler", type=int, nargs="+", default=[0, 5000, 20000],
+                        help="Extra DOM elements of each generated page")
+    parser.add_argument("--polls", type=int, default=40, help="Calls per extractor and page")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as page_folder:
+        pages = []
+        for filler_nodes in args.filler:
+            path = os.path.join(page_folder, f"directions_{filler_nodes}.html")
+            with open(path, "w", encoding="UTF-8") as file:
+                file.write(render_directions_page(filler_nodes))
+            pages.append((f"fixture +{filler_nodes} nodes", path))
+        # A poll before the trip cards exist: the scoped script answers 'not ready' without the full scan
+        path = os.path.join(page_folder, "directions_loading.html")
+        with open(path, "w", encoding="UTF-8") as file:
+            file.write(render_directions_page(max(args.filler), loading=True))
+        pages.append((f"loading +{max(args.filler)} nodes", path))
+        pages += [(os.path.basename(path), path) for path in sorted(glob.glob(SAVED_PAGES_PATTERN))]
+
+        driver = start_headless_browser()
+        try:
+            print(f"{'page':<24} {'full scan ms':>13} {'scoped ms':>10} {'speed-up':>9}  longest (full / scoped)")
+            for name, path in pages:
+                driver.get("file://" + os.path.abspath(path))
+                with redirect_stdout(StringIO()):
+                    full_seconds, full_result = time_extractor(driver, extract_all_distances_js, args.polls)
+                    scoped_seconds, scoped_result = time_extractor(driver, extract_routes, args.polls)
+                print(f"{name:<24} {full_seconds * 1000:>13.2f} {scoped_seconds * 1000:>10.2f} "
+                      f"{full_seconds / scoped_seconds:>8.1f}x  {longest(full_result)} / {longest(scoped_result)}")
+        finally:
+            close_browser(driver)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# bench_end_to_end.py
+# Runs process_month end to end on a simulated phone and a simulated Google Maps (see fakes.py),
+# so throughput can be measured and regression-tested without a device or network access.
+# Run from the tcomparto-km-auto folder:
+#   python benchmarks/bench_end_to_end.py                     # compare with the stored baseline
+#   python benchmarks/bench_end_to_end.py --update-baseline   # store the current timings
+# Exits with status 1 when a scenario is slower than its baseline by more than --tolerance.
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import android_ui_utils
+from process_events import process_month
+from run_metrics import get_run_metrics
+
+from fakes import FakeDevice, FakeWebDriver, make_month_events
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_end_to_end.json")
+INPUT_FOLDER = "./files/input"
+TARGET_YEAR, TARGET_MONTH = 2025, 6
+
+
+def run_scenario(event_count, args):
+    """
+    Process one simulated month in a scratch working folder, so caches and checkpoints start empty.
+    Returns: {'events', 'trips', 'lookups', 'seconds', 'events_per_s', 'lookups_per_s'}
+    """
+    input_folder = os.path.abspath(INPUT_FOLDER)
+    events_by_day = make_month_events(TARGET_YEAR, TARGET_MONTH, event_count, address_count=args.addresses)
+    device = FakeDevice(events_by_day, rpc_latency=args.rpc_latency, dump_latency=args.dump_latency)
+    android_ui_utils.connect_device = lambda serial=None: device
+
+    distance_options = {
+        'pool_size': args.pool_size,
+        'driver_factory': lambda: FakeWebDriver(page_latency=args.page_latency,
+                                                alternatives_delay=args.alternatives_delay),
+        'stable_window': args.stable_window,
+        'poll_interval': args.poll_interval,
+    }
+
+    previous_folder = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_folder:
+        shutil.copytree(input_folder, os.path.join(work_folder, "files", "input"))
+        os.chdir(work_folder)
+        try:
+            start = time.perf_counter()
+            # The run prints every event and lookup, keep it out of the benchmark output
+            with redirect_stdout(StringIO()):
+                trip_table = process_month(f"{TARGET_MONTH:02}", target_year=TARGET_YEAR,
+                                           distance_options=distance_options, extraction_mode=args.extraction)
+            seconds = time.perf_counter() - start
+        finally:
+            os.chdir(previous_folder)
+
+    lookups = get_run_metrics().counters.get("distance.lookups", 0)
+    return {
+        'events': event_count,
+        'trips': len(trip_table),
+        'lookups': lookups,
+        'seconds': round(seconds, 3),
+        'events_per_s': round(event_count / seconds, 2),
+        'lookups_per_s': round(lookups / seconds, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark process_month on a simulated device and Google Maps.")
+    parser.add_argument("--events", type=int, nargs="+", default=[10, 100, 1000],
+                        help="Events per month of each scenario")
+    parser.add_argument("--addresses", type=int, default=30, help="Distinct places visited in the month")
+    parser.add_argument("--extraction", choices=("dump", "selectors"), default="dump")
+    parser.add_argument("--pool-size", type=int, default=3)
+    parser.add_argument("--rpc-latency", type=float, default=0.01, help="Seconds per device selector call")
+    parser.add_argument("--dump-latency", type=float, default=0.05, help="Seconds per hierarchy dump")
+    parser.add_argument("--page-latency", type=float, default=0.05, help="Seconds per Maps page load")
+    parser.add_argument("--alternatives-delay", type=float, default=0.03,
+                        help="Seconds before alternative routes appear on a page")
+    parser.add_argument("--stable-window", type=float, default=0.04)
+    parser.add_argument("--poll-interval", type=float, default=0.02)
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="Allowed slowdown against the baseline (0.3 = 30%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these timings as the baseline")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "r", encoding="UTF-8") as file:
+            baseline = json.load(file)
+
+    print(f"{'events':>7} {'trips':>6} {'lookups':>8} {'seconds':>8} {'events/s':>9} {'lookups/s':>10} {'baseline':>9}")
+    results = {}
+    regressions = []
+    for event_count in args.events:
+        result = run_scenario(event_count, args)
+        results[str(event_count)] = result
+        reference = baseline.get(str(event_count), {}).get('seconds')
+        print(f"{result['events']:>7} {result['trips']:>6} {result['lookups']:>8} {result['seconds']:>8.2f} "
+              f"{result['events_per_s']:>9.1f} {result['lookups_per_s']:>10.1f} "
+              f"{reference if reference is not None else '-':>9}")
+        if reference is not None and result['seconds'] > reference * (1 + args.tolerance):
+            regressions.append(f"{event_count} events: {result['seconds']:.2f}s against {reference:.2f}s")
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE_PATH, "w", encoding="UTF-8") as file:
+            json.dump(baseline, file, indent=2)
+        print(f"Baseline saved to {BASELINE_PATH}")
+        return 0
+
+    if regressions:
+        print("Slower than the baseline:\n  " + "\n  ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+# bench_pdf_render.py
+# Measures how write_distance_data scales with the number of report rows.
+# Run from the tcomparto-km-auto folder: python benchmarks/bench_pdf_render.py [--rows 1000 5000 10000]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from km_utils import write_distance_data
+from trip_table import TripTable
+
+TEMPLATE_PATH = "./files/input/km_document_model.pdf"
+
+
+def make_trip_table(rows):
+    streets = ["Calle Falsa", "Avenida del Mar", "Calle Real", "Camino de Málaga", "Calle Nueva"]
+    postcodes = ["29730", "29738", "29720"]
+    table = TripTable()
+    for i in range(rows):
+        origin = f"{streets[i % 5]}, {i % 40}, CP: {postcodes[i % 3]}"
+        destination = f"{streets[(i + 2) % 5]}, {i % 17}, CP: {postcodes[(i + 1) % 3]}"
+        table.append(f"{i % 28 + 1:02}/06/2025", origin, destination, f"{(i % 90) / 3 + 1:.1f} km")
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF report rendering.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 2500, 5000, 10000])
+    args = parser.parse_args()
+
+    pdf_data = {'month': {'x1': 302.67, 'y2': 176.71, 'value': "06"},
+                'year': {'x1': 469.33, 'y2': 176.11, 'value': "2025"}}
+
+    print(f"{'rows':>8} {'pages':>6} {'mode':>9} {'seconds':>9} {'rows/s':>9}")
+    with tempfile.TemporaryDirectory() as output_dir:
+        for rows in args.rows:
+            trip_table = make_trip_table(rows)
+            for mode in ("combined", "split"):
+                base_path = os.path.join(output_dir, f"{rows}_{mode}")
+                start = time.perf_counter()
+                pages = write_distance_data(TEMPLATE_PATH, base_path, pdf_data, trip_table,
+                                            combined=mode == "combined", split=mode == "split")
+                elapsed = time.perf_counter() - start
+                print(f"{rows:>8} {pages:>6} {mode:>9} {elapsed:>9.2f} {rows / elapsed:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
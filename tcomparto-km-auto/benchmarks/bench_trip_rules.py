@@ -0,0 +1,72 @@
+# bench_trip_rules.py
+# Micro-benchmark of trip selection: the former per-pair strptime loop against TripRules.evaluate,
+# called once per day (as while scraping) and once for the whole month (as when replaying a checkpoint).
+# Run from the tcomparto-km-auto folder: python benchmarks/bench_trip_rules.py [--events 1000 10000]
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from trip_rules import TripRules
+
+from fakes import make_month_events
+
+
+def strptime_trip_pairs(events):
+    """The selection find_day_trips used to do: strptime on both events of every pair."""
+    fmt = "%H:%M"
+    duration = timedelta()
+    pairs = []
+    for i, (user_time, _, _) in enumerate(events):
+        try:
+            start_str, end_str = [t.strip() for t in user_time.split('-')]
+            start_time = datetime.strptime(start_str, fmt)
+            end_time = datetime.strptime(end_str, fmt)
+            if end_time < start_time:
+                end_time += timedelta(days=1)
+            duration += (end_time - start_time)
+            if i > 0:
+                prev_end_str = events[i - 1][0].split('-')[1].strip()
+                gap = start_time - datetime.strptime(prev_end_str, fmt)
+                if 0 < gap.total_seconds() <= 3600:
+                    pairs.append(i - 1)
+        except ValueError:
+            continue
+    return duration, pairs
+
+
+def best_of(repeat, function):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark trip selection.")
+    parser.add_argument("--events", type=int, nargs="+", default=[300, 1000, 5000],
+                        help="Events per month of each scenario (at most ~5000 fit between 08:00 and 22:00)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rules = TripRules()
+    print(f"{'events':>7} {'trips':>6} {'strptime ms':>12} {'rules/day ms':>13} {'rules/month ms':>15} {'speed-up':>9}")
+    for event_count in args.events:
+        events_by_day = make_month_events(2025, 6, event_count)
+        loop_seconds, loop_pairs = best_of(args.repeat, lambda: [
+            strptime_trip_pairs(events) for events in events_by_day.values()])
+        per_day_seconds, _ = best_of(args.repeat, lambda: [
+            rules.evaluate({day: events}) for day, events in events_by_day.items()])
+        month_seconds, (_, trips) = best_of(args.repeat, lambda: rules.evaluate(events_by_day))
+        assert len(trips) == sum(len(pairs) for _, pairs in loop_pairs)
+        print(f"{event_count:>7} {len(trips):>6} {loop_seconds * 1000:>12.2f} {per_day_seconds * 1000:>13.2f} "
+              f"{month_seconds * 1000:>15.2f} {loop_seconds / month_seconds:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
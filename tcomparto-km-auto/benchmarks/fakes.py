@@ -0,0 +1,364 @@
+# fakes.py
+# Simulated phone and browser for the offline benchmarks: a uiautomator2-like device serving a
+# generated month of events and a WebDriver-like browser serving the HTML fixtures of ./fixtures.
+import hashlib
+import os
+import random
+import re
+import time
+from html.parser import HTMLParser
+from string import Template
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import quoteattr
+
+from selenium.common.exceptions import NoSuchElementException
+
+from android_ui_utils import EVENT_TIME_ID, EVENT_LOCATION_ID, EVENT_USER_ID, MONTH_NAMES
+from gmaps_utils import EXTRACT_ROUTES_JS
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+NOT_FOUND_MARKER = "Calle Inexistente"
+
+STREETS = ["Calle Falsa", "Avenida del Mar", "Calle Real", "Camino de Málaga", "Calle Nueva",
+           "Calle Pintor Sorolla", "Avenida de Andalucía", "Calle Huertas", "Paseo Marítimo", "Calle Alta"]
+POSTCODES = ["29730", "29738", "29720", "29740", "29700"]
+NAMES = ["Ana López", "Juan Pérez", "María García", "Luis Martín", "Carmen Ruiz"]
+
+
+def make_month_events(target_year, target_month, event_count, address_count=30, seed=1):
+    """
+    Spread event_count events over the days of a month (at least 3 per active day, so small
+    scenarios still have trips), visiting address_count distinct places.
+    Returns: {day: [(time, address, name), ...]}
+    """
+    import calendar
+    rng = random.Random(seed)
+    days = calendar.monthrange(target_year, target_month)[1]
+    addresses = [
+        f"{STREETS[i % len(STREETS)]}, {i // len(STREETS) + 1}, CP: {POSTCODES[i % len(POSTCODES)]}"
+        for i in range(address_count - 1)
+    ] + [f"{NOT_FOUND_MARKER}, 1, CP: 29730"]
+
+    events = {day: [] for day in range(1, days + 1)}
+    active_days = max(1, min(days, event_count // 3))
+    for i in range(event_count):
+        events[i % active_days + 1].append(None)
+    for day, day_events in events.items():
+        # Keep a busy day between 08:00 and 22:00
+        step = max(5, min(45, 840 // max(1, len(day_events))))
+        for i in range(len(day_events)):
+            start = 8 * 60 + i * step
+            day_events[i] = (
+                f"{start // 60:02}:{start % 60:02} - {(start + step - 5) // 60:02}:{(start + step - 5) % 60:02}",
+                rng.choice(addresses),
+                rng.choice(NAMES),
+            )
+    return events
+
+
+class FakeSelector:
+    """What d(text=..., resourceId=...) returns: every call costs one RPC round trip."""
+    def __init__(self, device, selector, index=None):
+        self.device = device
+        self.selector = selector
+        self.index = index
+
+    def _matches(self):
+        resource_id = self.selector.get("resourceId")
+        fields = {EVENT_TIME_ID: 0, EVENT_LOCATION_ID: 1, EVENT_USER_ID: 2}
+        if resource_id in fields:
+            return [event[fields[resource_id]] for event in self.device.shown_events()]
+        return None
+
+    @property
+    def exists(self):
+        self.device.rpc()
+        text = self.selector.get("text", "")
+        if text == "ACEPTAR":
+            return self.device.picker_open
+        if "descriptionMatches" in self.selector:
+            return self.device.picker_open and bool(
+                re.match(self.selector["descriptionMatches"], self.device.month_label()))
+        if re.fullmatch(r"\d{2}/\d{2}/\d{4}", text):
+            return not self.device.picker_open and text == self.device.shown_date
+        matches = self._matches()
+        return bool(matches) if matches is not None else True
+
+    def click(self, timeout=None):
+        self.device.rpc()
+        self.device.on_click(self.selector)
+
+    def click_exists(self, timeout=None):
+        self.click(timeout)
+        return True
+
+    def wait(self, timeout=None):
+        return self.exists
+
+    def wait_gone(self, timeout=None):
+        return not self.exists
+
+    def __len__(self):
+        self.device.rpc()
+        return len(self._matches() or [])
+
+    def __getitem__(self, index):
+        return FakeSelector(self.device, self.selector, index)
+
+    def get_text(self):
+        self.device.rpc()
+        return self._matches()[self.index]
+
+
+class FakeDevice:
+    """
+    Stand-in for a uiautomator2 device showing the app's 'Planilla' tab.
+    rpc_latency: Seconds each selector call takes (a USB round trip on a real phone)
+    dump_latency: Seconds a full hierarchy dump takes
+    """
+    def __init__(self, events_by_day, rpc_latency=0.02, dump_latency=0.08):
+        self.events_by_day = events_by_day
+        self.rpc_latency = rpc_latency
+        self.dump_latency = dump_latency
+        self.picker_open = False
+        self.picker_month = None
+        self.picked_day = None
+        self.shown_day = None
+        self.shown_date = None
+        self.rpc_count = 0
+
+    def __call__(self, **selector):
+        return FakeSelector(self, selector)
+
+    def rpc(self, latency=None):
+        self.rpc_count += 1
+        time.sleep(self.rpc_latency if latency is None else latency)
+
+    def on_click(self, selector):
+        text = selector.get("text", "")
+        resource_id = selector.get("resourceId")
+        if text == "ACEPTAR":
+            self.picker_open = False
+            self.shown_day = self.picked_day
+            year, month = divmod(self.picker_month, 12)
+            self.shown_date = f"{self.picked_day:02}/{month + 1:02}/{year}"
+        elif re.fullmatch(r"\d{2}/\d{2}/\d{4}", text):
+            # The picker opens on the month of the date clicked
+            _, month, year = map(int, text.split("/"))
+            self.picker_open = True
+            self.picker_month = year * 12 + month - 1
+        elif resource_id in ("android:id/prev", "android:id/next") and self.picker_open:
+            self.picker_month += -1 if resource_id == "android:id/prev" else 1
+        elif resource_id == "android:id/text1" and text.isdigit():
+            # A year of the picker's year list: same month of that year
+            self.picker_month = int(text) * 12 + self.picker_month % 12
+        elif text.isdigit() and self.picker_open:
+            self.picked_day = int(text)
+
+    def month_label(self):
+        """Content description of the picker's month page, e.g. 'junio de 2025'."""
+        year, month = divmod(self.picker_month, 12)
+        return f"{MONTH_NAMES[month][0]} de {year}"
+
+    def shown_events(self):
+        if self.picker_open or self.shown_day is None:
+            return []
+        return self.events_by_day.get(self.shown_day, [])
+
+    def dump_hierarchy(self):
+        self.rpc(self.dump_latency)
+        nodes = []
+        for event_time, address, name in self.shown_events():
+            nodes.append(
+                '<node class="android.widget.LinearLayout">'
+                f'<node resource-id="{EVENT_TIME_ID}" text={quoteattr(event_time)} />'
+                f'<node resource-id="{EVENT_LOCATION_ID}" text={quoteattr(address)} />'
+                f'<node resource-id="{EVENT_USER_ID}" text={quoteattr(name)} />'
+                '</node>'
+            )
+        return f'<?xml version="1.0" encoding="UTF-8"?><hierarchy rotation="0">{"".join(nodes)}</hierarchy>'
+
+    def app_stop(self, package):
+        self.rpc()
+
+    def app_start(self, package):
+        self.rpc()
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_FOLDER, name), "r", encoding="UTF-8") as file:
+        return Template(file.read())
+
+
+class VisibleDistanceParser(HTMLParser):
+    """
+    Python equivalent of the gmaps_utils extraction scripts: `distances` holds the short visible
+    text nodes matching a distance (EXTRACT_ALL_DISTANCES_JS), `routes` the visible trip cards
+    (EXTRACT_ROUTES_JS). Elements hidden with display:none / visibility:hidden are skipped.
+    """
+    DISTANCE_RE = re.compile(r"\b\d+(?:[.,]\d+)?\s*(?:km|m)\b")
+    DURATION_RE = re.compile(r"\b\d+\s*(?:h|hr|min)\b(?:\s*\d+\s*min\b)?")
+    VOID_TAGS = {"input", "meta", "br", "img", "link", "hr"}
+
+    def __init__(self):
+        super().__init__()
+        self.hidden_depth = 0
+        self.stack = []
+        self.distances = []
+        self.text = []
+        self.routes = []
+        self.route = None
+        self.route_depth = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.VOID_TAGS:
+            return
+        attrs = dict(attrs)
+        style = (attrs.get("style") or "").replace(" ", "")
+        hidden = ("display:none" in style or "visibility:hidden" in style
+                  or "hidden-card" in (attrs.get("class") or "") or tag in ("style", "title", "head"))
+        self.stack.append(hidden)
+        self.hidden_depth += hidden
+        if self.route is None and not self.hidden_depth and "data-trip-index" in attrs:
+            self.route = {'distance': None, 'duration': None, 'label': None}
+            self.route_depth = len(self.stack)
+
+    def handle_endtag(self, tag):
+        if tag in self.VOID_TAGS or not self.stack:
+            return
+        if self.route is not None and len(self.stack) == self.route_depth:
+            if self.route['distance'] is not None:
+                self.routes.append(self.route)
+            self.route = None
+        self.hidden_depth -= self.stack.pop()
+
+    def handle_data(self, data):
+        text = data.strip()
+        if not text or self.hidden_depth:
+            return
+        self.text.append(text)
+        if len(text) <= 80:
+            match = self.DISTANCE_RE.search(text)
+            if match:
+                self.distances.append(match.group())
+            if self.route is not None:
+                duration = self.DURATION_RE.search(text)
+                if self.route['distance'] is None and match:
+                    self.route['distance'] = match.group()
+                elif self.route['duration'] is None and duration:
+                    self.route['duration'] = duration.group()
+                elif self.route['label'] is None and re.match(r"(via|por) ", text, re.IGNORECASE):
+                    self.route['label'] = text
+
+
+NOT_FOUND_TEXTS = ("google maps can't find", "no results found", "could not calculate directions")
+
+
+class FakeWebDriver:
+    """
+    Stand-in for a Selenium WebDriver on google.com/maps.
+    Directions pages are rendered from the fixtures with 3 routes whose lengths are derived from
+    the addresses; alternative routes only appear after `alternatives_delay`, like on the real page.
+    execute_script answers the distance extraction scripts with the Python equivalents above.
+    """
+    sessions = 0
+
+    def __init__(self, page_latency=0.3, alternatives_delay=0.2):
+        FakeWebDriver.sessions += 1
+        self.session_id = f"fake-{FakeWebDriver.sessions}"
+        self.page_latency = page_latency
+        self.alternatives_delay = alternatives_delay
+        self.current_url = "about:blank"
+        self.consent_accepted = False
+        self.directions_page = load_fixture("maps_directions.html")
+        self.route_card = load_fixture("maps_route.html")
+        self.not_found_page = load_fixture("maps_not_found.html")
+        self.page_source = ""
+        self.first_route_source = ""
+        self.loaded_at = 0.0
+        self.switch_to = self
+
+    def get(self, url):
+        time.sleep(self.page_latency)
+        self.current_url = url
+        query = parse_qs(urlparse(url).query)
+        origin = query.get("origin", [""])[0]
+        destination = query.get("destination", [""])[0]
+        if NOT_FOUND_MARKER.lower() in f"{origin} {destination}".lower():
+            self.page_source = self.not_found_page.substitute(destination=destination)
+            self.first_route_source = self.page_source
+        else:
+            routes = self.routes(origin, destination)
+            self.page_source = self.directions_page.substitute(
+                origin=origin, destination=destination,
+                routes="".join(self.route_card.substitute(index=i, **route) for i, route in enumerate(routes)))
+            self.first_route_source = self.directions_page.substitute(
+                origin=origin, destination=destination, routes=self.route_card.substitute(index=0, **routes[0]))
+        self.loaded_at = time.monotonic()
+
+    @staticmethod
+    def routes(origin, destination):
+        digest = int(hashlib.md5(f"{origin}->{destination}".encode("UTF-8")).hexdigest(), 16)
+        base_km = 2 + digest % 400 / 10
+        return [
+            {'distance': f"{base_km * factor:.1f} km".replace(".", ","),
+             'duration': f"{int(base_km * factor * 1.3) + 1} min", 'label': label}
+            for factor, label in ((1.0, "A-7"), (1.12, "MA-20"), (1.31, "Calle Real"))
+        ]
+
+    def visible_page(self):
+        if time.monotonic() - self.loaded_at < self.alternatives_delay:
+            return self.first_route_source
+        return self.page_source
+
+    def execute_script(self, script, *args):
+        parser = VisibleDistanceParser()
+        parser.feed(self.visible_page())
+        if script == EXTRACT_ROUTES_JS:
+            if parser.routes:
+                return parser.routes
+            # The scoped script only reads the pane text when no trip card is shown
+            return "not_found" if self.page_not_found(parser) else None
+        if self.page_not_found(parser):
+            return "not_found"
+        return parser.distances
+
+    @staticmethod
+    def page_not_found(parser):
+        return any(text in " ".join(parser.text).lower() for text in NOT_FOUND_TEXTS)
+
+    def find_element(self, by=None, value=None):
+        if "Accept all" in (value or ""):
+            if self.consent_accepted:
+                raise NoSuchElementException("Consent already accepted")
+            return FakeElement(self)
+        return FakeElement(self)
+
+    def find_elements(self, by=None, value=None):
+        try:
+            return [self.find_element(by, value)]
+        except NoSuchElementException:
+            return []
+
+    def default_content(self):
+        pass
+
+    def set_window_size(self, width, height):
+        pass
+
+    def quit(self):
+        pass
+
+
+class FakeElement:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def click(self):
+        self.driver.consent_accepted = True
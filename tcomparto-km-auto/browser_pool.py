@@ -0,0 +1,156 @@
+import queue
+import threading
+
+from gmaps_utils import start_headless_browser, get_longest_distance_gmaps, close_browser
+from run_metrics import get_run_metrics
+
+
+class BrowserPool:
+    """
+    Spreads Google Maps lookups over several headless browsers.
+    Each worker owns one driver; drivers are started lazily, recycled after
+    `max_uses` lookups and replaced when they stop responding.
+    """
+    def __init__(self, size=3, max_uses=50, retries=2,
+                 driver_factory=start_headless_browser, lookup=get_longest_distance_gmaps,
+                 driver_closer=close_browser):
+        """
+        size: Maximum number of browsers running at the same time
+        max_uses: Lookups served by a driver before it is restarted (None = never)
+        retries: Extra attempts for a pair whose lookup failed (returned None or raised)
+        driver_factory / lookup / driver_closer: Injected so the pool can run on stub drivers
+        """
+        if size < 1:
+            raise ValueError("The browser pool needs at least one browser.")
+        self.size = size
+        self.max_uses = max_uses
+        self.retries = retries
+        self.driver_factory = driver_factory
+        self.lookup = lookup
+        self.driver_closer = driver_closer
+        self.drivers = [None] * size
+        self.uses = [0] * size
+        self.lock = threading.Lock()
+        # Runs sharing the pool (see BrowserService) take turns, a driver serves one lookup at a time
+        self.resolve_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def resolve(self, pairs, lookup=None):
+        """
+        Look up every (origin, destination) pair.
+        lookup: Lookup of this call instead of the pool's (e.g. bound to the calling run's geocode index)
+        Returns: List of distance strings in the same order as `pairs`, None for the pairs that failed
+        """
+        pairs = list(pairs)
+        results = [None] * len(pairs)
+        if not pairs:
+            return results
+
+        work = queue.Queue()
+        for index, pair in enumerate(pairs):
+            work.put((index, pair))
+
+        workers = [
+            threading.Thread(target=self._worker, args=(slot, work, results, lookup or self.lookup), daemon=True)
+            for slot in range(min(self.size, len(pairs)))
+        ]
+        with self.resolve_lock:
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        return results
+
+    def warm_up(self, count=1):
+        """Start the first `count` browsers now instead of on their first lookup."""
+        for slot in range(min(count, self.size)):
+            self._get_driver(slot)
+
+    def check_health(self):
+        """
+        Restart the browsers that stopped responding. Must not run during a resolve.
+        Returns: Number of browsers restarted
+        """
+        restarted = 0
+        for slot in range(self.size):
+            if self.drivers[slot] is not None and not self._is_alive(self.drivers[slot]):
+                print(f"Browser {slot + 1} stopped responding, restarting it")
+                self._discard_driver(slot)
+                self._get_driver(slot)
+                restarted += 1
+        return restarted
+
+    def close(self):
+        for slot in range(self.size):
+            self._discard_driver(slot)
+
+    def _worker(self, slot, work, results, lookup):
+        while True:
+            try:
+                index, (origin, destination) = work.get_nowait()
+            except queue.Empty:
+                return
+            results[index] = self._lookup_with_retry(slot, origin, destination, lookup)
+
+    def _lookup_with_retry(self, slot, origin, destination, lookup):
+        distance = None
+        for attempt in range(self.retries + 1):
+            try:
+                driver = self._get_driver(slot)
+                distance = lookup(origin, destination, driver)
+                self.uses[slot] += 1
+            except Exception as e:
+                print(f"Browser {slot + 1} failed on {origin} -> {destination}: {e}")
+                get_run_metrics().count("gmaps.browser_errors")
+                self._discard_driver(slot)
+                continue
+
+            if distance is not None:
+                return distance
+            if not self._is_alive(self.drivers[slot]):
+                self._discard_driver(slot)
+            if attempt < self.retries:
+                print(f"Retrying {origin} -> {destination} (attempt {attempt + 2})")
+                get_run_metrics().count("gmaps.retries")
+
+        return distance
+
+    def _get_driver(self, slot):
+        # Checked and started under the lock: a warm-up on another thread must not start a second
+        # driver for the same slot. Starting several Firefox instances at once is unreliable anyway.
+        with self.lock:
+            if self.max_uses is not None and self.uses[slot] >= self.max_uses:
+                print(f"Recycling browser {slot + 1} after {self.uses[slot]} lookups")
+                self._discard_driver(slot)
+            if self.drivers[slot] is None:
+                with get_run_metrics().stage("gmaps.start_browser"):
+                    self.drivers[slot] = self.driver_factory()
+                self.uses[slot] = 0
+            return self.drivers[slot]
+
+    def _discard_driver(self, slot):
+        driver = self.drivers[slot]
+        self.drivers[slot] = None
+        self.uses[slot] = 0
+        if driver is None:
+            return
+        try:
+            self.driver_closer(driver)
+        except Exception as e:
+            print(f"Could not close browser {slot + 1}: {e}")
+
+    @staticmethod
+    def _is_alive(driver):
+        if driver is None:
+            return False
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
@@ -0,0 +1,139 @@
+import functools
+import os
+import threading
+
+from browser_pool import BrowserPool
+from gmaps_utils import start_headless_browser, close_browser, get_longest_distance_gmaps
+
+DEFAULT_PROFILE_FOLDER = "./files/cache/browser_profiles"
+HEALTH_CHECK_SECONDS = 60
+
+
+class ProfileDriverFactory:
+    """
+    Starts each browser on one of `size` persistent Firefox profiles, so the Google consent
+    cookie and the HTTP cache survive restarts. A profile is handed back when its browser closes,
+    because two running browsers cannot share one profile.
+    """
+    def __init__(self, size, folder=DEFAULT_PROFILE_FOLDER, driver_factory=start_headless_browser,
+                 driver_closer=close_browser):
+        self.free_profiles = [os.path.join(folder, f"firefox_{slot + 1}") for slot in range(size)]
+        self.profiles_in_use = {}
+        self.driver_factory = driver_factory
+        self.driver_closer = driver_closer
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            profile_path = self.free_profiles.pop(0)
+        try:
+            driver = self.driver_factory(profile_path=profile_path)
+        except Exception:
+            with self.lock:
+                self.free_profiles.append(profile_path)
+            raise
+        with self.lock:
+            self.profiles_in_use[id(driver)] = profile_path
+        return driver
+
+    def close(self, driver):
+        try:
+            self.driver_closer(driver)
+        finally:
+            with self.lock:
+                self.free_profiles.append(self.profiles_in_use.pop(id(driver)))
+
+
+class BrowserService:
+    """
+    Browser pool that outlives report runs: the GUI (or any long-lived process) keeps it warm
+    and every run attaches to it instead of starting Firefox. While no run is attached, a
+    background thread checks the browsers every HEALTH_CHECK_SECONDS and restarts dead ones.
+    """
+    def __init__(self, pool_size=3, max_uses=200, retries=2, profile_folder=DEFAULT_PROFILE_FOLDER,
+                 driver_factory=None, health_check_seconds=HEALTH_CHECK_SECONDS, browser_mode="standard"):
+        """
+        max_uses: Lookups served by a browser before it is restarted, to bound Firefox's memory growth
+        driver_factory: Starts a WebDriver; defaults to a headless Firefox on a persistent profile
+        browser_mode: 'standard' or 'lean' Firefox (see gmaps_utils.start_headless_browser)
+        """
+        if driver_factory is None:
+            profiles = ProfileDriverFactory(pool_size, os.path.join(profile_folder, browser_mode),
+                                            functools.partial(start_headless_browser, mode=browser_mode))
+            driver_factory, driver_closer = profiles.start, profiles.close
+        else:
+            driver_closer = close_browser
+        self.pool = BrowserPool(size=pool_size, max_uses=max_uses, retries=retries, driver_factory=driver_factory,
+                                lookup=get_longest_distance_gmaps, driver_closer=driver_closer)
+        self.health_check_seconds = health_check_seconds
+        self.attached = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.health_thread = threading.Thread(target=self._health_loop, daemon=True)
+        self.health_thread.start()
+
+    def warm_up(self, count=None):
+        """Start `count` browsers now (all of them by default)."""
+        with self.lock:
+            self.pool.warm_up(self.pool.size if count is None else count)
+
+    def attach(self):
+        """
+        Lend the pool to a run, after restarting any browser that died since the last one.
+        The run passes its own lookup (bound to its geocode index and options) to every resolve,
+        so runs attached at the same time never use each other's.
+        Returns: The BrowserPool; hand it back with detach()
+        """
+        with self.lock:
+            if self.attached == 0:
+                self.pool.check_health()
+            self.attached += 1
+            return self.pool
+
+    def detach(self):
+        with self.lock:
+            self.attached -= 1
+
+    def check_health(self):
+        """Restart dead browsers unless a run is using them. Returns: Number of browsers restarted"""
+        with self.lock:
+            if self.attached:
+                return 0
+            return self.pool.check_health()
+
+    def close(self):
+        self.stop_event.set()
+        with self.lock:
+            self.pool.close()
+
+    def _health_loop(self):
+        while not self.stop_event.wait(self.health_check_seconds):
+            try:
+                self.check_health()
+            except Exception as e:
+                print(f"Browser health check failed: {e}")
+
+
+_browser_service = None
+_browser_service_lock = threading.Lock()
+
+
+def get_browser_service(**service_options):
+    """
+    The process-wide BrowserService, started on first use.
+    service_options: BrowserService arguments, only used when the service is created
+    """
+    global _browser_service
+    with _browser_service_lock:
+        if _browser_service is None:
+            _browser_service = BrowserService(**service_options)
+        return _browser_service
+
+
+def shutdown_browser_service():
+    """Close the process-wide browsers (e.g. when the GUI window closes)."""
+    global _browser_service
+    with _browser_service_lock:
+        service, _browser_service = _browser_service, None
+    if service is not None:
+        service.close()
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+
+from file_utils import month_file_stem
+
+DEFAULT_CHECKPOINT_FOLDER = "./files/cache/checkpoints"
+
+
+def checkpoint_path(target_month, target_year, folder=DEFAULT_CHECKPOINT_FOLDER, label=None):
+    """label: Device the run belongs to, when several phones are processed (see process_devices)"""
+    return os.path.join(folder, f"km_{month_file_stem(target_month, target_year, label)}.jsonl")
+
+
+def day_fingerprint(events):
+    """Hash of a day's scraped (time, address, name) rows, to tell whether the day changed since a previous run."""
+    rows = json.dumps([list(event) for event in events], ensure_ascii=False)
+    return hashlib.sha1(rows.encode("UTF-8")).hexdigest()
+
+
+class CheckpointJournal:
+    """
+    Append-only journal of a month run. Each completed day is one JSON line holding
+    its scraped events and the distances resolved for its trips; a line is flushed
+    and fsynced before the next day starts, so a crash loses at most the day in progress.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def load(self):
+        """
+        Read the completed days of a previous run. A day recorded again by a refresh
+        (see MonthRun) is read from its last line.
+        Returns: {day: {'events': [[time, address, name], ...], 'distances': [[origin, destination, distance], ...],
+                        'fingerprint': day_fingerprint(events)}}
+        """
+        days = {}
+        if not os.path.exists(self.path):
+            return days
+        with open(self.path, "r", encoding="UTF-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash in the middle of a write leaves a truncated last line
+                    print(f"Ignoring incomplete checkpoint line in {self.path}")
+                    continue
+                days[record["day"]] = {
+                    'events': record["events"],
+                    'distances': record["distances"],
+                    # Journals written before fingerprints were stored
+                    'fingerprint': record.get("fingerprint") or day_fingerprint(record["events"]),
+                }
+        return days
+
+    def record_day(self, day, events, distances):
+        """
+        Append a completed day.
+        events: The day's (time, address, name) rows
+        distances: (origin, destination, distance) of the routes its trips use
+        """
+        line = json.dumps({
+            "day": day,
+            "events": [list(event) for event in events],
+            "distances": [list(distance) for distance in distances],
+            "fingerprint": day_fingerprint(events)
+        }, ensure_ascii=False)
+        with open(self.path, "a", encoding="UTF-8") as file:
+            file.write(line + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,117 @@
+# cli.py
+"""
+Headless entry point, e.g. for cron:
+
+    python cli.py 06 2025
+    python cli.py 01 2025 --until 12/2025 --backend osm
+    python cli.py 06 2025 --source txt --pdf-output combined
+    python cli.py 06 2025 --device ana=R58M12345 --device luis=192.168.1.20:5555
+"""
+import argparse
+import sys
+
+from process_events import device_label
+from report_api import generate_report, REPORT_SOURCES
+
+
+def parse_month_year(value):
+    """'12/2025' -> (2025, 12)"""
+    try:
+        month, year = value.split("/")
+        return int(year), int(month)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected MM/YYYY, got '{value}'")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Generate T-Comparto monthly kilometre reports.")
+    parser.add_argument("month", help="Month of the report (e.g. 06)")
+    parser.add_argument("year", nargs="?", help="Year of the report (defaults to the current year)")
+    parser.add_argument("--until", type=parse_month_year, metavar="MM/YYYY",
+                        help="Last month of a range of reports, inclusive")
+    parser.add_argument("--source", choices=REPORT_SOURCES, default="device",
+                        help="device: scrape the phone; checkpoint: recompute from saved checkpoints; "
+                             "txt: re-render the PDF from the TXT report")
+    parser.add_argument("--device", action="append", dest="devices", metavar="[NAME=]SERIAL",
+                        help="Phone to process (USB serial or Wi-Fi ADB address), repeatable: several "
+                             "phones are processed in parallel, with one report per phone")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted device run")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Re-scrape the month but only look up the days that changed since the last run "
+                             "and only redraw their PDF pages")
+    parser.add_argument("--backend", choices=("gmaps", "osm"), default="gmaps", help="Distance backend")
+    parser.add_argument("--pool-size", type=int, help="Headless browsers of the gmaps backend")
+    parser.add_argument("--browser-mode", choices=("standard", "lean"), default="standard",
+                        help="lean: block images, fonts and trackers and use a smaller window (gmaps backend)")
+    parser.add_argument("--osm-path", help="OpenStreetMap extract of the osm backend")
+    parser.add_argument("--full-matrix", action="store_true",
+                        help="Resolve every pair of the month's locations")
+    parser.add_argument("--extraction", choices=("dump", "selectors"), default="dump",
+                        help="How events are read from the device")
+    parser.add_argument("--pdf-output", choices=("split", "combined", "both"), default="split")
+    parser.add_argument("--export", action="append", choices=("csv", "parquet"), default=[],
+                        help="Extra trip table file next to the TXT report (repeatable)")
+    parser.add_argument("--trace", action="store_true",
+                        help="Also save a Chrome trace of the run next to its JSON run summary")
+    parser.add_argument("--cache-ttl-days", type=int, help="Age after which cached distances are looked up again")
+    return parser
+
+
+def parse_devices(values):
+    """['ana=R58M12345', '192.168.1.20:5555'] -> {'ana': 'R58M12345', '192.168.1.20_5555': '192.168.1.20:5555'}"""
+    if not values:
+        return None
+    devices = {}
+    for value in values:
+        label, _, serial = value.rpartition("=")
+        devices[label or device_label(serial)] = serial
+    return devices
+
+
+def print_status(message, status_type):
+    stream = sys.stderr if status_type == "error" else sys.stdout
+    print(f"[{status_type}] {message}", file=stream)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    options = {"pdf_output": args.pdf_output, "exports": tuple(args.export)}
+    if args.source != "txt":
+        distance_options = {}
+        if args.pool_size:
+            distance_options["pool_size"] = args.pool_size
+        if args.osm_path:
+            distance_options["osm_path"] = args.osm_path
+        options.update(
+            distance_backend=args.backend,
+            distance_options=distance_options,
+            cache_ttl_days=args.cache_ttl_days,
+            full_matrix=args.full_matrix,
+            extraction_mode=args.extraction,
+            trace=args.trace,
+        )
+        if args.source == "device":
+            options["resume"] = args.resume
+            options["refresh"] = args.refresh
+            if args.backend == "gmaps":
+                # Persistent browser profiles: the Google consent is only answered on the first run
+                from browser_service import get_browser_service
+                distance_options["browser_service"] = get_browser_service(pool_size=args.pool_size or 3,
+                                                                          browser_mode=args.browser_mode)
+
+    try:
+        generate_report(args.month, args.year, until=args.until, source=args.source,
+                        status_callback=print_status, devices=parse_devices(args.devices), **options)
+    except Exception as e:
+        print_status(f"Program failed: {e}", "error")
+        return 1
+    finally:
+        if "browser_service" in options.get("distance_options", {}):
+            from browser_service import shutdown_browser_service
+            shutdown_browser_service()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+import os
+import sqlite3
+import threading
+import time
+
+from distance_providers import NOT_FOUND_DISTANCE
+
+DEFAULT_CACHE_PATH = "./files/cache/distances.sqlite3"
+# A route Google could not find may be a passing failure: it is only trusted for a day
+NOT_FOUND_TTL_SECONDS = 86400
+
+
+def route_key(origin, destination):
+    """Cache key of a route, e.g. 'calle falsa 29730 -> avenida del mar 29720'."""
+    return f"{origin} -> {destination}".lower()
+
+
+class DistanceCache:
+    """
+    Persistent route-distance store backed by SQLite.
+    Keys are the normalized 'origin -> destination' strings of route_key (see find_month_trips),
+    values are the distance strings returned by Google Maps (e.g. '8,5 km').
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=None, max_entries=None,
+                 not_found_ttl_seconds=NOT_FOUND_TTL_SECONDS):
+        """
+        path: SQLite file, created on first use (':memory:' for a throwaway cache)
+        ttl_seconds: Entries older than this are treated as missing (None = never expire)
+        max_entries: Least recently used entries are evicted above this size (None = unbounded)
+        not_found_ttl_seconds: Same for NOT_FOUND_DISTANCE entries, which are looked up again sooner
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.not_found_ttl_seconds = not_found_ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # Several scraping workers may share one cache (see process_devices)
+        self.lock = threading.RLock()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS distances ("
+            "route TEXT PRIMARY KEY, "
+            "distance TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        # Routes removed on purpose by invalidate(): the copies saved in month matrices and
+        # checkpoints are cleared too (see DistanceMatrix.sync_with_cache), until the route is stored again
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS invalidated ("
+            "route TEXT PRIMARY KEY, "
+            "invalidated_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def normalize_key(route):
+        return " ".join(route.split()).lower()
+
+    def get(self, route, default=None):
+        """Return the cached distance for a route, or default on a miss."""
+        with self.lock:
+            key = self.normalize_key(route)
+            row = self.conn.execute(
+                "SELECT distance, created_at FROM distances WHERE route = ?", (key,)
+            ).fetchone()
+            now = time.time()
+
+            if row is None or self._expired(row[0], row[1], now):
+                if row is not None:
+                    self.conn.execute("DELETE FROM distances WHERE route = ?", (key,))
+                    self.conn.commit()
+                self.misses += 1
+                return default
+
+            self.conn.execute("UPDATE distances SET last_used = ? WHERE route = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def get_many(self, routes):
+        """
+        Cached distances of several routes in one query (hit/miss statistics are not counted).
+        Returns: {normalized route: distance} of the routes that are cached and not expired
+        """
+        keys = list({self.normalize_key(route) for route in routes})
+        found = {}
+        with self.lock:
+            now = time.time()
+            # SQLite limits the number of parameters of one statement
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT route, distance, created_at FROM distances WHERE route IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                found.update((route, distance) for route, distance, created_at in rows
+                             if not self._expired(distance, created_at, now))
+            if found:
+                self.conn.executemany("UPDATE distances SET last_used = ? WHERE route = ?",
+                                      [(now, route) for route in found])
+                self.conn.commit()
+        return found
+
+    def invalidated_routes(self, routes):
+        """Returns: The normalized routes among `routes` removed by invalidate() and not stored since."""
+        keys = list({self.normalize_key(route) for route in routes})
+        invalidated = set()
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT route FROM invalidated WHERE route IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                invalidated.update(route for route, in rows)
+        return invalidated
+
+    def set(self, route, distance):
+        """Store a distance for a route and apply the eviction policy."""
+        with self.lock:
+            key = self.normalize_key(route)
+            now = time.time()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO distances (route, distance, created_at, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (key, distance, now, now)
+            )
+            self.conn.execute("DELETE FROM invalidated WHERE route = ?", (key,))
+            self._evict(now)
+            self.conn.commit()
+
+    def invalidate(self, route):
+        """
+        Remove a single route from the cache, and from the saved matrices and checkpoints
+        of the months run after this, so it is looked up again. Returns True if it was cached.
+        """
+        with self.lock:
+            key = self.normalize_key(route)
+            cursor = self.conn.execute("DELETE FROM distances WHERE route = ?", (key,))
+            self.conn.execute("INSERT OR REPLACE INTO invalidated (route, invalidated_at) VALUES (?, ?)",
+                              (key, time.time()))
+            self.conn.commit()
+            return cursor.rowcount > 0
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM distances")
+            self.conn.commit()
+
+    def __contains__(self, route):
+        with self.lock:
+            key = self.normalize_key(route)
+            row = self.conn.execute(
+                "SELECT distance, created_at FROM distances WHERE route = ?", (key,)
+            ).fetchone()
+            return row is not None and not self._expired(row[0], row[1], time.time())
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM distances").fetchone()[0]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _ttl(self, distance):
+        if distance != NOT_FOUND_DISTANCE or self.not_found_ttl_seconds is None:
+            return self.ttl_seconds
+        if self.ttl_seconds is None:
+            return self.not_found_ttl_seconds
+        return min(self.ttl_seconds, self.not_found_ttl_seconds)
+
+    def _expired(self, distance, created_at, now):
+        ttl = self._ttl(distance)
+        return ttl is not None and now - created_at > ttl
+
+    def _evict(self, now):
+        if self.ttl_seconds is not None:
+            self.conn.execute(
+                "DELETE FROM distances WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+        if self.not_found_ttl_seconds is not None:
+            self.conn.execute(
+                "DELETE FROM distances WHERE distance = ? AND created_at < ?",
+                (NOT_FOUND_DISTANCE, now - self.not_found_ttl_seconds)
+            )
+        if self.max_entries is not None:
+            self.conn.execute(
+                "DELETE FROM distances WHERE route NOT IN ("
+                "SELECT route FROM distances ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,)
+            )
@@ -0,0 +1,168 @@
+import json
+import os
+
+from distance_cache import route_key
+from distance_providers import NOT_FOUND_DISTANCE
+from file_utils import month_file_stem
+from run_metrics import get_run_metrics
+
+DEFAULT_MATRIX_FOLDER = "./files/output/distance_matrices"
+
+
+def matrix_path(target_month, target_year, folder=DEFAULT_MATRIX_FOLDER, label=None):
+    return os.path.join(folder, f"matrix_{month_file_stem(target_month, target_year, label)}.json")
+
+
+class DistanceMatrix:
+    """
+    N×N table of distance strings between the unique locations of a month.
+    Cells are None until resolved; locations can be added as new days are scraped.
+    """
+    def __init__(self, locations=()):
+        self.locations = []
+        self.index = {}
+        self.cells = []
+        for location in locations:
+            self.add_location(location)
+
+    @staticmethod
+    def _key(location):
+        return " ".join(location.split()).lower()
+
+    def add_location(self, location):
+        """Add a location (no-op if already present). Returns its row/column index."""
+        key = self._key(location)
+        if key in self.index:
+            return self.index[key]
+        self.index[key] = len(self.locations)
+        self.locations.append(location)
+        for row in self.cells:
+            row.append(None)
+        self.cells.append([None] * len(self.locations))
+        return self.index[key]
+
+    def get(self, origin, destination):
+        i = self.index.get(self._key(origin))
+        j = self.index.get(self._key(destination))
+        if i is None or j is None:
+            return None
+        return self.cells[i][j]
+
+    def set(self, origin, destination, distance):
+        i = self.add_location(origin)
+        j = self.add_location(destination)
+        self.cells[i][j] = distance
+
+    def missing_pairs(self):
+        """Every off-diagonal (origin, destination) pair that has no distance yet."""
+        return [
+            (origin, destination)
+            for i, origin in enumerate(self.locations)
+            for j, destination in enumerate(self.locations)
+            if i != j and self.cells[i][j] is None
+        ]
+
+    def sync_with_cache(self, cache):
+        """
+        Bring the resolved cells in line with the cache: a cell whose route the cache holds with
+        another distance takes the cache's, and a cell whose route was invalidated is cleared so
+        it is looked up again. Routes merely evicted or expired from the cache keep their cell,
+        so a saved matrix or checkpoint still rebuilds its report on its own; except for
+        NOT_FOUND_DISTANCE, only trusted while the cache holds it (see NOT_FOUND_TTL_SECONDS).
+        Returns: Number of cells cleared or changed
+        """
+        resolved = [
+            (i, j, cache.normalize_key(route_key(origin, destination)))
+            for i, origin in enumerate(self.locations)
+            for j, destination in enumerate(self.locations)
+            if self.cells[i][j] is not None
+        ]
+        routes = [route for _, _, route in resolved]
+        cached = cache.get_many(routes)
+        invalidated = cache.invalidated_routes(route for route in routes if route not in cached)
+        changed = 0
+        for i, j, route in resolved:
+            if route in cached:
+                distance = cached[route]
+            elif route in invalidated or self.cells[i][j] == NOT_FOUND_DISTANCE:
+                distance = None
+            else:
+                continue
+            if distance != self.cells[i][j]:
+                self.cells[i][j] = distance
+                changed += 1
+        if changed:
+            get_run_metrics().count("matrix.stale_cells", changed)
+            print(f"{changed} saved distance(s) differ from the distance cache and are refreshed")
+        return changed
+
+    def fill(self, distance_provider, pairs=None, cache=None):
+        """
+        Resolve missing cells in one batch.
+        pairs: (origin, destination) pairs to fill; None fills the whole matrix
+        cache: Optional DistanceCache consulted before, and updated after, the provider
+        Returns: Number of pairs sent to the provider
+        """
+        metrics = get_run_metrics()
+        pairs = self.missing_pairs() if pairs is None else pairs
+        pending = []
+        pending_keys = set()
+        for origin, destination in pairs:
+            pair_key = (self._key(origin), self._key(destination))
+            if self.get(origin, destination) is not None or pair_key in pending_keys:
+                continue
+            distance = cache.get(route_key(origin, destination)) if cache is not None else None
+            if cache is not None:
+                metrics.count("cache.misses" if distance is None else "cache.hits")
+            if distance is None:
+                pending.append((origin, destination))
+                pending_keys.add(pair_key)
+            else:
+                print(f"Distance retrieved for {origin} -> {destination}: {distance}")
+                self.set(origin, destination, distance)
+
+        if not pending:
+            # Nothing to look up: the backend (and its browsers) are never started
+            return 0
+
+        with metrics.stage("distance.lookup_batch", pairs=len(pending)):
+            distances = distance_provider.get_distances(pending)
+        metrics.count("distance.lookups", len(pending))
+        for (origin, destination), distance in zip(pending, distances):
+            if distance is None:
+                # Failed lookup: the cell stays empty and is tried again by the next fill
+                metrics.count("distance.failed")
+                print(f"Distance lookup failed for {origin} -> {destination}")
+                continue
+            if distance == NOT_FOUND_DISTANCE:
+                metrics.count("distance.not_found")
+            if cache is not None:
+                cache.set(route_key(origin, destination), distance)
+            print(f"Distance calculated for {origin} -> {destination}: {distance}")
+            self.set(origin, destination, distance)
+
+        return len(pending)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="UTF-8") as file:
+            json.dump({"locations": self.locations, "distances": self.cells}, file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a saved matrix, or return an empty one if the file does not exist.
+        '0 km' cells are failed lookups saved by older versions, so they are cleared to be resolved again.
+        """
+        matrix = cls()
+        if not os.path.exists(path):
+            return matrix
+        with open(path, "r", encoding="UTF-8") as file:
+            data = json.load(file)
+        for location in data["locations"]:
+            matrix.add_location(location)
+        matrix.cells = [
+            [None if distance == "0 km" else distance for distance in row]
+            for row in data["distances"]
+        ]
+        return matrix
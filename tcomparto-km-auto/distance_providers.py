@@ -0,0 +1,276 @@
+import functools
+import queue
+import threading
+from concurrent.futures import Future
+
+from geocode_index import GeocodeIndex
+
+NOT_FOUND_DISTANCE = "9999 km"
+
+# Request of SharedDistanceProvider's stage thread that starts the backend instead of resolving pairs
+WARM_UP = object()
+
+
+class DistanceProvider:
+    """
+    Common interface of the distance backends used by process_month.
+    Distances are returned as strings like '8.5 km', the format of get_longest_distance_gmaps;
+    a lookup that failed (and may succeed when tried again) is returned as None.
+    """
+    name = "base"
+
+    def get_distance(self, origin, destination):
+        return self.get_distances([(origin, destination)])[0]
+
+    def get_distances(self, pairs):
+        """Resolve a batch of (origin, destination) pairs, results in the same order."""
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Pay the backend's startup cost ahead of the first lookup (e.g. while the phone is navigated)."""
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class GoogleMapsProvider(DistanceProvider):
+    """Scrapes google.com/maps with a pool of headless browsers."""
+    name = "gmaps"
+
+    def __init__(self, pool_size=3, max_uses=50, retries=2, geocode_index=None, driver_factory=None,
+                 browser_service=None, browser_mode="standard", **lookup_options):
+        """
+        driver_factory: Starts a WebDriver (defaults to a headless Firefox)
+        browser_mode: 'standard' or 'lean' Firefox (see gmaps_utils.start_headless_browser)
+        browser_service: BrowserService to borrow warm browsers from instead of starting a pool
+                         (pool_size, max_uses, retries and driver_factory are then the service's)
+        lookup_options: Passed on to get_longest_distance_gmaps (max_wait, stable_window, poll_interval)
+        """
+        # Selenium is only loaded when this backend is actually used
+        from browser_pool import BrowserPool
+        from gmaps_utils import get_longest_distance_gmaps, start_headless_browser
+
+        self.geocode_index = geocode_index if geocode_index is not None else GeocodeIndex()
+        self.lookup = functools.partial(get_longest_distance_gmaps, geocode_index=self.geocode_index,
+                                        **lookup_options)
+        self.browser_service = browser_service
+        if browser_service is not None:
+            self.browser_pool = browser_service.attach()
+        else:
+            self.browser_pool = BrowserPool(
+                size=pool_size, max_uses=max_uses, retries=retries,
+                driver_factory=driver_factory or functools.partial(start_headless_browser, mode=browser_mode),
+                lookup=self.lookup
+            )
+
+    def get_distances(self, pairs):
+        # A pool borrowed from a BrowserService may be shared with another run: pass this run's lookup
+        return self.browser_pool.resolve(pairs, lookup=self.lookup)
+
+    def warm_up(self):
+        self.browser_pool.warm_up()
+
+    def close(self):
+        if self.browser_service is not None:
+            # The browsers stay open for the next run
+            self.browser_service.detach()
+        else:
+            self.browser_pool.close()
+        self.geocode_index.save()
+
+
+class OsmProvider(DistanceProvider):
+    """
+    Computes driving distances locally on a road graph built from an OpenStreetMap extract,
+    returning the longest of k alternative routes like the Google Maps backend.
+    """
+    name = "osm"
+
+    def __init__(self, osm_path=None, alternatives=3, geocode_index=None):
+        from osm_routing import RoadGraph, DEFAULT_OSM_PATH
+        self.graph = RoadGraph.load(osm_path or DEFAULT_OSM_PATH)
+        self.alternatives = alternatives
+        self.geocode_index = geocode_index if geocode_index is not None else GeocodeIndex()
+        self.routes = {}
+
+    def get_distances(self, pairs):
+        return [self._route_distance(origin, destination) for origin, destination in pairs]
+
+    def _route_distance(self, origin, destination):
+        key = (origin, destination)
+        if key in self.routes:
+            return self.routes[key]
+
+        origin_coords = self._geocode(origin)
+        destination_coords = self._geocode(destination)
+        if origin_coords is None or destination_coords is None:
+            print(f"Address not found: {origin} -> {destination}")
+            self.routes[key] = NOT_FOUND_DISTANCE
+            return NOT_FOUND_DISTANCE
+
+        origin_node = self.graph.nearest_node(*origin_coords)
+        destination_node = self.graph.nearest_node(*destination_coords)
+        if origin_node is None or destination_node is None:
+            # The coordinates lie outside the extract's road network
+            print(f"No road near: {origin} -> {destination}")
+            self.routes[key] = NOT_FOUND_DISTANCE
+            return NOT_FOUND_DISTANCE
+
+        routes = self.graph.alternative_routes(origin_node, destination_node, k=self.alternatives)
+        distance = f"{max(routes) / 1000:.1f} km" if routes else NOT_FOUND_DISTANCE
+        self.routes[key] = distance
+        return distance
+
+    def _geocode(self, address):
+        # Coordinates confirmed by Google or the overrides file beat the extract's own address tags
+        coords = self.geocode_index.lookup(address)
+        return coords if coords is not None else self.graph.geocode(address)
+
+
+DISTANCE_PROVIDERS = {
+    GoogleMapsProvider.name: GoogleMapsProvider,
+    OsmProvider.name: OsmProvider,
+}
+
+
+class LazyDistanceProvider(DistanceProvider):
+    """
+    Wraps a backend that is only created on the first lookup, so runs that find every
+    distance in the cache or the checkpoint never import or start it.
+    """
+    def __init__(self, backend="gmaps", **options):
+        self.backend = backend
+        self.options = options
+        self.provider = None
+        self.name = backend
+        # warm_up may run on another thread than the first lookup
+        self.lock = threading.Lock()
+
+    @property
+    def started(self):
+        return self.provider is not None
+
+    def get_distances(self, pairs):
+        if not pairs:
+            return []
+        return self._get_provider().get_distances(pairs)
+
+    def warm_up(self):
+        self._get_provider().warm_up()
+
+    def _get_provider(self):
+        with self.lock:
+            if self.provider is None:
+                self.provider = create_distance_provider(self.backend, **self.options)
+            return self.provider
+
+    def close(self):
+        if self.provider is not None:
+            self.provider.close()
+            self.provider = None
+
+
+class SharedDistanceProvider(DistanceProvider):
+    """
+    Single distance-resolution stage fed by several scraping workers (one per phone).
+    Lookups requested while a batch is running are merged into the next one, each distinct
+    pair is resolved once, and only this stage's thread talks to the wrapped backend
+    (warm-ups included: the first one starts it, the others wait for it).
+    The wrapped backend is not closed here, it belongs to the session that created it.
+    """
+    def __init__(self, provider):
+        self.provider = provider
+        self.name = provider.name
+        self.requests = queue.Queue()
+        self.thread = None
+        self.warmed_up = False
+        self.lock = threading.Lock()
+
+    @property
+    def started(self):
+        return getattr(self.provider, "started", True)
+
+    def warm_up(self):
+        self._submit(WARM_UP)
+
+    def get_distances(self, pairs):
+        pairs = list(pairs)
+        if not pairs:
+            return []
+        return self._submit(pairs)
+
+    def _submit(self, request):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._resolve_requests, daemon=True)
+                self.thread.start()
+        future = Future()
+        self.requests.put((request, future))
+        return future.result()
+
+    def close(self):
+        with self.lock:
+            if self.thread is not None:
+                self.requests.put(None)
+                self.thread.join()
+                self.thread = None
+
+    def _resolve_requests(self):
+        stopping = False
+        while not stopping:
+            request = self.requests.get()
+            if request is None:
+                return
+            batch = [request]
+            # Take every request that arrived while the previous batch was resolved
+            while True:
+                try:
+                    request = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+
+            warm_ups = [future for pairs, future in batch if pairs is WARM_UP]
+            if warm_ups:
+                batch = [(pairs, future) for pairs, future in batch if pairs is not WARM_UP]
+                try:
+                    if not self.warmed_up:
+                        self.provider.warm_up()
+                        self.warmed_up = True
+                except Exception as e:
+                    for future in warm_ups:
+                        future.set_exception(e)
+                else:
+                    for future in warm_ups:
+                        future.set_result(None)
+                if not batch:
+                    continue
+
+            unique_pairs = list(dict.fromkeys(pair for pairs, _ in batch for pair in pairs))
+            try:
+                distances = dict(zip(unique_pairs, self.provider.get_distances(unique_pairs)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for pairs, future in batch:
+                future.set_result([distances[pair] for pair in pairs])
+
+
+def create_distance_provider(backend="gmaps", **options):
+    """Instantiate a distance backend by name ('gmaps' or 'osm')."""
+    try:
+        provider_class = DISTANCE_PROVIDERS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown distance backend '{backend}'. Options: {', '.join(DISTANCE_PROVIDERS)}")
+    return provider_class(**options)
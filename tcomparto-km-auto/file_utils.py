@@ -1,5 +1,10 @@
 from pathlib import Path
 
+def month_file_stem(target_month, target_year, label=None):
+    """'06_2025', or '06_2025_ana' for the reports of a device label (see process_devices)."""
+    stem = f"{int(target_month):02}_{target_year}"
+    return f"{stem}_{label}" if label else stem
+
 def create_folder(folder_path):
     Path(folder_path).mkdir(parents=True, exist_ok=True)
     print(f"Folder: {folder_path} created")
@@ -16,4 +21,17 @@ def delete_all_files(folder_path):
             file.unlink()
             files_deleted += 1
 
-    print(f"{files_deleted} file(s) deleted in '{folder_path}'")
\ No newline at end of file
+    print(f"{files_deleted} file(s) deleted in '{folder_path}'")
+
+def delete_files_with_prefix(folder_path, prefix):
+    folder = Path(folder_path)
+    if not folder.exists():
+        return
+
+    files_deleted = 0
+    for file in folder.glob(f"{prefix}*"):
+        if file.is_file():
+            file.unlink()
+            files_deleted += 1
+
+    print(f"{files_deleted} file(s) starting with '{prefix}' deleted in '{folder_path}'")
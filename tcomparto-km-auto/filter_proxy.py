@@ -0,0 +1,148 @@
+import select
+import socket
+import socketserver
+import threading
+from urllib.parse import urlsplit
+
+from run_metrics import get_run_metrics
+
+# Hosts a Maps lookup never needs: satellite/street imagery, web fonts, analytics and logging
+DEFAULT_BLOCKED_HOSTS = (
+    "khms0.google.com", "khms1.google.com", "khms2.google.com", "khms3.google.com",
+    "streetviewpixels-pa.googleapis.com", "geo0.ggpht.com", "geo1.ggpht.com", "geo2.ggpht.com", "geo3.ggpht.com",
+    "lh3.googleusercontent.com", "lh5.googleusercontent.com",
+    "fonts.googleapis.com", "fonts.gstatic.com",
+    "www.google-analytics.com", "ssl.google-analytics.com", "www.googletagmanager.com",
+    "play.google.com", "ogs.google.com", "adservice.google.com", "googleads.g.doubleclick.net",
+)
+PIPE_BUFFER_SIZE = 65536
+CONNECT_TIMEOUT = 10
+
+
+def is_blocked(host, blocked_hosts):
+    """True for a blocked host or any subdomain of one."""
+    host = host.lower().rstrip(".")
+    return any(host == blocked or host.endswith("." + blocked) for blocked in blocked_hosts)
+
+
+class FilterProxyHandler(socketserver.BaseRequestHandler):
+    """
+    One browser connection: HTTPS goes through CONNECT tunnels, plain HTTP requests are forwarded
+    with their absolute URL rewritten. Blocked hosts get a 403 before any upstream connection is made.
+    """
+    def handle(self):
+        head = self._read_head()
+        if not head:
+            return
+        request_line, _, rest = head.partition(b"\r\n")
+        try:
+            method, target, version = request_line.decode("latin-1").split(" ")
+        except ValueError:
+            return self._reply(b"400 Bad Request")
+
+        if method == "CONNECT":
+            host, _, port = target.rpartition(":")
+            port = int(port or 443)
+        else:
+            url = urlsplit(target)
+            host, port = url.hostname or "", url.port or 80
+        if is_blocked(host, self.server.blocked_hosts):
+            self.server.count_blocked(host)
+            return self._reply(b"403 Forbidden")
+
+        try:
+            upstream = socket.create_connection((host, port), timeout=CONNECT_TIMEOUT)
+        except OSError:
+            return self._reply(b"502 Bad Gateway")
+        with upstream:
+            if method == "CONNECT":
+                self.request.sendall(b"HTTP/1.1 200 Connection Established\r\n\r\n")
+                if self.leftover:
+                    upstream.sendall(self.leftover)
+            else:
+                # Origin-form request line, and no keep-alive: the next request may be for another host
+                path = url.path or "/"
+                if url.query:
+                    path += "?" + url.query
+                headers = [
+                    line for line in rest.split(b"\r\n")
+                    if not line.lower().startswith((b"connection:", b"proxy-connection:", b"keep-alive:"))
+                ]
+                upstream.sendall(f"{method} {path} {version}\r\n".encode("latin-1")
+                                 + b"\r\n".join(headers + [b"Connection: close"]) + b"\r\n\r\n"
+                                 + self.leftover)
+            self._pipe(upstream)
+
+    def _read_head(self):
+        data = b""
+        while b"\r\n\r\n" not in data:
+            chunk = self.request.recv(PIPE_BUFFER_SIZE)
+            if not chunk:
+                return None
+            data += chunk
+        head, _, self.leftover = data.partition(b"\r\n\r\n")
+        return head
+
+    def _reply(self, status):
+        self.request.sendall(b"HTTP/1.1 " + status + b"\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+
+    def _pipe(self, upstream):
+        sockets = [self.request, upstream]
+        upstream.settimeout(None)
+        while True:
+            readable, _, broken = select.select(sockets, [], sockets, 60)
+            if broken or not readable:
+                return
+            for source in readable:
+                data = source.recv(PIPE_BUFFER_SIZE)
+                if not data:
+                    return
+                (upstream if source is self.request else self.request).sendall(data)
+
+
+class FilteringProxy(socketserver.ThreadingTCPServer):
+    """
+    Local HTTP proxy that refuses the hosts of blocked_hosts, used by the lean browser mode
+    (see gmaps_utils.start_headless_browser) to keep imagery, fonts and trackers off the wire.
+    Listens on 127.0.0.1 only; port 0 picks a free port (see .port).
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, blocked_hosts=DEFAULT_BLOCKED_HOSTS):
+        super().__init__(("127.0.0.1", port), FilterProxyHandler)
+        self.blocked_hosts = tuple(blocked_hosts)
+        self.blocked_count = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def count_blocked(self, host):
+        with self.lock:
+            self.blocked_count += 1
+        get_run_metrics().count("proxy.blocked")
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+_filter_proxy = None
+_filter_proxy_lock = threading.Lock()
+
+
+def get_filter_proxy():
+    """The process-wide FilteringProxy, started on first use and shared by every lean browser."""
+    global _filter_proxy
+    with _filter_proxy_lock:
+        if _filter_proxy is None:
+            _filter_proxy = FilteringProxy().start()
+        return _filter_proxy
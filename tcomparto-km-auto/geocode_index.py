@@ -0,0 +1,128 @@
+import bisect
+import difflib
+import json
+import os
+import re
+import threading
+import unicodedata
+
+DEFAULT_GEOCODE_PATH = "./files/cache/geocode.json"
+DEFAULT_OVERRIDES_PATH = "./files/input/geocode_overrides.json"
+
+
+def normalize_address(address):
+    """Lowercase, accent and punctuation free key for an address ('Calle Málaga, 3' -> 'calle malaga 3')."""
+    address = re.sub(r"\(.*?\)|CP:", " ", address)
+    address = unicodedata.normalize("NFKD", address)
+    address = "".join(c for c in address if not unicodedata.combining(c))
+    address = re.sub(r"[^\w\s]", " ", address.lower())
+    return " ".join(address.split())
+
+
+def split_postcode(key):
+    """'calle la paz 29730' -> ('calle la paz', '29730'); the postcode is None when the key has none."""
+    match = re.fullmatch(r"(.*?)\s*\b(\d{5})", key)
+    return (match.group(1), match.group(2)) if match else (key, None)
+
+
+class GeocodeIndex:
+    """
+    Local address -> (lat, lon) index.
+    Learned coordinates come from previous successful lookups and are saved to `path`;
+    the overrides file is edited by hand and always wins, e.g.
+    {"carretera cortijo el acebuchal 29730": [36.7412, -4.2301]}
+    Lookups for routing are exact; prefix and fuzzy matching (fuzzy=True) only compare
+    streets of the same postcode, to answer explicit queries.
+    """
+    def __init__(self, path=DEFAULT_GEOCODE_PATH, overrides_path=DEFAULT_OVERRIDES_PATH, fuzzy_cutoff=0.88):
+        self.path = path
+        self.overrides_path = overrides_path
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.learned = self._read(path)
+        self.overrides = self._read(overrides_path)
+        self.lock = threading.Lock()
+        self.dirty = False
+        self._rebuild_keys()
+
+    @staticmethod
+    def _read(path):
+        if not path or not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="UTF-8") as file:
+            entries = json.load(file)
+        return {normalize_address(address): tuple(coords) for address, coords in entries.items()}
+
+    def _rebuild_keys(self):
+        self.keys = sorted(set(self.learned) | set(self.overrides))
+        # Street part of the keys of each postcode, sorted for the prefix search
+        self.streets = {}
+        for key in self.keys:
+            street, postcode = split_postcode(key)
+            if postcode is not None:
+                self.streets.setdefault(postcode, []).append(street)
+
+    def _coords(self, key):
+        return self.overrides.get(key) or self.learned.get(key)
+
+    def lookup(self, address, fuzzy=False):
+        """
+        Coordinates for an address, or None when it is not known.
+        fuzzy: When there is no exact match, try a unique prefix match and then the closest fuzzy
+               match among the streets of the same postcode (never used for routing: a near miss
+               is another street)
+        """
+        key = normalize_address(address)
+        if not key:
+            return None
+        with self.lock:
+            coords = self._coords(key)
+            if coords is not None or not fuzzy:
+                return coords
+
+            street, postcode = split_postcode(key)
+            streets = self.streets.get(postcode)
+            if postcode is None or not streets or not street:
+                return None
+
+            start = bisect.bisect_left(streets, street)
+            prefixed = []
+            for candidate in streets[start:]:
+                if not candidate.startswith(street):
+                    break
+                prefixed.append(candidate)
+            if len(prefixed) == 1:
+                return self._coords(f"{prefixed[0]} {postcode}")
+
+            matches = difflib.get_close_matches(street, streets, n=1, cutoff=self.fuzzy_cutoff)
+            return self._coords(f"{matches[0]} {postcode}") if matches else None
+
+    def add(self, address, lat, lon):
+        """Remember the coordinates of an address found by a successful lookup."""
+        key = normalize_address(address)
+        if not key or key in self.overrides:
+            return
+        with self.lock:
+            if self.learned.get(key) == (lat, lon):
+                return
+            if key not in self.learned and key not in self.keys:
+                bisect.insort(self.keys, key)
+                street, postcode = split_postcode(key)
+                if postcode is not None:
+                    bisect.insort(self.streets.setdefault(postcode, []), street)
+            self.learned[key] = (lat, lon)
+            self.dirty = True
+
+    def __len__(self):
+        return len(self.keys)
+
+    def save(self):
+        """Write the learned coordinates to disk (overrides are never touched)."""
+        with self.lock:
+            if not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="UTF-8") as file:
+                json.dump({k: list(v) for k, v in sorted(self.learned.items())}, file, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
@@ -1,24 +1,86 @@
+import os
 import re
 import time
+from collections import namedtuple
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.firefox.options import Options as FirefoxOptions
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
-from km_utils import extract_address_parts
+from address_normalizer import normalize
+from distance_providers import NOT_FOUND_DISTANCE
+from run_metrics import get_run_metrics
 
+# Session ids of drivers that already went through the Google cookie-consent check
+_consent_checked_sessions = set()
+# Cookies Google sets once the consent dialog was answered
+CONSENT_COOKIES = ("SOCS", "CONSENT")
 
-def start_headless_browser(headless=True):
+
+BROWSER_MODES = ("standard", "lean")
+WINDOW_SIZES = {'standard': (1920, 1080), 'lean': (1024, 768)}
+
+# Firefox preferences of the lean mode: the lookup only reads text from the directions pane
+LEAN_PREFERENCES = {
+    "permissions.default.image": 2,              # no images (map tiles, imagery, photos)
+    "gfx.downloadable_fonts.enabled": False,     # no web fonts
+    "browser.display.use_document_fonts": 0,
+    "privacy.trackingprotection.enabled": True,  # drop analytics and ad requests
+    "media.autoplay.default": 5,
+    "media.peerconnection.enabled": False,
+    "geo.enabled": False,
+    "dom.webnotifications.enabled": False,
+    "dom.push.enabled": False,
+    "network.prefetch-next": False,
+    "network.dns.disablePrefetch": True,
+    "network.http.speculative-parallel-limit": 0,
+    "browser.sessionstore.resume_from_crash": False,
+    "network.captive-portal-service.enabled": False,
+    "network.connectivity-service.enabled": False,
+    "toolkit.telemetry.enabled": False,
+    "datareporting.healthreport.uploadEnabled": False,
+}
+
+
+def start_headless_browser(headless=True, profile_path=None, mode="standard", proxy_port=None, preferences=None):
+    """
+    profile_path: Firefox profile folder to run on (created when missing) instead of a throwaway one,
+                  so cookies such as the Google consent survive restarts; one browser per folder
+    mode: 'standard' loads Maps like a desktop browser; 'lean' blocks images, web fonts and
+          trackers, turns off unneeded features and uses a smaller window
+    proxy_port: Local filtering proxy of the lean mode (see filter_proxy); the shared one by default
+    preferences: Extra Firefox preferences, applied last
+    """
+    if mode not in BROWSER_MODES:
+        raise ValueError(f"Unknown browser mode '{mode}'. Options: {', '.join(BROWSER_MODES)}")
     options = FirefoxOptions()
     options.headless = headless
+    if profile_path:
+        os.makedirs(profile_path, exist_ok=True)
+        options.add_argument("-profile")
+        options.add_argument(os.path.abspath(profile_path))
     options.set_preference(
         "general.useragent.override",
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
         "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     )
+    if mode == "lean":
+        for name, value in LEAN_PREFERENCES.items():
+            options.set_preference(name, value)
+        if proxy_port is None:
+            from filter_proxy import get_filter_proxy
+            proxy_port = get_filter_proxy().port
+        # Blocks the imagery, font and tracking hosts that preferences cannot reach
+        options.set_preference("network.proxy.type", 1)
+        options.set_preference("network.proxy.http", "127.0.0.1")
+        options.set_preference("network.proxy.http_port", proxy_port)
+        options.set_preference("network.proxy.ssl", "127.0.0.1")
+        options.set_preference("network.proxy.ssl_port", proxy_port)
+    for name, value in (preferences or {}).items():
+        options.set_preference(name, value)
     driver = webdriver.Firefox(options=options)
-    driver.set_window_size(1920, 1080)
+    driver.set_window_size(*WINDOW_SIZES[mode])
     return driver
 
 
@@ -63,51 +125,152 @@ def accept_cookies_if_present(driver, wait_time=12):
         print("No consent iframe shown.")
 
 
+def accept_cookies_once(driver, wait_time=12):
+    """
+    Run the cookie-consent check only on the first page load of each driver session,
+    and skip it when the profile already holds the consent cookie.
+    """
+    session_id = getattr(driver, "session_id", None) or id(driver)
+    if session_id in _consent_checked_sessions:
+        return
+    if not has_consent_cookie(driver):
+        accept_cookies_if_present(driver, wait_time=wait_time)
+    _consent_checked_sessions.add(session_id)
+
+
+def has_consent_cookie(driver):
+    try:
+        return any(cookie.get("name") in CONSENT_COOKIES for cookie in driver.get_cookies())
+    except Exception:
+        return False
+
+
+EXTRACT_ALL_DISTANCES_JS = r"""
+return (function() {
+  const re = /\b\d+(?:[.,]\d+)?\s*(?:km|m)\b/;
+  const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+  let node, results = [];
+
+  const isVisible = (el) => {
+    if (!el) return false;
+    const style = window.getComputedStyle(el);
+    if (!style || style.visibility === 'hidden' || style.display === 'none') return false;
+    const rect = el.getBoundingClientRect();
+    return (rect.width > 0 && rect.height > 0);
+  };
+
+  // Look for "not found" style messages anywhere in DOM
+  const errorTexts = document.body.innerText.toLowerCase();
+  if (
+    errorTexts.includes("google maps can't find") ||
+    errorTexts.includes("no results found") ||
+    errorTexts.includes("google maps no encuentra") ||
+    errorTexts.includes("no se han encontrado resultados") ||
+    errorTexts.includes("could not calculate directions") ||
+    errorTexts.includes("we could not calculate directions")
+  ) {
+    return "not_found";
+  }
+
+  // Otherwise collect visible distances like before
+  while ((node = walker.nextNode())) {
+    const text = (node.textContent || '').trim();
+    if (!text) continue;
+    if (text.length > 80) continue;
+
+    const m = text.match(re);
+    if (m) {
+      const el = node.parentElement;
+      if (isVisible(el)) results.push(m[0]);
+    }
+  }
+
+  return results;
+})();
+"""
+
+# Scoped extractor: only reads the trip cards of the directions pane. The container is kept on
+# `window` between polls (a navigation resets it), visibility is read for all cards in one layout
+# pass, and text is read with textContent, which never triggers layout. While no trip card can be
+# found the script returns null (not ready); only a page still without cards when the wait is over
+# falls back to the full-page walk of EXTRACT_ALL_DISTANCES_JS.
+EXTRACT_ROUTES_JS = r"""
+return (function() {
+  const DISTANCE_RE = /\b\d+(?:[.,]\d+)?\s*(?:km|m)\b/;
+  const DURATION_RE = /\b\d+\s*(?:h|hr|min)\b(?:\s*\d+\s*min\b)?/;
+  const TRIP_SELECTOR = "[id^='section-directions-trip-'], .section-directions-trip, [data-trip-index]";
+  const CONTAINER_SELECTOR = "#section-directions-trip-list, [role='list'], .section-directions-trip-list";
+  const NOT_FOUND_TEXTS = [
+    "google maps can't find", "no results found", "google maps no encuentra",
+    "no se han encontrado resultados", "could not calculate directions", "we could not calculate directions"
+  ];
+
+  const isTrip = (el) => !el.id || /^section-directions-trip-\d+$/.test(el.id);
+
+  let container = window.__kmRouteContainer;
+  if (!container || !container.isConnected) {
+    const first = Array.from(document.querySelectorAll(TRIP_SELECTOR)).find(isTrip);
+    container = first ? (first.closest(CONTAINER_SELECTOR) || first.parentElement) : null;
+    window.__kmRouteContainer = container;
+  }
+
+  if (!container) {
+    const pane = document.getElementById("pane") || document.querySelector("[role='main']");
+    const paneText = ((pane && pane.textContent) || "").toLowerCase();
+    if (NOT_FOUND_TEXTS.some((text) => paneText.includes(text))) return "not_found";
+    return null;
+  }
+
+  const trips = Array.from(container.querySelectorAll(TRIP_SELECTOR)).filter(isTrip);
+  // Layout is read for every card before any text, so the page is laid out at most once
+  const visible = trips.map((trip) => trip.getClientRects().length > 0);
+
+  const routes = [];
+  trips.forEach((trip, index) => {
+    if (!visible[index]) return;
+    const route = {distance: null, duration: null, label: null};
+    const walker = document.createTreeWalker(trip, NodeFilter.SHOW_TEXT);
+    let node;
+    while ((node = walker.nextNode())) {
+      const text = (node.textContent || "").trim();
+      if (!text || text.length > 80) continue;
+      if (route.distance === null && DISTANCE_RE.test(text)) route.distance = text.match(DISTANCE_RE)[0];
+      else if (route.duration === null && DURATION_RE.test(text)) route.duration = text.match(DURATION_RE)[0];
+      else if (route.label === null && /^(via|por) /i.test(text)) route.label = text;
+    }
+    if (route.distance !== null) routes.push(route);
+  });
+  return routes;
+})();
+"""
+
+Route = namedtuple("Route", ["distance", "duration", "label"])
+
+
 def extract_all_distances_js(driver) -> list | str:
-    js = r"""
-    return (function() {
-      const re = /\b\d+(?:[.,]\d+)?\s*(?:km|m)\b/;
-      const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
-      let node, results = [];
-
-      const isVisible = (el) => {
-        if (!el) return false;
-        const style = window.getComputedStyle(el);
-        if (!style || style.visibility === 'hidden' || style.display === 'none') return false;
-        const rect = el.getBoundingClientRect();
-        return (rect.width > 0 && rect.height > 0);
-      };
-
-      // Look for "not found" style messages anywhere in DOM
-      const errorTexts = document.body.innerText.toLowerCase();
-      if (
-        errorTexts.includes("google maps can't find") ||
-        errorTexts.includes("no results found") ||
-        errorTexts.includes("google maps no encuentra") ||
-        errorTexts.includes("no se han encontrado resultados") ||
-        errorTexts.includes("could not calculate directions") ||
-        errorTexts.includes("we could not calculate directions")
-      ) {
-        return "not_found";
-      }
-
-      // Otherwise collect visible distances like before
-      while ((node = walker.nextNode())) {
-        const text = (node.textContent || '').trim();
-        if (!text) continue;
-        if (text.length > 80) continue;
-
-        const m = text.match(re);
-        if (m) {
-          const el = node.parentElement;
-          if (isVisible(el)) results.push(m[0]);
-        }
-      }
-
-      return results;
-    })();
+    """Every visible distance-like text of the page, or 'not_found' when Google reports an error."""
+    return driver.execute_script(EXTRACT_ALL_DISTANCES_JS)
+
+
+def extract_routes(driver, full_page_fallback=False) -> list | str | None:
     """
-    return driver.execute_script(js)
+    The routes listed in the directions pane.
+    full_page_fallback: When the pane shows no trip card, read every distance of the page instead
+                        (for layouts the scoped script does not know; costs a walk of the whole DOM)
+    Returns: List of Route(distance, duration, label), 'not_found' when Google reports an error,
+             or None while no trip card is shown (unless full_page_fallback)
+    """
+    routes = driver.execute_script(EXTRACT_ROUTES_JS)
+    if routes is None:
+        if not full_page_fallback:
+            return None
+        routes = extract_all_distances_js(driver)
+        if routes == "not_found":
+            return routes
+        return [Route(distance, None, None) for distance in routes or []]
+    if routes == "not_found":
+        return routes
+    return [Route(route["distance"], route.get("duration"), route.get("label")) for route in routes]
 
 
 def to_meters(dist_str):
@@ -115,62 +278,150 @@ def to_meters(dist_str):
     return num * 1000 if 'km' in dist_str else num
 
 
-def get_longest_distance_gmaps(origin: str, destination: str, driver, wait_extra: int = 5) -> str:
-    if "Carretera Cortijo El Acebuchal" in origin:
-        origin = "Carretera Cortijo El Acebuchal, Carretera de Benagalbón, 29730"
-    elif "Carretera Cortijo El Acebuchal" in destination:
-        destination = "Carretera Cortijo El Acebuchal, Carretera de Benagalbón, 29730"
-    elif "Calle Cortijo Los Morenos Altos" in origin:
-        origin = "Cortijo los Morenos Altos, 12, Rincón, 29738"
-    elif "Calle Cortijo Los Morenos Altos" in destination:
-        destination = "Cortijo los Morenos Altos, 12, Rincón, 29738"
+def wait_for_stable_routes(driver, max_wait=10.0, stable_window=1.0, poll_interval=0.25):
+    """
+    Poll the page until the set of route distances stops changing for `stable_window` seconds,
+    which is when Google has finished adding alternative routes.
+    Returns: The last result of extract_routes; a page that never showed a trip card is read
+             once with the full-page fallback when max_wait is over
+    """
+    deadline = time.monotonic() + max_wait
+    last_seen = None
+    stable_since = None
+
+    while True:
+        routes = extract_routes(driver)
+        if routes == "not_found":
+            return routes
+
+        now = time.monotonic()
+        if routes is None:
+            # Not ready: poll the scoped script again, the full page is only walked once at the end
+            if now >= deadline:
+                return extract_routes(driver, full_page_fallback=True)
+            time.sleep(poll_interval)
+            continue
+
+        current = frozenset(route.distance for route in routes)
+        if current != last_seen:
+            last_seen = current
+            stable_since = now
+        elif current and now - stable_since >= stable_window:
+            return routes
+
+        if now >= deadline:
+            return routes
+        time.sleep(poll_interval)
+
+
+def extract_route_coordinates(driver):
+    """
+    Waypoint coordinates encoded in the directions URL Google redirects to
+    ('...!2m2!1d<lon>!2d<lat>...'), in route order.
+    Returns: List of (lat, lon) tuples, empty if the URL has none
+    """
+    try:
+        url = driver.current_url
+    except Exception:
+        return []
+    return [(float(lat), float(lon)) for lon, lat in re.findall(r"!1d(-?\d+\.\d+)!2d(-?\d+\.\d+)", url)]
 
-    if "(" in origin.lower() and "málaga" not in origin.lower():
-        origin = re.sub(r"\s*\((?!.*málaga).*?\)\s*", "", origin, flags=re.IGNORECASE)
 
-    if "(" in destination.lower() and "málaga" not in destination.lower():
-        destination = re.sub(r"\s*\((?!.*málaga).*?\)\s*", "", destination, flags=re.IGNORECASE)
+def get_longest_distance_gmaps(origin: str, destination: str, driver, max_wait: float = 10,
+                               stable_window: float = 1.0, timings: dict | None = None,
+                               geocode_index=None, poll_interval: float = 0.25) -> str:
+    """
+    Load the Google Maps directions between two addresses and return the longest route found.
+    max_wait: Upper bound in seconds for alternative routes to appear
+    stable_window: Seconds the list of distances must stay unchanged to count as loaded
+    timings: Optional dict filled with the duration in seconds of each phase of the lookup
+    geocode_index: Optional GeocodeIndex; addresses it knows exactly are sent as coordinates and
+                   the coordinates Google found for the others are added to it
+    poll_interval: Seconds between two reads of the distances shown
+    Returns: The distance (e.g. '8,5 km', '0.8 km' for a route shown in metres), NOT_FOUND_DISTANCE when
+             Google cannot route the addresses, or None when the lookup failed and should be retried
+    """
+    if timings is None:
+        timings = {}
+    metrics = get_run_metrics()
+
+    origin_key, destination_key = origin, destination
+    origin_coords = geocode_index.lookup(origin_key) if geocode_index else None
+    destination_coords = geocode_index.lookup(destination_key) if geocode_index else None
 
-    # Extract formatted address
-    origin = extract_address_parts(origin)
-    destination = extract_address_parts(destination)
+    # Street aliases and parenthesised notes are handled by the address normalizer
+    origin = normalize(origin)
+    destination = normalize(destination)
+
+    origin_query = f"{origin_coords[0]},{origin_coords[1]}" if origin_coords else origin
+    destination_query = f"{destination_coords[0]},{destination_coords[1]}" if destination_coords else destination
 
     url = (
         "https://www.google.com/maps/dir/"
-        f"?api=1&origin={origin}&destination={destination}"
+        f"?api=1&origin={origin_query}&destination={destination_query}"
         "&travelmode=driving&units=metric&hl=en"
     )
     print(f"Loading URL: {url}")
     try:
+        phase_start = time.perf_counter()
         driver.get(url)
-        wait = WebDriverWait(driver, 25)
-        accept_cookies_if_present(driver, wait_time=12)
+        timings['page_load'] = time.perf_counter() - phase_start
+        metrics.add_span('gmaps.page_load', phase_start, timings['page_load'])
+
+        phase_start = time.perf_counter()
+        accept_cookies_once(driver, wait_time=12)
+        timings['cookies'] = time.perf_counter() - phase_start
+        metrics.add_span('gmaps.cookies', phase_start, timings['cookies'])
 
         # wait for main directions panel
+        phase_start = time.perf_counter()
+        wait = WebDriverWait(driver, 25)
         try:
             wait.until(EC.presence_of_element_located((
                 By.XPATH, "//*[contains(@class,'section-directions') or contains(@id,'pane') or contains(@class,'widget-directions')]"
             )))
         except Exception:
             pass
+        timings['directions_pane'] = time.perf_counter() - phase_start
+        metrics.add_span('gmaps.directions_pane', phase_start, timings['directions_pane'])
+
+        # give Google time to load alternative routes, but only as long as it needs
+        phase_start = time.perf_counter()
+        routes = wait_for_stable_routes(driver, max_wait=max_wait, stable_window=stable_window,
+                                        poll_interval=poll_interval)
+        timings['distances'] = time.perf_counter() - phase_start
+        metrics.add_span('gmaps.distances', phase_start, timings['distances'])
 
-        time.sleep(wait_extra)  # give Google time to load alternative routes
+        print("Lookup timings: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items()))
 
-        distances = extract_all_distances_js(driver)
-        if not distances:
-            return "0 km"
+        if not routes:
+            print(f"No routes shown for {origin} -> {destination}")
+            return None
 
-        if distances == "not_found":
+        if routes == "not_found":
             print(f"Address not found: {origin} -> {destination}")
-            return "9999 km"
+            return NOT_FOUND_DISTANCE
+
+        if geocode_index:
+            waypoints = extract_route_coordinates(driver)
+            # Only addresses Google geocoded itself are learned; a query sent as coordinates
+            # would just echo the index back
+            if len(waypoints) >= 2:
+                if origin_coords is None:
+                    geocode_index.add(origin_key, *waypoints[0])
+                if destination_coords is None:
+                    geocode_index.add(destination_key, *waypoints[-1])
 
         # pick the largest
-        max_distance = max(distances, key=to_meters)
-        print(f"Longest distance detected: {max_distance}")
+        longest = max(routes, key=lambda route: to_meters(route.distance))
+        max_distance = longest.distance
+        print(f"Longest distance detected: {max_distance}"
+              + (f" ({longest.duration}, {longest.label})" if longest.duration or longest.label else ""))
         if "km" not in max_distance:
-            max_distance = "0 km"
+            # Routes under 1 km are shown in metres
+            max_distance = f"{to_meters(max_distance) / 1000:.1f} km"
         return max_distance
 
     except Exception as e:
         print(f"Error getting distance {origin} -> {destination}: {e}")
-        return "0 km"
+        return None
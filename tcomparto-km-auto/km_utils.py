@@ -1,109 +1,137 @@
-import re
+import hashlib
+import json
+import os
+import time
+
 import fitz  # PyMuPDF
 
-def extract_address_parts(address):
-    if "(" in address:
-        address = re.sub(r"\s*\(.*?\)\s*", "", address)
-
-    print("Full address is: "+address)
-    street = address.split(",")[0]
-    if "CP: " in address:
-        postcode = address.split("CP: ")[1].strip()
-    else:
-        postcode = ""
-
-    if postcode == "29730":
-        town = "Rincón"
-    elif postcode == "29738":
-        town = "Benagalbón"
-    elif postcode == "29720":
-        town = "La Cala"
-    else:
-        town = ""
-
-    print(f"New address is: {street}, {town}, {postcode}")
-    if "Carretera Cortijo El Acebuchal" in address:
-        return "Carretera Cortijo El Acebuchal, Rincón, 29730"
-    elif "Calle Cortijo Los Morenos Altos" in address:
-        return "Cortijo los Morenos Altos, 12, Rincón, 29738"
-
-    return f"{street}, {town}, {postcode}"
-
-def write_distance_data(input_path, output_base_path, pdf_data, pdf_event_data):
-    max_rows = 14
-    distance_between_rows = 21
-    output_index = 1
-    event_count = 0
-
-    def new_doc():
-        return fitz.open(input_path)
-
-    doc = new_doc()
-    page = doc[0]
-
-    # Write non-event data once per new file
-    def write_static_data():
-        for key in pdf_data:
-            page.insert_text(
-                (pdf_data[key]['x1'], pdf_data[key]['y2']),
-                text=str(pdf_data[key]['value']),
-                fontsize=12
-            )
-
-    write_static_data()
-
-    # Combine event data into rows
-    events = list(zip(
-        pdf_event_data['event_dates'],
-        pdf_event_data['event_addresses'],
-        pdf_event_data['event_distances']
-    ))
+from run_metrics import get_run_metrics
+
+MAX_ROWS_PER_PAGE = 14
+ROW_SPACING = 21
+FIRST_ROW_Y = 301.84
+TOTAL_POSITION = (490.67, 598.71)
+PAGE_NUMBER_POSITION = (460.67, 142.04)
 
-    total_km = 0
 
-    for i, (date, address, distance) in enumerate(events):
-        row_y = 301.84 + distance_between_rows * (event_count % max_rows)
+# Header fields that change on every render without changing the report
+VOLATILE_HEADER_FIELDS = ("date_today",)
 
-        split_addresses = address.split("->")
-        cleaned_addresses = []
-        for a in split_addresses:
-            cleaned_addresses.append(extract_address_parts(a))
 
-        address = " -> ".join(cleaned_addresses)
+def page_fingerprints(pdf_data, trip_table):
+    """
+    Hash of everything drawn on each page: its rows, its running total and the header fields.
+    A page whose hash is unchanged since the previous render does not need to be drawn again.
+    Returns: One hex digest per page, in page order
+    """
+    header = {key: field['value'] for key, field in pdf_data.items() if key not in VOLATILE_HEADER_FIELDS}
+    fingerprints = []
+    total_km = 0
+    for start in range(0, len(trip_table), MAX_ROWS_PER_PAGE):
+        rows = []
+        for i in range(start, min(start + MAX_ROWS_PER_PAGE, len(trip_table))):
+            rows.append([trip_table.dates[i], trip_table.origin_labels[i], trip_table.destination_labels[i],
+                         trip_table.distance_texts[i]])
+            total_km += round(trip_table.distances_km[i], 2)
+        page = json.dumps([header, rows, f"{total_km:.2f}"], ensure_ascii=False, sort_keys=True)
+        fingerprints.append(hashlib.sha1(page.encode("UTF-8")).hexdigest())
+    return fingerprints
+
+
+def write_distance_data(input_path, output_base_path, pdf_data, trip_table, combined=False, split=True, pages=None):
+    """
+    Render the report in memory: the template is loaded once and its page is cloned for every
+    block of 14 rows, with the page number and running total stamped in the same pass.
+    All text of a page is drawn on one shape, committed once when the page is full.
+    trip_table: TripTable with the rows of the report
+    combined: Save one multi-page document as '<output_base_path>.pdf'
+    split: Save every page as '<output_base_path>_page_N.pdf'
+    pages: Indexes (0-based) of the only pages to draw; the others are kept from the previous
+           files, which must exist (see page_fingerprints). None draws every page.
+    Returns: Number of pages of the report
+    """
+    metrics = get_run_metrics()
+    draw_start = time.perf_counter()
+    template = fitz.open(input_path)
+    doc = fitz.open()
+
+    row_count = len(trip_table)
+    page_count = -(-row_count // MAX_ROWS_PER_PAGE)
+    drawn_pages = [index for index in range(page_count) if pages is None or index in pages]
+    drawn_set = set(drawn_pages)
+    total_km = 0
+    shape = None
+
+    for i in range(row_count):
+        row_index = i % MAX_ROWS_PER_PAGE
+        # Rows of kept pages still count towards the running total
+        if i // MAX_ROWS_PER_PAGE not in drawn_set:
+            total_km += round(trip_table.distances_km[i], 2)
+            continue
+
+        if row_index == 0:
+            doc.insert_pdf(template)
+            shape = doc[-1].new_shape()
+            # Write non-event data once per page
+            for key in pdf_data:
+                shape.insert_text(
+                    (pdf_data[key]['x1'], pdf_data[key]['y2']),
+                    str(pdf_data[key]['value']),
+                    fontsize=12
+                )
+            shape.insert_text(PAGE_NUMBER_POSITION, str(i // MAX_ROWS_PER_PAGE + 1), fontsize=12)
+
+        row_y = FIRST_ROW_Y + ROW_SPACING * row_index
+
+        address = f"{trip_table.origin_labels[i]} -> {trip_table.destination_labels[i]}"
         # Write event row
-        page.insert_text((31.33, row_y), text=date, fontsize=10)
-        page.insert_text((87.33, row_y), text=address, fontsize=8)
-        page.insert_text((487.33, row_y), text=distance.strip(), fontsize=12)
-
-        try:
-            dist_float = float(re.findall(r'[\d.,]+', distance.replace(',', '.'))[0])
-        except (IndexError, ValueError):
-            dist_float = 0.0
-        total_km += round(dist_float, 2)
-
-        event_count += 1
-
-        # When 14 rows are written, save and start a new file
-        if event_count % max_rows == 0:
-            output_path = f"{output_base_path}_page_{output_index}.pdf"
-            page.insert_text((490.67, 598.71), text=f"{total_km:.2f}", fontsize=12)
-            doc.save(output_path)
-            doc.close()
-            output_index += 1
-            doc = new_doc()
-            page = doc[0]
-            write_static_data()
-
-    # Save remaining data if not saved yet
-    if event_count % max_rows != 0:
-        output_path = f"{output_base_path}_page_{output_index}.pdf"
-        page.insert_text((490.67, 598.71), text=f"{total_km:.2f}", fontsize=12)
-        doc.save(output_path)
-        doc.close()
-
-def write_page_number(file_path, page_number):
-    doc = fitz.open(file_path)
-    page = doc[0]
-    page.insert_text((460.67, 142.04), text=str(page_number), fontsize=12)
-    doc.saveIncr()  # Save changes incrementally
+        shape.insert_text((31.33, row_y), trip_table.dates[i], fontsize=10)
+        shape.insert_text((87.33, row_y), address, fontsize=8)
+        shape.insert_text((487.33, row_y), trip_table.distance_texts[i], fontsize=12)
+
+        total_km += round(trip_table.distances_km[i], 2)
+
+        # Running total at the bottom of each page
+        if row_index == MAX_ROWS_PER_PAGE - 1 or i == row_count - 1:
+            shape.insert_text(TOTAL_POSITION, f"{total_km:.2f}", fontsize=12)
+            shape.commit()
+
+    template.close()
+    metrics.add_span("pdf.draw", draw_start, time.perf_counter() - draw_start, {'rows': row_count})
+
+    save_start = time.perf_counter()
+    if combined and page_count:
+        if pages is None:
+            doc.save(f"{output_base_path}.pdf", garbage=3, deflate=True)
+        else:
+            replace_pages(f"{output_base_path}.pdf", doc, drawn_pages, page_count)
+
+    if split:
+        for position, page_index in enumerate(drawn_pages):
+            single = fitz.open()
+            single.insert_pdf(doc, from_page=position, to_page=position)
+            single.save(f"{output_base_path}_page_{page_index + 1}.pdf", garbage=3, deflate=True)
+            single.close()
+
     doc.close()
+    metrics.add_span("pdf.save", save_start, time.perf_counter() - save_start,
+                     {'pages': page_count, 'drawn': len(drawn_pages)})
+    return page_count
+
+
+def replace_pages(path, doc, page_indexes, page_count):
+    """
+    Swap the given pages of an existing multi-page report for the pages of doc (in the same order)
+    and cut the report to page_count pages.
+    """
+    combined = fitz.open(path)
+    for position, page_index in enumerate(page_indexes):
+        if page_index < combined.page_count:
+            combined.delete_page(page_index)
+        combined.insert_pdf(doc, from_page=position, to_page=position, start_at=page_index)
+    if combined.page_count > page_count:
+        combined.delete_pages(from_page=page_count, to_page=combined.page_count - 1)
+    # Written next to the report and moved over it, so a crash never leaves half a file
+    combined.save(f"{path}.tmp", garbage=3, deflate=True)
+    combined.close()
+    os.replace(f"{path}.tmp", path)
@@ -1,27 +1,63 @@
 # main_gui.py
 import tkinter as tk
 from tkinter import ttk, messagebox
+import queue
 import threading
 import sys
 from io import StringIO
-from process_events import start_program
+from datetime import datetime
+from async_runner import start_background_run
+
+LOG_QUEUE_SIZE = 10000      # Log writes buffered between two drains
+LOG_POLL_MS = 100           # How often the Tk main loop drains the log queue
+LOG_BATCH_SIZE = 2000       # Writes inserted per drain, so a burst never freezes the window
+MAX_SCROLLBACK_LINES = 5000 # Older lines are dropped from the text area
 
 class ConsoleRedirector(StringIO):
     """
     Redirects stdout to a Tkinter Text widget.
+    Writes only go into a bounded queue, so they never wait on Tk and are safe from any
+    thread; the Tk main loop drains the queue in batches (see drain).
+    If the queue is full the write is dropped and counted instead of blocking the worker.
     """
-    def __init__(self, text_widget):
+    def __init__(self, text_widget, maxsize=LOG_QUEUE_SIZE, max_lines=MAX_SCROLLBACK_LINES):
         super().__init__()
         self.text_widget = text_widget
+        self.max_lines = max_lines
+        self.log_queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
 
     def write(self, string):
-        self.text_widget.insert(tk.END, string)
-        self.text_widget.see(tk.END)  # Auto-scroll to the end
-        self.text_widget.update()  # Update GUI
+        try:
+            self.log_queue.put_nowait(string)
+        except queue.Full:
+            self.dropped += 1
+        return len(string)
 
     def flush(self):
         pass
 
+    def drain(self, batch_size=LOG_BATCH_SIZE):
+        """Move queued writes into the widget with a single insert. Must run on the Tk thread."""
+        chunks = []
+        try:
+            while len(chunks) < batch_size:
+                chunks.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if self.dropped:
+            chunks.append(f"[{self.dropped} log write(s) dropped]\n")
+            self.dropped = 0
+        if not chunks:
+            return
+
+        self.text_widget.insert(tk.END, "".join(chunks))
+        # Keep a capped scrollback (the widget always ends with an empty line)
+        extra_lines = int(self.text_widget.index("end-1c").split(".")[0]) - self.max_lines
+        if extra_lines > 0:
+            self.text_widget.delete("1.0", f"{extra_lines + 1}.0")
+        self.text_widget.see(tk.END)  # Auto-scroll to the end
+
 class KilometerReportApp:
     def __init__(self, root):
         self.root = root
@@ -59,7 +95,7 @@ class KilometerReportApp:
         self.main_frame.grid(row=0, column=0, sticky="nsew")
         self.root.grid_rowconfigure(0, weight=1)
         self.root.grid_columnconfigure(0, weight=1)
-        self.main_frame.grid_rowconfigure(4, weight=1)  # Make text area row expandable
+        self.main_frame.grid_rowconfigure(7, weight=1)  # Make text area row expandable
         self.main_frame.grid_columnconfigure(0, weight=1)  # Make columns expandable
         self.main_frame.grid_columnconfigure(1, weight=1)
 
@@ -73,28 +109,103 @@ class KilometerReportApp:
         self.title_label.grid(row=0, column=0, columnspan=2, pady=20)
 
         # Month selection
+        current_year = datetime.today().year
+        years = [str(year) for year in range(current_year - 5, current_year + 1)]
+
         self.month_label = ttk.Label(self.main_frame, text="Select Month:")
         self.month_label.grid(row=1, column=0, sticky="e", padx=10, pady=10)
 
+        self.month_frame = ttk.Frame(self.main_frame)
+        self.month_frame.grid(row=1, column=1, sticky="w", padx=10, pady=10)
+
         self.month_var = tk.StringVar()
         self.month_combobox = ttk.Combobox(
-            self.main_frame,
+            self.month_frame,
             textvariable=self.month_var,
             values=[f"{i:02}" for i in range(1, 13)],
             width=5,
             state="readonly"
         )
-        self.month_combobox.grid(row=1, column=1, sticky="w", padx=10, pady=10)
+        self.month_combobox.grid(row=0, column=0, padx=(0, 10))
         self.month_combobox.set("01")  # Default to January
 
-        # Run button
-        self.run_button = ttk.Button(
+        self.year_var = tk.StringVar()
+        self.year_combobox = ttk.Combobox(
+            self.month_frame,
+            textvariable=self.year_var,
+            values=years,
+            width=7,
+            state="readonly"
+        )
+        self.year_combobox.grid(row=0, column=1)
+        self.year_combobox.set(str(current_year))
+
+        # Optional last month, to generate the reports of several months in one run
+        self.end_month_label = ttk.Label(self.main_frame, text="Until Month (optional):")
+        self.end_month_label.grid(row=2, column=0, sticky="e", padx=10, pady=10)
+
+        self.end_month_frame = ttk.Frame(self.main_frame)
+        self.end_month_frame.grid(row=2, column=1, sticky="w", padx=10, pady=10)
+
+        self.end_month_var = tk.StringVar()
+        self.end_month_combobox = ttk.Combobox(
+            self.end_month_frame,
+            textvariable=self.end_month_var,
+            values=[""] + [f"{i:02}" for i in range(1, 13)],
+            width=5,
+            state="readonly"
+        )
+        self.end_month_combobox.grid(row=0, column=0, padx=(0, 10))
+
+        self.end_year_var = tk.StringVar()
+        self.end_year_combobox = ttk.Combobox(
+            self.end_month_frame,
+            textvariable=self.end_year_var,
+            values=years,
+            width=7,
+            state="readonly"
+        )
+        self.end_year_combobox.grid(row=0, column=1)
+        self.end_year_combobox.set(str(current_year))
+
+        # Resume option
+        self.resume_var = tk.BooleanVar(value=False)
+        self.resume_checkbutton = ttk.Checkbutton(
+            self.main_frame,
+            text="Resume interrupted run",
+            variable=self.resume_var
+        )
+        self.resume_checkbutton.grid(row=3, column=0, pady=5)
+
+        # Refresh option: only the days edited since the last run are looked up and redrawn
+        self.refresh_var = tk.BooleanVar(value=False)
+        self.refresh_checkbutton = ttk.Checkbutton(
             self.main_frame,
+            text="Only refresh changed days",
+            variable=self.refresh_var
+        )
+        self.refresh_checkbutton.grid(row=3, column=1, pady=5)
+
+        # Run and cancel buttons
+        self.button_frame = ttk.Frame(self.main_frame)
+        self.button_frame.grid(row=4, column=0, columnspan=2, pady=20)
+
+        self.run_button = ttk.Button(
+            self.button_frame,
             text="Generate Report",
             style="Custom.TButton",
             command=self.start_processing
         )
-        self.run_button.grid(row=2, column=0, columnspan=2, pady=20)
+        self.run_button.grid(row=0, column=0, padx=(0, 10))
+
+        self.cancel_button = ttk.Button(
+            self.button_frame,
+            text="Cancel",
+            command=self.cancel_processing,
+            state="disabled"
+        )
+        self.cancel_button.grid(row=0, column=1)
+        self.background_run = None
 
         # Status label
         self.status_var = tk.StringVar(value="Ready to start")
@@ -104,7 +215,18 @@ class KilometerReportApp:
             foreground="#555",
             font=("Helvetica", 12, "italic")
         )
-        self.status_label.grid(row=3, column=0, columnspan=2, pady=10)
+        self.status_label.grid(row=5, column=0, columnspan=2, pady=10)
+
+        # Run summary (slowest stages and counters of the last month processed)
+        self.metrics_var = tk.StringVar(value="")
+        self.metrics_label = ttk.Label(
+            self.main_frame,
+            textvariable=self.metrics_var,
+            foreground="#555",
+            font=("Consolas", 10),
+            justify="left"
+        )
+        self.metrics_label.grid(row=6, column=0, columnspan=2, pady=5)
 
         # Output text area
         self.output_text = tk.Text(
@@ -119,7 +241,7 @@ class KilometerReportApp:
             borderwidth=1,
             relief="solid"
         )
-        self.output_text.grid(row=4, column=0, columnspan=2, pady=10, padx=10, sticky="nsew")
+        self.output_text.grid(row=7, column=0, columnspan=2, pady=10, padx=10, sticky="nsew")
 
         # Scrollbar for text area
         self.scrollbar = ttk.Scrollbar(
@@ -127,12 +249,13 @@ class KilometerReportApp:
             orient="vertical",
             command=self.output_text.yview
         )
-        self.scrollbar.grid(row=4, column=2, sticky="ns")
+        self.scrollbar.grid(row=7, column=2, sticky="ns")
         self.output_text["yscrollcommand"] = self.scrollbar.set
 
         # Redirect stdout to text area
         self.console_redirector = ConsoleRedirector(self.output_text)
         sys.stdout = self.console_redirector
+        self.root.after(LOG_POLL_MS, self.poll_log_queue)
 
         # Thread lock for status updates
         self.lock = threading.Lock()
@@ -140,48 +263,95 @@ class KilometerReportApp:
     def update_status(self, message, status_type):
         """
         Update the status label with a message and color based on status_type.
-        status_type: 'info', 'error', 'success'
+        status_type: 'info', 'error', 'success', or 'metrics' for the run summary panel
         """
         colors = {"info": "#555", "error": "#d32f2f", "success": "#388e3c"}
+        if status_type == "metrics":
+            self.root.after(0, lambda: self.metrics_var.set(message))
+            return
         with self.lock:
             self.root.after(0, lambda: (
                 self.status_var.set(message),
                 self.status_label.configure(foreground=colors.get(status_type, "#555"))
             ))
 
+    def poll_log_queue(self):
+        """Drain the worker's log output on the Tk main loop, then reschedule."""
+        self.console_redirector.drain()
+        self.root.after(LOG_POLL_MS, self.poll_log_queue)
+
     def start_processing(self):
-        """Start the processing in a separate thread."""
+        """Start the processing on a background event loop (see async_runner.BackgroundRun)."""
         month = self.month_var.get()
-        if not month:
-            messagebox.showerror("Error", "Please select a month.")
+        year = self.year_var.get()
+        end_month = self.end_month_var.get()
+        end_year = self.end_year_var.get()
+        resume = self.resume_var.get()
+        refresh = self.refresh_var.get()
+        if not month or not year:
+            messagebox.showerror("Error", "Please select a month and a year.")
             return
 
         # Disable inputs
         self.run_button.configure(state="disabled")
-        self.month_combobox.configure(state="disabled")
+        for combobox in self.month_comboboxes():
+            combobox.configure(state="disabled")
+        self.resume_checkbutton.configure(state="disabled")
+        self.refresh_checkbutton.configure(state="disabled")
         self.update_status("Starting program...", "info")
         self.output_text.delete(1.0, tk.END)  # Clear previous output
+        self.metrics_var.set("")
 
-        # Start processing in a new thread
-        def run():
-            try:
-                start_program(month, self.update_status)
-            except Exception as e:
-                import traceback
-                self.update_status(f"Error: {e}", "error")
-                print("Exception in background thread:")
-                traceback.print_exc()
-            finally:
-                self.root.after(0, self.enable_inputs)
+        self.cancel_button.configure(state="normal")
+        self.background_run = start_background_run(
+            month, year, end_month, end_year or year, self.update_status,
+            on_done=lambda: self.root.after(0, self.enable_inputs), resume=resume, refresh=refresh,
+            distance_options={'browser_service': self.get_browser_service()}
+        )
+
+    def get_browser_service(self):
+        """Browsers kept open between runs, so only the first run pays for Firefox's startup."""
+        from browser_service import get_browser_service  # Selenium is loaded off the window's startup
+        return get_browser_service()
+
+    def warm_browsers(self):
+        """Start the browsers while the user picks the month (runs on a background thread)."""
+        try:
+            self.get_browser_service().warm_up(count=1)
+        except Exception as e:
+            print(f"Could not start the browser in advance: {e}")
 
-        threading.Thread(target=run, daemon=True).start()
+    def on_close(self):
+        """Close the warm browsers with the window."""
+        from browser_service import shutdown_browser_service
+        if self.background_run is not None:
+            self.background_run.cancel()
+        shutdown_browser_service()
+        self.root.destroy()
+
+    def cancel_processing(self):
+        """Stop the run after the device and browser calls in progress."""
+        if self.background_run is not None:
+            self.cancel_button.configure(state="disabled")
+            self.update_status("Cancelling...", "info")
+            self.background_run.cancel()
 
     def enable_inputs(self):
         """Re-enable inputs after processing."""
+        self.background_run = None
+        self.cancel_button.configure(state="disabled")
         self.run_button.configure(state="normal")
-        self.month_combobox.configure(state="normal")
+        for combobox in self.month_comboboxes():
+            combobox.configure(state="readonly")
+        self.resume_checkbutton.configure(state="normal")
+        self.refresh_checkbutton.configure(state="normal")
+
+    def month_comboboxes(self):
+        return [self.month_combobox, self.year_combobox, self.end_month_combobox, self.end_year_combobox]
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = KilometerReportApp(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
+    threading.Thread(target=app.warm_browsers, daemon=True).start()
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,259 @@
+import heapq
+import math
+import os
+import pickle
+import re
+import unicodedata
+import xml.etree.ElementTree as ET
+
+DEFAULT_OSM_PATH = "./files/input/axarquia.osm"
+
+# Highway types a car can drive on, with an approximate speed (km/h) used to pick realistic routes
+DRIVABLE_HIGHWAYS = {
+    "motorway": 110, "motorway_link": 60, "trunk": 90, "trunk_link": 50,
+    "primary": 70, "primary_link": 40, "secondary": 60, "secondary_link": 40,
+    "tertiary": 50, "tertiary_link": 30, "unclassified": 40, "residential": 30,
+    "living_street": 15, "service": 20, "road": 30, "track": 15,
+}
+
+EARTH_RADIUS_M = 6371000
+GRID_SIZE_DEG = 0.01
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres between two coordinates."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def normalize_name(text):
+    """Lowercase, accent-free, single-spaced version of a street or place name."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split())
+
+
+def split_street_postcode(address):
+    """
+    Split an address built by get_origin_destination_addresses ('Calle Falsa 29730')
+    or address_normalizer.normalize ('Calle Falsa, Rincón, 29730') into (street, postcode).
+    """
+    match = re.search(r"\b(\d{5})\s*$", address.strip())
+    postcode = match.group(1) if match else ""
+    street = address[:match.start()] if match else address
+    street = street.split(",")[0]
+    return normalize_name(street), postcode
+
+
+class RoadGraph:
+    """
+    Driving graph built from an OpenStreetMap XML extract.
+    Nodes are OSM node ids, edges carry their length in metres and travel time in seconds.
+    """
+    def __init__(self):
+        self.coords = {}
+        self.edges = {}
+        self.addresses = {}
+        self.streets = {}
+        self.postcodes = {}
+        self.grid = {}
+
+    @classmethod
+    def from_osm(cls, osm_path):
+        graph = cls()
+        all_coords = {}
+        way_nodes = []
+        address_points = []
+        postcode_points = {}
+
+        for _, elem in ET.iterparse(osm_path, events=("end",)):
+            if elem.tag == "node":
+                node_id = int(elem.get("id"))
+                lat, lon = float(elem.get("lat")), float(elem.get("lon"))
+                all_coords[node_id] = (lat, lon)
+                tags = {t.get("k"): t.get("v") for t in elem.findall("tag")}
+                if "addr:street" in tags:
+                    address_points.append((tags, [node_id]))
+                elem.clear()
+            elif elem.tag == "way":
+                refs = [int(nd.get("ref")) for nd in elem.findall("nd")]
+                tags = {t.get("k"): t.get("v") for t in elem.findall("tag")}
+                if tags.get("highway") in DRIVABLE_HIGHWAYS:
+                    way_nodes.append((refs, tags))
+                if "addr:street" in tags:
+                    address_points.append((tags, refs))
+                elem.clear()
+            elif elem.tag == "relation":
+                elem.clear()
+
+        for refs, tags in way_nodes:
+            speed_ms = DRIVABLE_HIGHWAYS[tags["highway"]] / 3.6
+            oneway = tags.get("oneway") in ("yes", "1", "true") or tags.get("junction") == "roundabout"
+            reverse_only = tags.get("oneway") == "-1"
+            refs = [ref for ref in refs if ref in all_coords]
+            for u, v in zip(refs, refs[1:]):
+                length = haversine_m(*all_coords[u], *all_coords[v])
+                if not reverse_only:
+                    graph._add_edge(u, v, length, length / speed_ms)
+                if not oneway or reverse_only:
+                    graph._add_edge(v, u, length, length / speed_ms)
+            if "name" in tags and refs:
+                graph.streets.setdefault(normalize_name(tags["name"]), []).append(refs[len(refs) // 2])
+
+        for node_id in graph.edges:
+            graph.coords[node_id] = all_coords[node_id]
+            lat, lon = all_coords[node_id]
+            graph.grid.setdefault(graph._cell(lat, lon), []).append(node_id)
+
+        for tags, refs in address_points:
+            points = [all_coords[ref] for ref in refs if ref in all_coords]
+            if not points:
+                continue
+            lat = sum(p[0] for p in points) / len(points)
+            lon = sum(p[1] for p in points) / len(points)
+            postcode = tags.get("addr:postcode", "")
+            graph.addresses[(normalize_name(tags["addr:street"]), postcode)] = (lat, lon)
+            if postcode:
+                postcode_points.setdefault(postcode, []).append((lat, lon))
+
+        for postcode, points in postcode_points.items():
+            graph.postcodes[postcode] = (
+                sum(p[0] for p in points) / len(points),
+                sum(p[1] for p in points) / len(points)
+            )
+
+        return graph
+
+    @classmethod
+    def load(cls, osm_path=DEFAULT_OSM_PATH):
+        """Load the graph, reusing a pickled copy next to the extract when it is up to date."""
+        pickle_path = osm_path + ".graph.pickle"
+        if os.path.exists(pickle_path) and os.path.getmtime(pickle_path) >= os.path.getmtime(osm_path):
+            with open(pickle_path, "rb") as file:
+                return pickle.load(file)
+
+        print(f"Building road graph from {osm_path}...")
+        graph = cls.from_osm(osm_path)
+        with open(pickle_path, "wb") as file:
+            pickle.dump(graph, file, protocol=pickle.HIGHEST_PROTOCOL)
+        print(f"Road graph ready: {len(graph.coords)} nodes, {len(graph.addresses)} addresses")
+        return graph
+
+    def _add_edge(self, u, v, length, travel_time):
+        self.edges.setdefault(u, []).append((v, length, travel_time))
+        self.edges.setdefault(v, [])
+
+    @staticmethod
+    def _cell(lat, lon):
+        return int(lat // GRID_SIZE_DEG), int(lon // GRID_SIZE_DEG)
+
+    def nearest_node(self, lat, lon, max_rings=20):
+        """Closest routable node to a coordinate, searching the grid ring by ring."""
+        cell_lat, cell_lon = self._cell(lat, lon)
+        best, best_dist, found_ring = None, float("inf"), None
+        for ring in range(max_rings + 1):
+            for d_lat in range(-ring, ring + 1):
+                for d_lon in range(-ring, ring + 1):
+                    if max(abs(d_lat), abs(d_lon)) != ring:
+                        continue
+                    for node_id in self.grid.get((cell_lat + d_lat, cell_lon + d_lon), ()):
+                        dist = haversine_m(lat, lon, *self.coords[node_id])
+                        if dist < best_dist:
+                            best, best_dist = node_id, dist
+            if best is not None and found_ring is None:
+                found_ring = ring
+            # A closer node can still sit in the ring right after the first hit, never further out
+            if found_ring is not None and ring > found_ring:
+                break
+        return best
+
+    def geocode(self, address):
+        """
+        Coordinates for an address using the addr:* tags of the extract,
+        falling back to the street closest to the postcode's centre.
+        """
+        street, postcode = split_street_postcode(address)
+        if (street, postcode) in self.addresses:
+            return self.addresses[(street, postcode)]
+
+        candidates = [self.coords[n] for n in self.streets.get(street, ()) if n in self.coords]
+        if not candidates:
+            return None
+        centre = self.postcodes.get(postcode)
+        if centre is None:
+            return candidates[0]
+        return min(candidates, key=lambda c: haversine_m(*c, *centre))
+
+    def shortest_path(self, source, target, penalties=None):
+        """
+        A* on travel time (with a straight-line motorway-speed heuristic).
+        penalties: Optional {(u, v): factor} applied to edge costs, used to find alternatives
+        Returns: (list of node ids, length in metres) or (None, inf) if unreachable
+        """
+        penalties = penalties or {}
+        max_speed_ms = max(DRIVABLE_HIGHWAYS.values()) / 3.6
+        target_lat, target_lon = self.coords[target]
+
+        def heuristic(node_id):
+            return haversine_m(*self.coords[node_id], target_lat, target_lon) / max_speed_ms
+
+        open_heap = [(heuristic(source), 0.0, source)]
+        best_cost = {source: 0.0}
+        previous = {}
+
+        while open_heap:
+            _, cost, node_id = heapq.heappop(open_heap)
+            if node_id == target:
+                break
+            if cost > best_cost.get(node_id, float("inf")):
+                continue
+            for neighbour, length, travel_time in self.edges.get(node_id, ()):
+                new_cost = cost + travel_time * penalties.get((node_id, neighbour), 1.0)
+                if new_cost < best_cost.get(neighbour, float("inf")):
+                    best_cost[neighbour] = new_cost
+                    previous[neighbour] = node_id
+                    heapq.heappush(open_heap, (new_cost + heuristic(neighbour), new_cost, neighbour))
+        else:
+            if source != target:
+                return None, float("inf")
+
+        path = [target]
+        while path[-1] != source:
+            path.append(previous[path[-1]])
+        path.reverse()
+        return path, self.path_length(path)
+
+    def path_length(self, path):
+        length = 0.0
+        for u, v in zip(path, path[1:]):
+            length += min(edge_length for n, edge_length, _ in self.edges[u] if n == v)
+        return length
+
+    def alternative_routes(self, source, target, k=3, penalty=1.6, max_stretch=1.5):
+        """
+        Up to k distinct routes found with the penalty method: after each route its edges
+        get more expensive, so the next search prefers different roads. Routes longer than
+        max_stretch times the fastest one are dropped, like Google does.
+        Returns: List of route lengths in metres, fastest route first
+        """
+        penalties = {}
+        routes = []
+        seen = set()
+        for _ in range(k * 2):
+            path, length = self.shortest_path(source, target, penalties)
+            if path is None:
+                break
+            key = tuple(path)
+            if key not in seen:
+                seen.add(key)
+                if routes and length > routes[0] * max_stretch:
+                    break
+                routes.append(length)
+                if len(routes) == k:
+                    break
+            for u, v in zip(path, path[1:]):
+                penalties[(u, v)] = penalties.get((u, v), 1.0) * penalty
+        return routes
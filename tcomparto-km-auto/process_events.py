@@ -1,17 +1,28 @@
 # process_events.py
+import asyncio
 import traceback
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import calendar
+import json
 import os
-import time
-from file_utils import create_folder, delete_all_files
-from gmaps_utils import start_headless_browser, get_longest_distance_gmaps, close_browser
-from km_utils import write_distance_data, write_page_number
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from file_utils import create_folder, delete_all_files, delete_files_with_prefix, month_file_stem
+from report_session import ReportSession
+from distance_providers import SharedDistanceProvider
+from distance_cache import route_key
+from distance_matrix import DistanceMatrix, matrix_path
+from checkpoint_journal import CheckpointJournal, checkpoint_path, day_fingerprint
+from trip_table import TripTable, parse_distance_km
+from run_metrics import get_run_metrics, start_run, metrics_path
 from android_ui_utils import (
-    connect_device, restart_app, open_planilla_tab,
-    navigate_to_month, select_day_and_accept, get_event_data
+    select_day_and_accept, reopen_date_picker, get_event_data, get_event_rows, EventRow
 )
 
+KM_TXT_FOLDER = "./files/output/kilometre_reports_txt"
+KM_PDF_FOLDER = "./files/output/kilometre_reports_pdf"
+PDF_TEMPLATE_PATH = "./files/input/km_document_model.pdf"
+
 def obtain_month(month_str, status_callback=None):
     """
     Validate the month string provided by the GUI.
@@ -41,6 +52,31 @@ def obtain_month(month_str, status_callback=None):
             status_callback(f"Error: {e}", "error")
         raise
 
+def obtain_year(year_str, status_callback=None):
+    """
+    Validate the year string provided by the GUI.
+    year_str: String from GUI dropdown (e.g., '2025')
+    status_callback: Function to update GUI status (optional)
+    Returns: Year as an int or raises an error
+    """
+    if not str(year_str).isdigit() or not (2000 <= int(year_str) <= 2100):
+        error_msg = "The year must be a number between 2000 and 2100."
+        if status_callback:
+            status_callback(error_msg, "error")
+        raise ValueError(error_msg)
+    return int(year_str)
+
+def month_range(start_year, start_month, end_year, end_month):
+    """
+    Every (year, month) from the start month to the end month, both included.
+    e.g. month_range(2024, 11, 2025, 2) -> [(2024, 11), (2024, 12), (2025, 1), (2025, 2)]
+    """
+    start_index = start_year * 12 + start_month - 1
+    end_index = end_year * 12 + end_month - 1
+    if end_index < start_index:
+        raise ValueError("The end month must not be before the start month.")
+    return [(index // 12, index % 12 + 1) for index in range(start_index, end_index + 1)]
+
 def get_origin_destination_addresses(origin, destination):
     origin_street = origin.split(",")[0].strip()
     origin_post_code = origin.split("CP: ")[1].strip()
@@ -52,172 +88,117 @@ def get_origin_destination_addresses(origin, destination):
         'destination': f"{destination_street} {destination_post_code}"
     }
 
-def process_day(d, day, total_duration, total_km, driver, target_month, target_year, km_file_path, checked_addresses):
+def scrape_day(d, day, target_month, target_year, extraction_mode="dump"):
+    """
+    Stage one: read every event of a day from the device.
+    extraction_mode: 'dump' parses one UI hierarchy dump, 'selectors' reads each field with its own RPC
+    Returns: List of EventRow(time, address, name) in the order shown by the app
+    Raises: RuntimeError when the day could not be read completely (e.g. the phone was unplugged);
+            such a day must not be journaled, or a resumed run would take it as a day without events
+    """
+    metrics = get_run_metrics()
+    events = []
+    str_date = f"{day:02}/{target_month:02}/{target_year}"
     try:
-        select_day_and_accept(d, day)
-        times, addresses, names = get_event_data(d)
-        event_count = min(len(times), len(addresses), len(names))
-
-        if event_count == 0:
+        with metrics.stage("device.select_day", day=day):
+            select_day_and_accept(d, day, str_date)
+        with metrics.stage(f"device.extract_{extraction_mode}", day=day):
+            if extraction_mode == "dump":
+                events = get_event_rows(d)
+            else:
+                times, addresses, names = get_event_data(d)
+                event_count = min(len(times), len(addresses), len(names))
+                events = [
+                    EventRow(times[i].get_text(), addresses[i].get_text(), names[i].get_text())
+                    for i in range(event_count)
+                ]
+        metrics.count("device.events", len(events))
+
+        if not events:
             print(f"No events found on day {day}")
-        else:
-            for i in range(event_count):
-                user_time = times[i].get_text()
-                user_address = addresses[i].get_text()
-                user_name = names[i].get_text()
-
-                try:
-                    start_str, end_str = [t.strip() for t in user_time.split('-')]
-                    fmt = "%H:%M"
-                    start_time = datetime.strptime(start_str, fmt)
-                    end_time = datetime.strptime(end_str, fmt)
-
-                    if end_time < start_time:
-                        end_time += timedelta(days=1)
-
-                    total_duration += (end_time - start_time)
-
-                    if i > 0 and len(addresses) > 1:
-                        prev_time = times[i - 1].get_text()
-                        prev_start_str, prev_end_str = [t.strip() for t in prev_time.split('-')]
-                        prev_end_time = datetime.strptime(prev_end_str, fmt)
-
-                        gap = start_time - prev_end_time
-
-                        if 0 < gap.total_seconds() <= 3600:
-                            origin = addresses[i - 1].get_text()
-                            destination = addresses[i].get_text()
-
-                            clean_addresses = get_origin_destination_addresses(origin, destination)
 
-                            formatted_date = datetime.strptime(f"{day}/{target_month}/{target_year}", "%d/%m/%Y")
-                            str_date = formatted_date.strftime("%d/%m/%Y")
-
-                            origin_destination_str = f"{clean_addresses['origin']} -> {clean_addresses['destination']}".lower()
-
-                            if origin_destination_str not in checked_addresses:
-                                distance = get_longest_distance_gmaps(
-                                    clean_addresses['origin'],
-                                    clean_addresses['destination'],
-                                    driver
-                                )
-                                checked_addresses[origin_destination_str] = distance
-                                print("Distance calculated")
-                            else:
-                                distance = checked_addresses[origin_destination_str]
-                                print("Distance retrieved")
-
-                            print(f"Distance for {origin_destination_str} is {distance}")
-
-                            float_distance = distance.split(" ")[0].strip().replace(",", ".")
-                            float_distance = float(float_distance)
-
-                            if float_distance >= 1:
-                                destination_clean = ' '.join(destination.splitlines())
-                                origin_clean = ' '.join(origin.splitlines())
-
-                                total_km += float_distance
-                                write_distance(distance, km_file_path, destination_clean, origin_clean, str_date)
-
-                    print(f"Day {day} Event {i + 1}: Time: {user_time}, Address: {user_address}, Name: {user_name}")
-
-                except Exception as e:
-                    print(f"Could not parse time range '{user_time}': {e}")
-                    print(f"Raw time string (repr): {repr(user_time)}")
-                    print("Full traceback:")
-                    traceback.print_exc()
-
-        time.sleep(1)
+        for i, (user_time, user_address, user_name) in enumerate(events):
+            print(f"Day {day} Event {i + 1}: Time: {user_time}, Address: {user_address}, Name: {user_name}")
 
     except Exception as e:
         print(f"Error on day {day}: {e}")
+        raise RuntimeError(f"Could not read day {day}/{target_month:02}/{target_year} from the phone: {e}") from e
 
     finally:
         try:
-            formatted_date = datetime.strptime(f"{day}/{target_month}/{target_year}", "%d/%m/%Y")
-            str_date = formatted_date.strftime("%d/%m/%Y")
-            d(text=str_date).click()
-            time.sleep(1)
+            with metrics.stage("device.reopen_date_picker", day=day):
+                reopen_date_picker(d, str_date)
         except Exception as e:
             print(f"Error re-selecting date {day}/{target_month}/{target_year}: {e}")
 
-    return total_duration, total_km, checked_addresses  # Return updated values
-
-def write_page_numbers(output_dir, output_pdf_name):
-    page = 1
-    for file_name in os.listdir(output_dir):
-        if output_pdf_name in file_name:
-            write_page_number(
-                os.path.join(output_dir, file_name),
-                page
-            )
-            page += 1
+    return events
 
-def prepare_data_folders(pdf_path, txt_path):
-    delete_all_files(txt_path)
-    create_folder(txt_path)
-    create_folder(pdf_path)
-
-def write_distance(distance, file_name, destination, origin, date_str):
-    with open(file_name, "a", encoding="UTF-8") as file:
-        file.write(f"{date_str};{origin};{destination};{distance}\n")
-
-def start_program(month_str, status_callback=None):
+def find_month_trips(events_by_day, target_month, target_year, rules=None):
     """
-    Start the program with the given month.
-    month_str: Month from GUI (e.g., '06')
-    status_callback: Function to update GUI status
+    Pick the consecutive events that count as a trip, for all the given days in one pass (see TripRules).
+    events_by_day: {day: [(time, address, name), ...]}
+    rules: TripRules to apply (defaults to the ones of files/input/trip_rules.json)
+    Returns: {day: (duration of all its events, list of trip dicts keyed by their route string)}
     """
-    try:
-        month_str = obtain_month(month_str, status_callback)
-        process_month(month_str, status_callback)
-    except Exception as e:
-        if status_callback:
-            status_callback(f"Program failed: {e}", "error")
-
-def process_month(month_str: str, status_callback=None, target_year: int = 2025):
-    if status_callback:
-        status_callback("Connecting to device...", "info")
-    d = connect_device()
-    restart_app(d)
-    open_planilla_tab(d)
-
-    target_month = int(month_str)
-    current_days_month = calendar.monthrange(target_year, target_month)[1]
-
-    km_txt_folder = "./files/output/kilometre_reports_txt"
-    km_pdf_folder = "./files/output/kilometre_reports_pdf"
-
-    prepare_data_folders(km_pdf_folder, km_txt_folder)
-
-    km_file_name = f"km_{target_month:02}_{target_year}.txt"
-    km_file_path = os.path.join(km_txt_folder, km_file_name)
-
-    navigate_to_month(d, target_year, target_month)
-
-    if status_callback:
-        status_callback("Starting headless browser...", "info")
-    driver = start_headless_browser()
-    total_km = 0
-    total_duration = timedelta()
-    checked_addresses = {}
-
-    for day in range(1, current_days_month + 1):
-        if status_callback:
-            status_callback(f"Processing day {day}...", "info")
-        # Update total_duration and total_km with returned values
-        total_duration, total_km, checked_addresses = process_day(d, day, total_duration, total_km, driver, target_month, target_year, km_file_path, checked_addresses)
+    if rules is None:
+        from trip_rules import get_trip_rules  # NumPy is only loaded when trips are selected
+        rules = get_trip_rules()
+    day_minutes, trip_origins = rules.evaluate(events_by_day)
+    results = {day: (timedelta(minutes=minutes), []) for day, minutes in day_minutes.items()}
+
+    for day, index in trip_origins:
+        events = events_by_day[day]
+        origin = events[index][1]
+        destination = events[index + 1][1]
+        try:
+            clean_addresses = get_origin_destination_addresses(origin, destination)
+        except Exception as e:
+            print(f"Could not read the addresses of a trip on day {day}: {e}")
+            continue
+        results[day][1].append({
+            'date': f"{day:02}/{target_month:02}/{target_year}",
+            'origin': ' '.join(origin.splitlines()),
+            'destination': ' '.join(destination.splitlines()),
+            'clean_origin': clean_addresses['origin'],
+            'clean_destination': clean_addresses['destination'],
+            'route': route_key(clean_addresses['origin'], clean_addresses['destination'])
+        })
+
+    return results
+
+def find_day_trips(events, day, target_month, target_year, rules=None):
+    """
+    Pick the consecutive events of a day that count as a trip (see find_month_trips).
+    Returns: (duration of all events, list of trip dicts keyed by their route string)
+    """
+    return find_month_trips({day: events}, target_month, target_year, rules)[day]
 
-    total_seconds = int(total_duration.total_seconds())
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
+def resolve_distances(trips, distance_provider, checked_addresses, matrix):
+    """
+    Stage two: fill the distance matrix cells needed by the given trips.
+    Each distinct route is queried once and cache misses are resolved as one batch
+    by the distance provider.
+    """
+    with get_run_metrics().stage("distance.resolve_day", trips=len(trips)):
+        matrix.fill(
+            distance_provider,
+            pairs=[(trip['clean_origin'], trip['clean_destination']) for trip in trips],
+            cache=checked_addresses
+        )
+    return matrix
+
+def prepare_data_folders(pdf_path, txt_path, keep_existing=False):
+    if not keep_existing:
+        delete_all_files(txt_path)
+    create_folder(txt_path)
+    create_folder(pdf_path)
 
-    d.app_stop("com.asisto.tcomparto")
-    if status_callback:
-        status_callback("Closing browser...", "info")
-    close_browser(driver)
+def km_txt_path(target_month, target_year, label=None):
+    return os.path.join(KM_TXT_FOLDER, f"km_{month_file_stem(target_month, target_year, label)}.txt")
 
-    pdf_data = {
+def build_pdf_data(month_str, target_year):
+    """Header fields of the report template."""
+    return {
         'obra': {'x1': 92.67, 'y2': 142.64, 'value': ""},
         'date_today': {'x1': 454.67, 'y2': 97.98, 'value': datetime.today().strftime("%#d/%#m/%Y")},
         'month': {'x1': 302.67, 'y2': 176.71, 'value': month_str},
@@ -227,43 +208,369 @@ def process_month(month_str: str, status_callback=None, target_year: int = 2025)
         'owner': {'x1': 114.00, 'y2': 216.91, 'value': "Geomar Ortiz Bueno"}
     }
 
-    event_dates = []
-    event_addresses = []
-    event_distances = []
-
-    with open(km_file_path, "r", encoding='UTF-8') as km_file:
-        for line in km_file:
-            line_contents = line.strip().split(";")
-            event_dates.append(line_contents[0])
-            event_addresses.append(f"{line_contents[1]} -> {line_contents[2]}")
-            event_distances.append(line_contents[3])
-
-    pdf_event_data = {
-        'event_addresses': event_addresses,
-        'event_distances': event_distances,
-        'event_dates': event_dates
-    }
-
-    output_pdf_name = f"{month_str}_{target_year}"
-    output_pdf_base_path = os.path.join("./files/output/kilometre_reports_pdf", output_pdf_name)
+def load_page_manifest(manifest_path, pdf_output, output_pdf_base_path):
+    """
+    Page fingerprints of the previous render of a report, or None when its files cannot be reused
+    (no manifest, another pdf_output, or a report file deleted since).
+    """
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="UTF-8") as file:
+        manifest = json.load(file)
+    fingerprints = manifest.get("fingerprints", [])
+    expected_files = []
+    if pdf_output in ("combined", "both"):
+        expected_files.append(f"{output_pdf_base_path}.pdf")
+    if pdf_output in ("split", "both"):
+        expected_files += [f"{output_pdf_base_path}_page_{i + 1}.pdf" for i in range(len(fingerprints))]
+    if manifest.get("pdf_output") != pdf_output or not all(os.path.exists(path) for path in expected_files):
+        return None
+    return fingerprints
+
+def write_month_pdf(trip_table, month_str, target_year, pdf_output="split", status_callback=None, label=None,
+                    incremental=False):
+    """
+    Render a month's trip table into the PDF report folder.
+    label: Device the report belongs to, appended to the file names (e.g. '06_2025_R58M12345_page_1.pdf')
+    incremental: Only draw the pages whose rows or running total changed since the previous render
+                 (recorded in '<name>.pages.json'); the other pages keep their files
+    Returns: Number of pages of the report
+    """
+    from km_utils import write_distance_data, page_fingerprints  # PyMuPDF is only loaded when a PDF is written
+
+    output_pdf_name = month_file_stem(month_str, target_year, label)
+    output_pdf_base_path = os.path.join(KM_PDF_FOLDER, output_pdf_name)
+    manifest_path = f"{output_pdf_base_path}.pages.json"
+    pdf_data = build_pdf_data(month_str, target_year)
+    fingerprints = page_fingerprints(pdf_data, trip_table)
+
+    previous = load_page_manifest(manifest_path, pdf_output, output_pdf_base_path) if incremental else None
+    if previous is None or not fingerprints:
+        pages = None
+        # Pages of a previous run of this month may outnumber the new ones
+        # (the exact names are used so other devices' reports of the month are kept)
+        delete_files_with_prefix(KM_PDF_FOLDER, f"{output_pdf_name}_page_")
+        delete_files_with_prefix(KM_PDF_FOLDER, f"{output_pdf_name}.pdf")
+    else:
+        pages = {i for i, fingerprint in enumerate(fingerprints) if i >= len(previous) or previous[i] != fingerprint}
+        if pdf_output != "combined":
+            # The month lost rows: drop the pages past its new end
+            for page_number in range(len(fingerprints) + 1, len(previous) + 1):
+                os.remove(f"{output_pdf_base_path}_page_{page_number}.pdf")
+        print(f"Incremental render: {len(pages)} of {len(fingerprints)} page(s) changed")
+        if not pages and len(previous) == len(fingerprints):
+            return len(fingerprints)
 
     if status_callback:
         status_callback("Writing PDF data...", "info")
-    write_distance_data(
-        "./files/input/km_document_model.pdf",
+    create_folder(KM_PDF_FOLDER)
+    page_count = write_distance_data(
+        PDF_TEMPLATE_PATH,
         output_pdf_base_path,
         pdf_data,
-        pdf_event_data
+        trip_table,
+        combined=pdf_output in ("combined", "both"),
+        split=pdf_output in ("split", "both"),
+        pages=pages
     )
+    with open(manifest_path, "w", encoding="UTF-8") as file:
+        json.dump({'pdf_output': pdf_output, 'fingerprints': fingerprints}, file)
+    return page_count
+
+def export_trip_table(trip_table, km_file_path, exports=()):
+    """Write the TXT report and the optional CSV/Parquet copies of a trip table."""
+    trip_table.to_txt(km_file_path)
+    if "csv" in exports:
+        trip_table.to_csv(km_file_path.replace(".txt", ".csv"))
+    if "parquet" in exports:
+        trip_table.to_parquet(km_file_path.replace(".txt", ".parquet"))
+
+def save_run_summary(metrics, target_month, target_year, trace=False, status_callback=None, label=None):
+    """Save the JSON run summary (and optionally the Chrome trace) and show it in the GUI."""
+    summary_path = metrics_path(target_month, target_year, label=label)
+    metrics.save_summary(summary_path)
+    if trace:
+        metrics.save_chrome_trace(metrics_path(target_month, target_year, suffix=".trace.json", label=label))
+    metrics_summary = metrics.format_summary()
+    print(f"Run summary saved to: {summary_path}\n{metrics_summary}")
+    if status_callback:
+        status_callback(metrics_summary, "metrics")
 
-    output_dir = "./files/output/kilometre_reports_pdf"
+def process_months(months, status_callback=None, distance_backend="gmaps", distance_options=None,
+                   cache_ttl_days=None, cache_max_entries=None, **month_options):
+    """
+    Process several months with one device connection, one distance backend and one cache
+    (see async_runner.run_months_async, which runs the stages and applies the timeouts).
+    months: List of (year, month) tuples, walked in order (see month_range)
+    month_options: resume, refresh, extraction_mode, full_matrix, pdf_output, exports, offline, trace, ...
+    Returns: The TripTable of each month, in order
+    """
+    from async_runner import run_months_async  # Builds on this module
+    return asyncio.run(run_months_async(months, status_callback, distance_backend, distance_options,
+                                        cache_ttl_days, cache_max_entries, **month_options))
 
-    write_page_numbers(output_dir, output_pdf_name)
+def device_label(serial):
+    """File-name friendly name of a device serial ('192.168.1.20:5555' -> '192.168.1.20_5555')."""
+    return re.sub(r"[^\w.-]", "_", serial)
 
-    print(f"PDF reports saved to: {km_pdf_folder}")
-    print(f"TXT reports saved to: {km_txt_folder}")
+def process_devices(devices, months, status_callback=None, distance_backend="gmaps", distance_options=None,
+                    cache_ttl_days=None, cache_max_entries=None, trace=False, **month_options):
+    """
+    Process the same months on several phones at once, one worker thread per device.
+    Every worker walks its own phone but all of them share one distance cache and feed one
+    distance-resolution stage, so a route driven by several employees is only looked up once.
+    devices: List of serials / Wi-Fi ADB addresses, or {label: serial} to name each employee's reports
+    months: List of (year, month) tuples (see month_range)
+    month_options: Passed on to AsyncReportRunner (e.g. resume=True, pdf_output='combined')
+    Returns: {label: [TripTable of each month]} of the devices that finished
+    """
+    from async_runner import run_months
+    if not isinstance(devices, dict):
+        devices = {device_label(serial): serial for serial in devices}
+    if not devices:
+        raise ValueError("No devices given.")
+
+    metrics = start_run()
+    # Cleaned once here: the workers write their reports side by side
+    prepare_data_folders(KM_PDF_FOLDER, KM_TXT_FOLDER,
+                         keep_existing=month_options.get("resume", False) or month_options.get("refresh", False))
+    trip_tables = {}
+    failed = []
+
+    def device_callback(label):
+        if not status_callback:
+            return None
+        return lambda message, status_type: status_callback(f"[{label}] {message}", status_type)
+
+    def device_worker(session, shared_provider, label, serial):
+        callback = device_callback(label)
+        with session.device_session(serial, shared_provider, callback) as device_session:
+            return run_months(months, device_session, metrics, callback, label=label, **month_options)
+
+    with ReportSession(distance_backend, distance_options, cache_ttl_days, cache_max_entries,
+                       status_callback) as session:
+        shared_provider = SharedDistanceProvider(session.distance_provider)
+        try:
+            with ThreadPoolExecutor(max_workers=len(devices)) as executor:
+                futures = {
+                    executor.submit(device_worker, session, shared_provider, label, serial): label
+                    for label, serial in devices.items()
+                }
+                for future in as_completed(futures):
+                    label = futures[future]
+                    try:
+                        trip_tables[label] = future.result()
+                    except Exception as e:
+                        # One unplugged phone must not cost the other employees their reports
+                        failed.append(label)
+                        print(f"Device {label} failed:")
+                        traceback.print_exc()
+                        if status_callback:
+                            status_callback(f"Device {label} failed: {e}", "error")
+        finally:
+            shared_provider.close()
+
+    first_year, first_month = months[0]
+    save_run_summary(metrics, first_month, first_year, trace, status_callback, label="devices")
+    if status_callback:
+        if failed:
+            status_callback(f"{len(trip_tables)} device(s) done, failed: {', '.join(failed)}", "error")
+        else:
+            status_callback(f"{len(trip_tables)} device(s) completed successfully!", "success")
+    return trip_tables
 
-    print(f"\nTotal time spent on events in {month_str}/{target_year}: {hours}h:{minutes}min")
-    print(f"Total kilometres for the month: {total_km:.2f}")
+class MonthRun:
+    """
+    One month being processed: its checkpoint journal, distance matrix and the trips found so far.
+    Holds the stages that async_runner.AsyncReportRunner schedules: the runner scrapes the days
+    and feeds them to add_day.
+    """
+    def __init__(self, month_str, target_year, session, resume=False, offline=False, label=None, metrics=None,
+                 refresh=False, trip_rules=None):
+        """
+        session: ReportSession providing the distance cache and backend
+        resume: Reuse the days finished by an interrupted run (see replay_finished_days)
+        offline: Days missing from the checkpoint journal are skipped instead of scraped
+        label: Device the month belongs to (see process_devices)
+        refresh: Scrape every day again but only resolve and journal the days whose events changed
+                 since the previous run (compared by fingerprint), and only redraw the PDF pages they touch
+        trip_rules: TripRules deciding which events are trips (defaults to files/input/trip_rules.json)
+        """
+        self.month_str = month_str
+        self.target_year = target_year or date.today().year
+        self.target_month = int(month_str)
+        self.session = session
+        self.label = label
+        self.refresh = refresh
+        if trip_rules is None:
+            from trip_rules import get_trip_rules
+            trip_rules = get_trip_rules()
+        self.trip_rules = trip_rules
+        self.metrics = metrics or get_run_metrics()
+        self.km_file_path = km_txt_path(self.target_month, self.target_year, label)
+
+        self.journal = CheckpointJournal(checkpoint_path(self.target_month, self.target_year, label=label))
+        # Days of the previous run, compared with the new scrape by a refresh
+        self.previous_days = {}
+        if refresh:
+            self.previous_days = self.journal.load()
+            self.finished_days = {}
+            print(f"Refreshing {month_str}/{self.target_year}: {len(self.previous_days)} day(s) from the previous run")
+        elif resume:
+            self.finished_days = self.journal.load()
+            print(f"Resuming {month_str}/{self.target_year}: {len(self.finished_days)} day(s) already done")
+        else:
+            self.journal.clear()
+            self.finished_days = {}
+
+        # The month's matrix is kept with its output, so a re-run only resolves new pairs
+        self.matrix_path = matrix_path(self.target_month, self.target_year, label=label)
+        self.matrix = DistanceMatrix.load(self.matrix_path)
+        for finished in [*self.finished_days.values(), *self.previous_days.values()]:
+            for origin, destination, distance in finished['distances']:
+                # Failed lookups (None, or '0 km' in older journals) are resolved again
+                if distance is not None and distance != "0 km":
+                    self.matrix.set(origin, destination, distance)
+        # The distance cache has the last word on routes changed or invalidated there
+        self.matrix.sync_with_cache(session.checked_addresses)
+
+        current_days_month = calendar.monthrange(self.target_year, self.target_month)[1]
+        self.remaining_days = [day for day in range(1, current_days_month + 1) if day not in self.finished_days]
+        if offline and self.remaining_days:
+            print(f"Offline run: {len(self.remaining_days)} day(s) of {month_str}/{self.target_year} "
+                  "have no checkpoint and are skipped")
+            self.remaining_days = []
+
+        self.total_duration = timedelta()
+        self.trips_by_day = {}
+
+    def replay_finished_days(self):
+        """Add the days of the checkpoint journal in one pass, resolving only distances it did not hold."""
+        events_by_day = {day: self.finished_days[day]['events'] for day in sorted(self.finished_days)}
+        replayed_trips = []
+        for day, (day_duration, day_trips) in find_month_trips(
+                events_by_day, self.target_month, self.target_year, self.trip_rules).items():
+            self.total_duration += day_duration
+            self.trips_by_day[day] = day_trips
+            replayed_trips += day_trips
+        resolve_distances(replayed_trips, self.session.distance_provider, self.session.checked_addresses,
+                          self.matrix)
+
+    def add_day(self, day, events, record=True):
+        """
+        Find a day's trips, resolve their distances and (record=True) append the day to the journal.
+        Blocks while distances are looked up. A refreshed day whose events did not change keeps
+        the distances of the previous run; only the lookups that failed then are tried again, and
+        the day is journaled again only if one of them now succeeded.
+        """
+        day_duration, day_trips = find_day_trips(events, day, self.target_month, self.target_year, self.trip_rules)
+        self.total_duration += day_duration
+        self.trips_by_day[day] = day_trips
+        previous = self.previous_days.get(day) if self.refresh else None
+        unchanged = previous is not None and previous['fingerprint'] == day_fingerprint(events)
+        if self.refresh and record:
+            if unchanged:
+                self.metrics.count("refresh.unchanged_days")
+            else:
+                self.metrics.count("refresh.changed_days")
+                print(f"Day {day} changed since the previous run")
+        # Cells the matrix already holds are not looked up again
+        resolve_distances(day_trips, self.session.distance_provider, self.session.checked_addresses, self.matrix)
+        distances = [
+            [trip['clean_origin'], trip['clean_destination'],
+             self.matrix.get(trip['clean_origin'], trip['clean_destination'])]
+            for trip in day_trips
+        ]
+        if record and not (unchanged and distances == previous['distances']):
+            with self.metrics.stage("checkpoint.record_day", day=day):
+                self.journal.record_day(day, events, distances)
+
+    def save_matrix(self, full_matrix=False):
+        """full_matrix: First resolve every pair of the month's locations"""
+        if full_matrix:
+            self.matrix.fill(self.session.distance_provider, cache=self.session.checked_addresses)
+        self.matrix.save(self.matrix_path)
+        if self.remaining_days:
+            # The picker is left open on the last scraped day, the next month starts from there
+            self.session.picker_date = date(self.target_year, self.target_month, self.remaining_days[-1])
+
+    def build_trip_table(self):
+        trips = [trip for day in sorted(self.trips_by_day) for trip in self.trips_by_day[day]]
+        distances = [self.matrix.get(trip['clean_origin'], trip['clean_destination']) for trip in trips]
+        # Trips shorter than the rules' min_km are left out of the report
+        keep = self.trip_rules.keep_distances([parse_distance_km(distance) for distance in distances])
+        trip_table = TripTable()
+        for trip, distance, kept in zip(trips, distances, keep):
+            if distance is None:
+                print(f"No distance for {trip['route']} on {trip['date']}, run again with resume to retry it")
+            elif kept:
+                trip_table.append(trip['date'], trip['origin'], trip['destination'], distance)
+        return trip_table
+
+    def write_reports(self, trip_table, pdf_output="split", exports=(), status_callback=None):
+        """Write the TXT report (plus exports) and the PDF report of the month."""
+        # Rewritten from scratch so a resumed run never duplicates rows
+        with self.metrics.stage("report.txt"):
+            export_trip_table(trip_table, self.km_file_path, exports)
+
+        with self.metrics.stage("report.pdf"):
+            write_month_pdf(trip_table, self.month_str, self.target_year, pdf_output, status_callback, self.label,
+                            incremental=self.refresh)
+
+        total_seconds = int(self.total_duration.total_seconds())
+        hours = total_seconds // 3600
+        minutes = (total_seconds % 3600) // 60
+
+        print(f"PDF reports saved to: {KM_PDF_FOLDER}")
+        print(f"TXT reports saved to: {KM_TXT_FOLDER}")
+
+        print(f"\nTotal time spent on events in {self.month_str}/{self.target_year}: {hours}h:{minutes}min")
+        print(f"Total kilometres for the month: {trip_table.total_km():.2f}")
+
+def process_month(month_str: str, status_callback=None, target_year: int | None = None,
+                  cache_ttl_days=None, cache_max_entries=None, day_queue_size=3,
+                  distance_backend="gmaps", distance_options=None, full_matrix=False,
+                  extraction_mode="dump", resume=False, session=None, clean_output=True,
+                  pdf_output="split", exports=(), offline=False, trace=False, label=None, metrics=None,
+                  refresh=False):
+    """
+    Scrape a month of events from the device and write its TXT and PDF kilometre reports.
+    target_year: Year of the month (defaults to the current year)
+    distance_backend: 'gmaps' (scrape Google Maps) or 'osm' (local road graph)
+    distance_options: Extra keyword arguments for the backend (e.g. {'pool_size': 3})
+    full_matrix: Resolve every pair of the month's locations, not only consecutive events
+                 (only sensible with a fast backend such as 'osm')
+    extraction_mode: 'dump' (one UI hierarchy dump per day) or 'selectors' (one RPC per field)
+    resume: Continue an interrupted run from its checkpoint journal, skipping finished days
+    session: ReportSession to reuse (device, browsers, cache); a private one is opened otherwise
+    clean_output: Delete the previous TXT reports before writing this month's
+    pdf_output: 'split' (one file per page), 'combined' (one multi-page file) or 'both'
+    exports: Extra trip table files next to the TXT report: 'csv' and/or 'parquet'
+    offline: Never touch the device; only the days already in the checkpoint journal are reported
+    refresh: Re-scrape the month but only look up the days whose events changed since the last run
+             and only redraw the PDF pages they touch (see MonthRun)
+    trace: Also save the run's stage timings as a Chrome trace next to its JSON run summary
+    label: Name of the device/employee added to every file of the month (see process_devices)
+    metrics: RunMetrics shared with other months processed at the same time; its summary is then
+             saved by the caller. A new run is started otherwise.
+    """
+    target_year = target_year or date.today().year
+    month_options = dict(day_queue_size=day_queue_size, full_matrix=full_matrix, extraction_mode=extraction_mode,
+                         resume=resume, pdf_output=pdf_output, exports=exports, offline=offline, refresh=refresh)
+    if session is None:
+        return process_months([(target_year, int(month_str))], status_callback, distance_backend, distance_options,
+                              cache_ttl_days, cache_max_entries, trace=trace, label=label, **month_options)[0]
+
+    from async_runner import run_months
+    owns_metrics = metrics is None
+    if owns_metrics:
+        metrics = start_run()
+    prepare_data_folders(KM_PDF_FOLDER, KM_TXT_FOLDER, keep_existing=resume or refresh or not clean_output)
+    trip_table = run_months([(target_year, int(month_str))], session, metrics, status_callback, label=label,
+                            **month_options)[0]
+
+    if owns_metrics:
+        save_run_summary(metrics, int(month_str), target_year, trace, status_callback, label)
     if status_callback:
-        status_callback("Program completed successfully!", "success")
\ No newline at end of file
+        status_callback("Program completed successfully!", "success")
+    return trip_table
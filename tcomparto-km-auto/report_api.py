@@ -0,0 +1,72 @@
+import os
+from datetime import date
+
+from process_events import (
+    obtain_month, month_range, process_months, process_devices, device_label, write_month_pdf,
+    export_trip_table, km_txt_path, KM_TXT_FOLDER
+)
+from trip_table import TripTable
+
+REPORT_SOURCES = ("device", "checkpoint", "txt")
+
+
+def generate_report(month, year=None, until=None, source="device", status_callback=None, devices=None, **options):
+    """
+    Generate the kilometre report of a month (or a range of months) without the GUI.
+    month: Month number or string (e.g. 6 or '06')
+    year: Year of the month (defaults to the current year)
+    until: Optional (year, month) of the last month of a range, inclusive
+    source: Where the trips come from:
+            'device'     scrape the phone (add resume=True to continue an interrupted run, or refresh=True
+                         to only look up and redraw the days that changed since the last run)
+            'checkpoint' recompute from the checkpoint journal and cached distances, never touching the device
+            'txt'        re-render the PDF from an existing km_MM_YYYY.txt report
+    status_callback: Function receiving (message, 'info'|'error'|'success') updates (optional)
+    devices: Serials / Wi-Fi ADB addresses (or {label: serial}) to process in parallel, one report each;
+             None uses the only phone attached
+    options: Passed on to process_month for 'device'/'checkpoint' (distance_backend, pdf_output, exports, ...);
+             'txt' only uses pdf_output and exports
+    Returns: The TripTable of each month, in order ({label: [TripTable, ...]} when devices are given)
+    """
+    if source not in REPORT_SOURCES:
+        raise ValueError(f"Unknown report source '{source}'. Options: {', '.join(REPORT_SOURCES)}")
+
+    target_month = int(obtain_month(f"{int(month):02}", status_callback))
+    target_year = int(year) if year else date.today().year
+    end_year, end_month = until or (target_year, target_month)
+    months = month_range(target_year, target_month, int(end_year), int(end_month))
+
+    if devices is not None and not isinstance(devices, dict):
+        devices = {device_label(serial): serial for serial in devices}
+
+    if source == "txt":
+        if devices:
+            return {label: [rerender_from_txt(m, y, status_callback, label=label, **options) for y, m in months]
+                    for label in devices}
+        return [rerender_from_txt(m, y, status_callback, **options) for y, m in months]
+    if source == "checkpoint":
+        options.update(resume=True, offline=True)
+    if devices:
+        return process_devices(devices, months, status_callback, **options)
+    return process_months(months, status_callback, **options)
+
+
+def rerender_from_txt(target_month, target_year, status_callback=None, pdf_output="split", exports=(), label=None):
+    """
+    Rebuild the PDF (and optional CSV/Parquet exports) of a month from its TXT report.
+    Only PyMuPDF is needed: no device, browser or distance backend is loaded.
+    label: Device whose report is re-rendered, when several phones are processed
+    """
+    km_file_path = km_txt_path(target_month, target_year, label)
+    if not os.path.exists(km_file_path):
+        raise FileNotFoundError(f"No TXT report {os.path.basename(km_file_path)} in {KM_TXT_FOLDER}")
+
+    trip_table = TripTable.from_txt(km_file_path)
+    if exports:
+        export_trip_table(trip_table, km_file_path, exports)
+    pages = write_month_pdf(trip_table, f"{target_month:02}", target_year, pdf_output, status_callback, label)
+    print(f"Re-rendered {len(trip_table)} trip(s) of {target_month:02}/{target_year} into {pages} page(s), "
+          f"{trip_table.total_km():.2f} km")
+    if status_callback:
+        status_callback("Program completed successfully!", "success")
+    return trip_table
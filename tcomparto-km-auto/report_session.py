@@ -0,0 +1,96 @@
+from datetime import date
+
+from distance_cache import DistanceCache, DEFAULT_CACHE_PATH
+from distance_providers import LazyDistanceProvider
+
+APP_PACKAGE = "com.asisto.tcomparto"
+
+
+class ReportSession:
+    """
+    Device connection, distance backend and distance cache shared by every month of a run,
+    so their startup cost is paid once however many months are processed.
+    """
+    def __init__(self, distance_backend="gmaps", distance_options=None,
+                 cache_ttl_days=None, cache_max_entries=None, status_callback=None,
+                 device_serial=None, checked_addresses=None, distance_provider=None):
+        """
+        device_serial: Phone to use (USB serial or Wi-Fi ADB address), None for the only one attached
+        checked_addresses / distance_provider: Cache and backend of another session to share
+                                               (see device_session); they are then not closed here
+        """
+        self.distance_backend = distance_backend
+        self.status_callback = status_callback
+        self.device_serial = device_serial
+        self.owns_cache = checked_addresses is None
+        self.owns_distance_provider = distance_provider is None
+        # Each backend measures routes differently, so they do not share cached distances
+        # Compared with None: an empty cache is falsy (DistanceCache defines __len__)
+        if checked_addresses is not None:
+            self.checked_addresses = checked_addresses
+        else:
+            self.checked_addresses = DistanceCache(
+                path=DEFAULT_CACHE_PATH if distance_backend == "gmaps" else f"./files/cache/distances_{distance_backend}.sqlite3",
+                ttl_seconds=cache_ttl_days * 86400 if cache_ttl_days else None,
+                max_entries=cache_max_entries
+            )
+        # Created on first lookup, so re-renders from saved data never start a browser
+        if distance_provider is not None:
+            self.distance_provider = distance_provider
+        else:
+            self.distance_provider = LazyDistanceProvider(distance_backend, **(distance_options or {}))
+        self.device = None
+        # Date the app's date picker currently points at (the app opens on today)
+        self.picker_date = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get_device(self):
+        """Connect to the phone and open the 'Planilla' tab on first use."""
+        if self.device is None:
+            from android_ui_utils import connect_device, restart_app, open_planilla_tab
+            if self.status_callback:
+                self.status_callback("Connecting to device...", "info")
+            self.device = connect_device(self.device_serial)
+            restart_app(self.device, APP_PACKAGE)
+            open_planilla_tab(self.device)
+            self.picker_date = date.today()
+        return self.device
+
+    def go_to_month(self, target_year, target_month):
+        """Move the date picker from wherever the previous month left it to the target month."""
+        from android_ui_utils import navigate_to_month
+        d = self.get_device()
+        navigate_to_month(d, target_year, target_month, shown_date=self.picker_date)
+        self.picker_date = date(target_year, target_month, 1)
+        return d
+
+    def device_session(self, device_serial, distance_provider=None, status_callback=None):
+        """
+        Session for another phone that shares this session's distance cache and backend.
+        distance_provider: Backend to use instead of this session's (e.g. a SharedDistanceProvider over it)
+        """
+        return ReportSession(self.distance_backend, status_callback=status_callback or self.status_callback,
+                             device_serial=device_serial, checked_addresses=self.checked_addresses,
+                             distance_provider=distance_provider if distance_provider is not None
+                             else self.distance_provider)
+
+    def close(self):
+        if self.owns_distance_provider:
+            if self.distance_provider.started and self.status_callback:
+                self.status_callback("Closing distance backend...", "info")
+            self.distance_provider.close()
+
+        if self.owns_cache:
+            cache_stats = self.checked_addresses.stats()
+            print(f"Distance cache: {cache_stats['hits']} hit(s), {cache_stats['misses']} miss(es), "
+                  f"{cache_stats['entries']} stored route(s)")
+            self.checked_addresses.close()
+
+        if self.device is not None:
+            self.device.app_stop(APP_PACKAGE)
+            self.device = None
@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from file_utils import month_file_stem
+
+DEFAULT_METRICS_FOLDER = "./files/output/run_metrics"
+
+
+def metrics_path(target_month, target_year, folder=DEFAULT_METRICS_FOLDER, suffix=".json", label=None):
+    return os.path.join(folder, f"run_{month_file_stem(target_month, target_year, label)}{suffix}")
+
+
+class RunMetrics:
+    """
+    Stage timings and counters of one report run.
+    Stages are timed with `with metrics.stage("name"):` from any thread (scraper, browser
+    pool workers, renderer); every span is kept so the run can also be exported as a
+    Chrome trace (chrome://tracing or https://ui.perfetto.dev).
+    """
+    def __init__(self):
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **details):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter() - start, details)
+
+    def add_span(self, name, start, seconds, details=None):
+        """Record a stage measured elsewhere (start is a time.perf_counter() value)."""
+        with self.lock:
+            self.spans.append((name, start - self.origin, seconds, threading.get_ident(), details or {}))
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def summary(self):
+        """
+        Returns: {'started_at', 'wall_seconds', 'stages': {name: {count, total, mean, max}}, 'counters'}
+        Stages are sorted by total time, so the bottleneck comes first.
+        """
+        with self.lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+        stages = {}
+        for name, _, seconds, _, _ in spans:
+            stage = stages.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            stage['count'] += 1
+            stage['total'] += seconds
+            stage['max'] = max(stage['max'], seconds)
+        for stage in stages.values():
+            stage['mean'] = stage['total'] / stage['count']
+        return {
+            'started_at': self.started_at,
+            'wall_seconds': time.perf_counter() - self.origin,
+            'stages': dict(sorted(stages.items(), key=lambda item: -item[1]['total'])),
+            'counters': counters,
+        }
+
+    def format_summary(self, top=5):
+        """One-paragraph summary for the GUI status: slowest stages and the counters."""
+        summary = self.summary()
+        lines = [f"Run time {summary['wall_seconds']:.1f}s"]
+        lines += [
+            f"{name}: {stage['total']:.1f}s ({stage['count']}x, max {stage['max']:.2f}s)"
+            for name, stage in list(summary['stages'].items())[:top]
+        ]
+        if summary['counters']:
+            lines.append(", ".join(f"{name} {value}" for name, value in sorted(summary['counters'].items())))
+        return "\n".join(lines)
+
+    def save_summary(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="UTF-8") as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def save_chrome_trace(self, path):
+        """Write the spans in the Trace Event Format (complete 'X' events, microseconds)."""
+        with self.lock:
+            spans = list(self.spans)
+        events = [
+            {'name': name, 'cat': name.split(".")[0], 'ph': "X", 'pid': os.getpid(), 'tid': thread,
+             'ts': round(start * 1e6), 'dur': round(seconds * 1e6), 'args': details}
+            for name, start, seconds, thread, details in spans
+        ]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="UTF-8") as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': "ms"}, file)
+
+
+_run_metrics = RunMetrics()
+
+
+def get_run_metrics():
+    """Metrics of the run in progress, shared by every module that instruments a stage."""
+    return _run_metrics
+
+
+def start_run():
+    """Start collecting a new run's metrics. Returns: The new RunMetrics."""
+    global _run_metrics
+    _run_metrics = RunMetrics()
+    return _run_metrics
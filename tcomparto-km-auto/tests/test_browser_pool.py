@@ -0,0 +1,204 @@
+# test_browser_pool.py
+# BrowserPool on stub drivers: no Firefox is started.
+# Run from the tcomparto-km-auto folder: python -m pytest tests
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from browser_pool import BrowserPool
+from distance_providers import DistanceProvider, SharedDistanceProvider
+
+
+class StubDriver:
+    def __init__(self, number):
+        self.number = number
+        self.alive = True
+
+    @property
+    def current_url(self):
+        if not self.alive:
+            raise ConnectionError("browser is gone")
+        return "about:blank"
+
+
+class StubBrowsers:
+    """Driver factory, closer and lookup of a pool, recording what the pool asked for."""
+    def __init__(self, answers=None, delays=None, start_delay=0):
+        """
+        answers: {origin: list of results returned by its successive lookups (an Exception is raised)}
+        delays: {origin: seconds a lookup of it takes}
+        start_delay: Seconds a browser takes to start
+        """
+        self.answers = {origin: list(results) for origin, results in (answers or {}).items()}
+        self.delays = delays or {}
+        self.start_delay = start_delay
+        self.started = []
+        self.closed = []
+        self.lookups = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        time.sleep(self.start_delay)
+        with self.lock:
+            driver = StubDriver(len(self.started) + 1)
+            self.started.append(driver)
+            return driver
+
+    def close(self, driver):
+        driver.alive = False
+        with self.lock:
+            self.closed.append(driver)
+
+    def lookup(self, origin, destination, driver):
+        with self.lock:
+            self.lookups.append((origin, destination, driver.number))
+            answers = self.answers.get(origin)
+            result = answers.pop(0) if answers else f"{len(origin)}.5 km"
+        time.sleep(self.delays.get(origin, 0))
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def pool(self, **options):
+        return BrowserPool(driver_factory=self.start, lookup=self.lookup, driver_closer=self.close, **options)
+
+    def lookups_of(self, origin):
+        return [lookup for lookup in self.lookups if lookup[0] == origin]
+
+
+class BrowserPoolTest(unittest.TestCase):
+    def test_results_keep_the_order_of_the_pairs(self):
+        origins = [f"origin {'x' * i}" for i in range(8)]
+        # The first pairs are the slowest, so they finish last
+        browsers = StubBrowsers(delays={origin: 0.02 * (8 - i) for i, origin in enumerate(origins)})
+        with browsers.pool(size=3) as pool:
+            results = pool.resolve([(origin, "destination") for origin in origins])
+        self.assertEqual(results, [f"{len(origin)}.5 km" for origin in origins])
+        self.assertEqual(len(browsers.started), 3)
+
+    def test_short_route_is_not_retried(self):
+        browsers = StubBrowsers(answers={"near": ["0.8 km"]})
+        with browsers.pool(size=1, retries=2) as pool:
+            self.assertEqual(pool.resolve([("near", "destination")]), ["0.8 km"])
+        self.assertEqual(len(browsers.lookups_of("near")), 1)
+
+    def test_not_found_is_not_retried(self):
+        browsers = StubBrowsers(answers={"nowhere": ["9999 km"]})
+        with browsers.pool(size=1, retries=2) as pool:
+            self.assertEqual(pool.resolve([("nowhere", "destination")]), ["9999 km"])
+        self.assertEqual(len(browsers.lookups_of("nowhere")), 1)
+
+    def test_failed_lookup_is_retried(self):
+        browsers = StubBrowsers(answers={"flaky": [None, None, "3.5 km"]})
+        with browsers.pool(size=1, retries=2) as pool:
+            self.assertEqual(pool.resolve([("flaky", "destination")]), ["3.5 km"])
+        self.assertEqual(len(browsers.lookups_of("flaky")), 3)
+
+    def test_failure_after_every_retry_is_none(self):
+        browsers = StubBrowsers(answers={"broken": [None, None, None, "too late"]})
+        with browsers.pool(size=1, retries=2) as pool:
+            self.assertEqual(pool.resolve([("broken", "destination")]), [None])
+        self.assertEqual(len(browsers.lookups_of("broken")), 3)
+
+    def test_crashed_browser_is_replaced(self):
+        browsers = StubBrowsers(answers={"crash": [ConnectionError("browser crashed"), "4.5 km"]})
+        with browsers.pool(size=1, retries=2) as pool:
+            self.assertEqual(pool.resolve([("crash", "destination")]), ["4.5 km"])
+        self.assertEqual([number for _, _, number in browsers.lookups_of("crash")], [1, 2])
+        self.assertIs(browsers.closed[0], browsers.started[0])
+
+    def test_browser_is_recycled_after_max_uses(self):
+        browsers = StubBrowsers()
+        with browsers.pool(size=1, max_uses=2) as pool:
+            pool.resolve([(f"origin {i}", "destination") for i in range(5)])
+            self.assertEqual([number for _, _, number in browsers.lookups], [1, 1, 2, 2, 3])
+            self.assertEqual(len(browsers.closed), 2)
+        self.assertEqual(len(browsers.closed), 3)
+
+    def test_check_health_restarts_dead_browsers(self):
+        browsers = StubBrowsers()
+        with browsers.pool(size=2) as pool:
+            pool.warm_up(2)
+            browsers.started[1].alive = False
+            self.assertEqual(pool.check_health(), 1)
+            self.assertEqual(len(browsers.started), 3)
+
+    def test_concurrent_warm_ups_start_one_browser(self):
+        browsers = StubBrowsers(start_delay=0.05)
+        with browsers.pool(size=2) as pool:
+            run_concurrently(4, pool.warm_up)
+            self.assertEqual(len(browsers.started), 1)
+        self.assertEqual(len(browsers.closed), 1)
+
+    def test_concurrent_resolves_keep_their_own_lookup(self):
+        browsers = StubBrowsers()
+        busy_drivers = []
+        overlaps = []
+
+        def run_lookup(answer):
+            def lookup(origin, destination, driver):
+                with browsers.lock:
+                    overlaps.append(driver.number in busy_drivers)
+                    busy_drivers.append(driver.number)
+                time.sleep(0.01)
+                with browsers.lock:
+                    busy_drivers.remove(driver.number)
+                return answer
+            return lookup
+
+        results = {}
+        with browsers.pool(size=2) as pool:
+            def resolve(answer):
+                results[answer] = pool.resolve([(f"origin {i}", "destination") for i in range(4)],
+                                               lookup=run_lookup(answer))
+            threads = [threading.Thread(target=resolve, args=(answer,)) for answer in ("1.5 km", "2.5 km")]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(results, {"1.5 km": ["1.5 km"] * 4, "2.5 km": ["2.5 km"] * 4})
+        self.assertNotIn(True, overlaps)
+
+
+class PoolProvider(DistanceProvider):
+    def __init__(self, pool):
+        self.pool = pool
+        self.warm_ups = 0
+
+    def get_distances(self, pairs):
+        return self.pool.resolve(pairs)
+
+    def warm_up(self):
+        self.warm_ups += 1
+        self.pool.warm_up()
+
+
+class SharedDistanceProviderTest(unittest.TestCase):
+    def test_warm_up_of_every_device_runs_once(self):
+        browsers = StubBrowsers(start_delay=0.05)
+        with browsers.pool(size=2) as pool:
+            provider = PoolProvider(pool)
+            shared = SharedDistanceProvider(provider)
+            try:
+                run_concurrently(3, shared.warm_up)
+                self.assertEqual(shared.get_distances([("origin", "destination")]), ["6.5 km"])
+            finally:
+                shared.close()
+        self.assertEqual(provider.warm_ups, 1)
+        self.assertEqual(len(browsers.started), 1)
+
+
+def run_concurrently(count, function):
+    threads = [threading.Thread(target=function) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    unittest.main()
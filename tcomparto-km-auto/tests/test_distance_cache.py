@@ -0,0 +1,93 @@
+# test_distance_cache.py
+# DistanceCache expiry, LRU eviction and invalidation on a temporary SQLite file.
+# Run from the tcomparto-km-auto folder: python -m pytest tests
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from distance_cache import DistanceCache
+from distance_providers import NOT_FOUND_DISTANCE
+
+
+class DistanceCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "distances.sqlite3")
+        self.now = 1_000_000.0
+        clock = mock.patch("distance_cache.time.time", side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def open_cache(self, **options):
+        cache = DistanceCache(self.path, **options)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_distances_survive_reopening(self):
+        cache = self.open_cache()
+        cache.set("Calle A 29730 -> Calle B 29738", "3,5 km")
+        cache.close()
+        self.assertEqual(self.open_cache().get("calle a 29730  ->  calle b 29738"), "3,5 km")
+
+    def test_entry_older_than_the_ttl_is_missing(self):
+        cache = self.open_cache(ttl_seconds=100)
+        cache.set("a -> b", "3,5 km")
+        self.now += 100
+        self.assertEqual(cache.get("a -> b"), "3,5 km")
+        self.now += 1
+        self.assertIsNone(cache.get("a -> b"))
+        self.assertNotIn("a -> b", cache)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_not_found_expires_before_found_distances(self):
+        cache = self.open_cache(not_found_ttl_seconds=10)
+        cache.set("a -> b", "3,5 km")
+        cache.set("a -> nowhere", NOT_FOUND_DISTANCE)
+        self.now += 11
+        self.assertEqual(cache.get_many(["a -> b", "a -> nowhere"]), {"a -> b": "3,5 km"})
+        self.assertEqual(cache.get("a -> b"), "3,5 km")
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = self.open_cache(max_entries=2)
+        cache.set("a -> b", "1 km")
+        self.now += 1
+        cache.set("b -> c", "2 km")
+        self.now += 1
+        # Reading a -> b makes b -> c the least recently used
+        cache.get("a -> b")
+        self.now += 1
+        cache.set("c -> d", "3 km")
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn("b -> c", cache)
+        self.assertIn("a -> b", cache)
+        self.assertIn("c -> d", cache)
+
+    def test_invalidate_removes_the_route_until_it_is_stored_again(self):
+        cache = self.open_cache()
+        cache.set("a -> b", "3,5 km")
+        self.assertTrue(cache.invalidate("A -> B"))
+        self.assertIsNone(cache.get("a -> b"))
+        self.assertFalse(cache.invalidate("a -> b"))
+        self.assertEqual(cache.invalidated_routes(["a -> b", "b -> c"]), {"a -> b"})
+        cache.set("a -> b", "3,6 km")
+        self.assertEqual(cache.invalidated_routes(["a -> b"]), set())
+
+    def test_evicted_route_is_not_invalidated(self):
+        cache = self.open_cache(max_entries=1)
+        cache.set("a -> b", "1 km")
+        self.now += 1
+        cache.set("b -> c", "2 km")
+        self.assertNotIn("a -> b", cache)
+        self.assertEqual(cache.invalidated_routes(["a -> b"]), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
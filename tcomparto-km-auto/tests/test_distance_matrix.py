@@ -0,0 +1,54 @@
+# test_distance_matrix.py
+# DistanceMatrix.sync_with_cache against a throwaway SQLite cache.
+# Run from the tcomparto-km-auto folder: python -m pytest tests
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from distance_cache import DistanceCache, route_key
+from distance_matrix import DistanceMatrix
+from distance_providers import NOT_FOUND_DISTANCE
+
+
+class SyncWithCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = DistanceCache(":memory:")
+        self.matrix = DistanceMatrix()
+        self.matrix.set("Calle A 29730", "Calle B 29738", "3.5 km")
+        self.matrix.set("Calle B 29738", "Calle A 29730", "3.6 km")
+
+    def tearDown(self):
+        self.cache.close()
+
+    def test_cell_takes_the_distance_of_the_cache(self):
+        self.cache.set(route_key("Calle A 29730", "Calle B 29738"), "4.1 km")
+        self.assertEqual(self.matrix.sync_with_cache(self.cache), 1)
+        self.assertEqual(self.matrix.get("Calle A 29730", "Calle B 29738"), "4.1 km")
+
+    def test_route_missing_from_the_cache_keeps_its_cell(self):
+        self.assertEqual(self.matrix.sync_with_cache(self.cache), 0)
+        self.assertEqual(self.matrix.get("Calle A 29730", "Calle B 29738"), "3.5 km")
+
+    def test_invalidated_route_is_cleared(self):
+        self.cache.set(route_key("Calle A 29730", "Calle B 29738"), "3.5 km")
+        self.cache.invalidate(route_key("Calle A 29730", "Calle B 29738"))
+        self.assertEqual(self.matrix.sync_with_cache(self.cache), 1)
+        self.assertIsNone(self.matrix.get("Calle A 29730", "Calle B 29738"))
+        self.assertEqual(self.matrix.get("Calle B 29738", "Calle A 29730"), "3.6 km")
+
+    def test_route_stored_after_its_invalidation_is_kept(self):
+        self.cache.invalidate(route_key("Calle A 29730", "Calle B 29738"))
+        self.cache.set(route_key("Calle A 29730", "Calle B 29738"), "3.5 km")
+        self.assertEqual(self.matrix.sync_with_cache(self.cache), 0)
+        self.assertEqual(self.matrix.get("Calle A 29730", "Calle B 29738"), "3.5 km")
+
+    def test_not_found_missing_from_the_cache_is_cleared(self):
+        self.matrix.set("Calle A 29730", "Calle X 29738", NOT_FOUND_DISTANCE)
+        self.assertEqual(self.matrix.sync_with_cache(self.cache), 1)
+        self.assertIsNone(self.matrix.get("Calle A 29730", "Calle X 29738"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+# test_trip_rules.py
+# The default TripRules against the trip selection that was hard-coded in process_day.
+# Run from the tcomparto-km-auto folder: python -m pytest tests
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from trip_rules import TripRules
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "files", "input", "trip_rules.json")
+
+# One list of (time, address, name) rows per day, as read from the app
+EVENTS_BY_DAY = {
+    1: [("09:00 - 10:00", "Calle A", "x"), ("10:30 - 11:00", "Calle B", "y"), ("11:00 - 12:00", "Calle C", "z"),
+        ("13:00 - 14:00", "Calle D", "x"), ("15:01 - 16:00", "Calle E", "y")],
+    # Midnight: the gap runs from the end shown on the first event, not moved to the next day
+    2: [("23:00 - 00:30", "Calle A", "x"), ("00:45 - 01:00", "Calle B", "y"), ("22:00 - 23:30", "Calle C", "z")],
+    # Unreadable rows count for nothing, but one whose end is readable can still start a trip
+    3: [("Todo el día", "Calle A", "x"), ("09:00 - 10:00", "Calle B", "y"), ("24:00 - 10:30", "Calle C", "z"),
+        ("10:40 - 11:00", "Calle D", "x"), ("11:05-11:30", "Calle E", "y"), ("9:40 - 9:50", "Calle F", "z")],
+    # Single-digit hours and minutes, as strptime's %H:%M accepts them
+    4: [("8:5 - 9:0", "Calle A", "x"), ("9:30 - 10:00", "Calle B", "y")],
+    5: [],
+    6: [("10:00 - 11:00", "Calle A", "x")],
+}
+
+
+def hard_coded_trips(events):
+    """The time checks of the former process_day, without the scraping and the lookups around them."""
+    fmt = "%H:%M"
+    total_duration = timedelta()
+    trips = []
+    for i, (user_time, _, _) in enumerate(events):
+        try:
+            start_str, end_str = [t.strip() for t in user_time.split('-')]
+            start_time = datetime.strptime(start_str, fmt)
+            end_time = datetime.strptime(end_str, fmt)
+            if end_time < start_time:
+                end_time += timedelta(days=1)
+            total_duration += (end_time - start_time)
+            if i > 0:
+                prev_start_str, prev_end_str = [t.strip() for t in events[i - 1][0].split('-')]
+                gap = start_time - datetime.strptime(prev_end_str, fmt)
+                if 0 < gap.total_seconds() <= 3600:
+                    trips.append(i - 1)
+        except ValueError:
+            continue
+    return total_duration, trips
+
+
+class TripRulesTest(unittest.TestCase):
+    def assert_same_selection(self, rules):
+        day_minutes, trips = rules.evaluate(EVENTS_BY_DAY)
+        for day, events in EVENTS_BY_DAY.items():
+            duration, origins = hard_coded_trips(events)
+            self.assertEqual(timedelta(minutes=day_minutes[day]), duration, f"duration of day {day}")
+            self.assertEqual([index for trip_day, index in trips if trip_day == day], origins, f"trips of day {day}")
+
+    def test_default_rules_select_the_hard_coded_trips(self):
+        self.assert_same_selection(TripRules())
+
+    def test_shipped_config_selects_the_hard_coded_trips(self):
+        self.assert_same_selection(TripRules.from_config(CONFIG_PATH))
+
+    def test_trips_under_one_km_are_left_out(self):
+        # process_day wrote a trip when float(distance) >= 1
+        distances = [0.0, 0.9, 0.99, 1.0, 1.01, 8.5, 9999.0]
+        self.assertEqual(list(TripRules().keep_distances(distances)), [km >= 1 for km in distances])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import json
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+
+DEFAULT_TRIP_RULES_PATH = "./files/input/trip_rules.json"
+
+# 'HH:MM - HH:MM' as shown by the app (hours and minutes may have one digit, like strptime's %H:%M)
+TIME_RANGE_RE = re.compile(r"\s*(\d{1,2}):(\d{1,2})\s*-\s*(\d{1,2}):(\d{1,2})\s*")
+TIME_RE = re.compile(r"\s*(\d{1,2}):(\d{1,2})\s*")
+
+
+@lru_cache(maxsize=4096)
+def parse_time_range(time_range):
+    """
+    '09:00 - 10:30' -> (540, 630); None when the text is not a valid time range.
+    Memoized: a month repeats the same few dozen time slots.
+    """
+    match = TIME_RANGE_RE.fullmatch(time_range)
+    if not match:
+        return None
+    start_hour, start_minute, end_hour, end_minute = map(int, match.groups())
+    if max(start_hour, end_hour) > 23 or max(start_minute, end_minute) > 59:
+        return None
+    return start_hour * 60 + start_minute, end_hour * 60 + end_minute
+
+
+@lru_cache(maxsize=4096)
+def parse_end_time(time_range):
+    """
+    '25:00 - 10:30' -> 630: the end of a time range whose start is unreadable; None when the end is too.
+    A trip only needs the end of its first event (the former process_day never parsed its start).
+    """
+    parts = time_range.split("-")
+    match = TIME_RE.fullmatch(parts[-1]) if len(parts) == 2 else None
+    if not match:
+        return None
+    hour, minute = map(int, match.groups())
+    if hour > 23 or minute > 59:
+        return None
+    return hour * 60 + minute
+
+
+class TripRules:
+    """
+    Decides which consecutive events of a day are a trip, for any number of days at once.
+    The events are turned into arrays of start/end minutes (each time string parsed once)
+    and every consecutive pair is tested in one NumPy pass.
+    """
+    def __init__(self, min_gap_minutes=0, max_gap_minutes=60, min_km=1.0, cross_midnight=True):
+        """
+        min_gap_minutes / max_gap_minutes: A trip needs min_gap < gap <= max_gap between the end
+                                           of an event and the start of the next one
+        min_km: Shortest trip written to the report
+        cross_midnight: An event ending before it starts (23:00 - 01:00) ends the next day;
+                        when False such events are treated as unreadable
+        """
+        self.min_gap_minutes = min_gap_minutes
+        self.max_gap_minutes = max_gap_minutes
+        self.min_km = min_km
+        self.cross_midnight = cross_midnight
+
+    @classmethod
+    def from_config(cls, path=DEFAULT_TRIP_RULES_PATH):
+        """Rules of the JSON config file (same keys as __init__), defaults for any key it lacks."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="UTF-8") as file:
+            return cls(**json.load(file))
+
+    def evaluate(self, events_by_day):
+        """
+        events_by_day: {day: [(time, address, name), ...]} in the order shown by the app
+        Returns: ({day: minutes spent on its events}, list of (day, index of the origin event) of every trip;
+                  the destination is the next event of that day)
+        """
+        days = list(events_by_day)
+        counts = np.fromiter((len(events_by_day[day]) for day in days), dtype=np.int64, count=len(days))
+        event_count = int(counts.sum())
+        day_positions = np.repeat(np.arange(len(days)), counts)
+        starts = np.zeros(event_count, dtype=np.int64)
+        ends = np.zeros(event_count, dtype=np.int64)
+        valid = np.zeros(event_count, dtype=bool)
+        # Only the end is readable: the event counts for nothing but can still start a trip
+        end_only = np.zeros(event_count, dtype=bool)
+
+        flat_index = 0
+        for day in days:
+            for user_time, _, _ in events_by_day[day]:
+                minutes = parse_time_range(user_time)
+                if minutes is None:
+                    print(f"Could not parse time range '{user_time}' on day {day}")
+                    print(f"Raw time string (repr): {repr(user_time)}")
+                    end = parse_end_time(user_time)
+                    if end is not None:
+                        ends[flat_index] = end
+                        end_only[flat_index] = True
+                else:
+                    starts[flat_index], ends[flat_index] = minutes
+                    valid[flat_index] = True
+                flat_index += 1
+
+        crosses_midnight = valid & (ends < starts)
+        if not self.cross_midnight:
+            valid &= ~crosses_midnight
+        durations = np.where(valid, ends - starts + np.where(crosses_midnight, 1440, 0), 0)
+        day_minutes = np.bincount(day_positions, weights=durations, minlength=len(days))
+
+        # Event i and i + 1 of the same day, the second readable and the first at least up to its end;
+        # the gap runs from the end shown on the first (not moved to the next day) to the start of the second
+        gaps = starts[1:] - ends[:-1]
+        has_end = valid | end_only
+        is_trip = ((day_positions[1:] == day_positions[:-1]) & valid[1:] & has_end[:-1]
+                   & (gaps > self.min_gap_minutes) & (gaps <= self.max_gap_minutes))
+        first_event_of_day = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        origins = np.flatnonzero(is_trip)
+        trips = [
+            (days[position], int(origin - first_event_of_day[position]))
+            for origin, position in zip(origins, day_positions[origins])
+        ]
+        return {day: int(minutes) for day, minutes in zip(days, day_minutes)}, trips
+
+    def keep_distances(self, distances_km):
+        """Mask of the trips long enough for the report."""
+        return np.asarray(distances_km, dtype=np.float64) >= self.min_km
+
+
+_default_trip_rules = None
+
+
+def get_trip_rules():
+    """Rules built from the config file, loaded on first use."""
+    global _default_trip_rules
+    if _default_trip_rules is None:
+        _default_trip_rules = TripRules.from_config()
+    return _default_trip_rules
@@ -0,0 +1,116 @@
+import csv
+from array import array
+
+from address_normalizer import normalize
+
+
+def parse_distance_km(distance):
+    """'8,5 km' -> 8.5; anything unreadable (or a failed lookup's None) counts as 0."""
+    try:
+        return float(distance.split(" ")[0].strip().replace(",", "."))
+    except (AttributeError, ValueError):
+        return 0.0
+
+
+class Trip:
+    """One report row: a drive between two consecutive events of a day."""
+    __slots__ = ("date", "origin", "destination", "distance_text", "distance_km",
+                 "origin_label", "destination_label")
+
+    def __init__(self, date, origin, destination, distance_text, distance_km, origin_label, destination_label):
+        self.date = date
+        self.origin = origin
+        self.destination = destination
+        self.distance_text = distance_text
+        self.distance_km = distance_km
+        self.origin_label = origin_label
+        self.destination_label = destination_label
+
+    def __repr__(self):
+        return f"Trip({self.date}, {self.origin_label} -> {self.destination_label}, {self.distance_km} km)"
+
+
+class TripTable:
+    """
+    Column-oriented table of a month's trips, filled while scraping and read by the renderer.
+    Distances are kept as floats and the cleaned address labels shown in the PDF are
+    computed once per distinct address (normalize is memoized). TXT, CSV and Parquet files are exports of this table.
+    """
+    COLUMNS = ("date", "origin", "destination", "distance_text", "distance_km", "origin_label", "destination_label")
+
+    def __init__(self):
+        self.dates = []
+        self.origins = []
+        self.destinations = []
+        self.distance_texts = []
+        self.distances_km = array("d")
+        self.origin_labels = []
+        self.destination_labels = []
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        return Trip(self.dates[i], self.origins[i], self.destinations[i], self.distance_texts[i],
+                    self.distances_km[i], self.origin_labels[i], self.destination_labels[i])
+
+    def append(self, date, origin, destination, distance):
+        """Add a trip; `distance` is the text returned by the distance backend (e.g. '8,5 km')."""
+        distance = distance.strip()
+        self.dates.append(date)
+        self.origins.append(origin)
+        self.destinations.append(destination)
+        self.distance_texts.append(distance)
+        self.distances_km.append(parse_distance_km(distance))
+        self.origin_labels.append(normalize(origin))
+        self.destination_labels.append(normalize(destination))
+
+    def total_km(self):
+        return sum(self.distances_km)
+
+    def to_txt(self, path):
+        """Write the table in the 'date;origin;destination;distance' format of km_MM_YYYY.txt."""
+        with open(path, "w", encoding="UTF-8") as file:
+            file.writelines(
+                f"{date};{origin};{destination};{distance}\n"
+                for date, origin, destination, distance
+                in zip(self.dates, self.origins, self.destinations, self.distance_texts)
+            )
+
+    @classmethod
+    def from_txt(cls, path):
+        table = cls()
+        with open(path, "r", encoding="UTF-8") as file:
+            for line in file:
+                line_contents = line.strip().split(";")
+                if len(line_contents) == 4:
+                    table.append(*line_contents)
+        return table
+
+    def to_csv(self, path):
+        with open(path, "w", encoding="UTF-8", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(self.COLUMNS)
+            writer.writerows(zip(self.dates, self.origins, self.destinations, self.distance_texts,
+                                 self.distances_km, self.origin_labels, self.destination_labels))
+
+    def to_parquet(self, path):
+        """Requires pyarrow (pip install pyarrow)."""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+        pq.write_table(pa.table({
+            "date": self.dates,
+            "origin": self.origins,
+            "destination": self.destinations,
+            "distance_text": self.distance_texts,
+            "distance_km": pa.array(self.distances_km, type=pa.float64()),
+            "origin_label": self.origin_labels,
+            "destination_label": self.destination_labels,
+        }), path)